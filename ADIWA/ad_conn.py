@@ -1,23 +1,121 @@
-from ldap3 import Server, Connection, ALL, SUBTREE
+from contextlib import contextmanager
+from ldap3 import Server, Connection, ALL, ASYNC, BASE, SUBTREE, MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE
+from ldap3.utils.conv import escape_filter_chars
+import queue
 import re
 import logging
+import threading
+import time
+
+from . import ad_trace
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Account-state attributes read by get_users_status (decoded in core.ad_status)
+USER_STATUS_ATTRIBUTES = ['userAccountControl', 'lockoutTime', 'pwdLastSet', 'lastLogonTimestamp']
+
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+# Matches through nested groups, e.g. (memberOf:1.2.840.113556.1.4.1941:=<group DN>)
+LDAP_MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+# Adding an existing member / removing a missing one succeeds instead of failing the modify
+PERMISSIVE_MODIFY_OID = '1.2.840.113556.1.4.1413'
+
+GROUP_ATTRIBUTES = ['cn', 'sAMAccountName', 'description']
+# AD returns at most MaxValRange (1500 by default) values of a multi-valued attribute per read
+MEMBER_RANGE_RE = re.compile(r'^member;range=(\d+)-(\d+|\*)$', re.IGNORECASE)
+
+# Why the last connect_ad() failed (ADConnection.bind_error)
+BIND_INVALID = 'invalid'          # the DC rejected the credentials
+BIND_UNAVAILABLE = 'unavailable'  # no usable answer from the DC (down, timed out, busy)
+LDAP_INVALID_CREDENTIALS = 49
+
+# Pipelined writes (ADConnection.run_pipelined): operation kinds, and how many
+# may be waiting for their response at once
+OP_ADD, OP_MODIFY, OP_MODIFY_DN, OP_DELETE = 'add', 'modify', 'modify_dn', 'delete'
+PIPELINE_WINDOW = 50
+
+
+def _raw_int(entry, attr):
+    """Integer value of ``attr`` straight from the wire (schema formatters bypassed), or 0."""
+    try:
+        raw = entry[attr].raw_values
+    except (KeyError, AttributeError, IndexError):
+        return 0
+    try:
+        return int(raw[0]) if raw else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def sid_to_str(sid):
+    """Binary objectSid / tokenGroups value to its 'S-1-5-21-...' string form."""
+    revision, sub_count = sid[0], sid[1]
+    authority = int.from_bytes(sid[2:8], 'big')
+    subs = [int.from_bytes(sid[8 + 4 * i:12 + 4 * i], 'little') for i in range(sub_count)]
+    return '-'.join(['S', str(revision), str(authority)] + [str(sub) for sub in subs])
+
+
+class TracedConnection(Connection):
+    """ldap3 Connection that times every bind, search and write (see ADIWA.ad_trace)."""
+
+    def bind(self, *args, **kwargs):
+        return self._traced('bind', self.user, super().bind, args, kwargs)
+
+    def search(self, search_base, search_filter, *args, **kwargs):
+        return self._traced('search', search_base, super().search, (search_base, search_filter) + args, kwargs)
+
+    def add(self, dn, *args, **kwargs):
+        return self._traced('add', dn, super().add, (dn,) + args, kwargs)
+
+    def modify(self, dn, changes, *args, **kwargs):
+        return self._traced('modify', dn, super().modify, (dn, changes) + args, kwargs)
+
+    def modify_dn(self, dn, relative_dn, *args, **kwargs):
+        return self._traced('modify_dn', dn, super().modify_dn, (dn, relative_dn) + args, kwargs)
+
+    def delete(self, dn, *args, **kwargs):
+        return self._traced('delete', dn, super().delete, (dn,) + args, kwargs)
+
+    def _traced(self, operation, target, call, args, kwargs):
+        if operation != 'bind' and not self.strategy.sync:
+            # Asynchronous requests only return a message ID; run_pipelined times them
+            return call(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            outcome = call(*args, **kwargs)
+        except Exception as e:
+            ad_trace.record(operation, target, started, -1, f'{type(e).__name__}: {e}')
+            raise
+
+        result = self.result or {}
+        size = 0
+        if operation == 'search':
+            size = sum(1 for r in self.response or [] if r.get('type') == 'searchResEntry')
+        ad_trace.record(operation, target, started, result.get('result', 0), result.get('description'), size)
+        return outcome
+
 
 class ADConnection:
-    def __init__(self, server_host, domain, base_dn, base_container):
+    def __init__(self, server_host, domain, base_dn, base_container, probe=True, timeout=None, start_tls=True):
         self.server_host = server_host
         self.domain = domain
         self.base_dn = base_dn
         self.base_container = base_container
+        self.timeout = timeout
+        self.start_tls = start_tls
         self.conn = None
         self.server = None
+        self.bind_error = None
+        self._pipeline = None
+
+        # Worker connections skip the anonymous probe; the settings one checks reachability.
+        if not probe:
+            return
 
         try:
             server = Server(self.server_host, port=389, get_info=ALL)
-            conn = Connection(server, auto_bind=True)
+            conn = TracedConnection(server, auto_bind=True)
             logger.info("✓ Anonymous bind successful")
             logger.info(server.info)
             conn.unbind()
@@ -30,19 +128,25 @@ class ADConnection:
             else f"{username}@{self.domain}"
         )
 
-        self.server = Server(self.server_host, get_info=ALL)
+        self.server = Server(self.server_host, get_info=ALL, connect_timeout=self.timeout)
+        self.bind_error = None
+        self._close_pipeline()
 
         try:
-            self.conn = Connection(
+            self.conn = TracedConnection(
                 self.server,
                 user=self.username,
                 password=password,
+                receive_timeout=self.timeout,
             )
-            self.conn.start_tls()
+            if self.start_tls:
+                self.conn.start_tls()
             self.conn.bind()
 
             if not self.conn.bound:
                 logger.error("Authentication failed")
+                invalid = (self.conn.result or {}).get('result') == LDAP_INVALID_CREDENTIALS
+                self.bind_error = BIND_INVALID if invalid else BIND_UNAVAILABLE
                 return False
 
             logger.info(f"Successfully connected as {self.username}")
@@ -50,6 +154,7 @@ class ADConnection:
 
         except Exception as e:
             logger.error(f"Error connecting to AD: {e}")
+            self.bind_error = BIND_UNAVAILABLE
             return False
 
     def _ensure_bound(self):
@@ -96,6 +201,394 @@ class ADConnection:
         )
         return [entry.entry_dn for entry in self.conn.entries]
 
+    def _search_usernames_batched(self, usernames, attributes, batch_size):
+        """Yield entries for many sAMAccountNames, one (|(sAMAccountName=...)...) search per batch."""
+        names = sorted({u.split('@')[0].strip().lower() for u in usernames if u and u.strip()})
+
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            clauses = ''.join(f'(sAMAccountName={escape_filter_chars(name)})' for name in batch)
+            self.conn.search(
+                self.base_dn,
+                f'(|{clauses})',
+                search_scope=SUBTREE,
+                attributes=['sAMAccountName'] + list(attributes),
+            )
+            yield from self.conn.entries
+
+    def search_users_dn(self, usernames, batch_size=200):
+        """
+        Resolve many sAMAccountNames to DNs with OR-filter searches.
+
+        Args:
+            usernames:   iterable of sAMAccountNames
+            batch_size:  names per (|(sAMAccountName=...)...) filter
+
+        Returns:
+            {lower-case sAMAccountName: DN} for every user found.
+        """
+        self._ensure_bound()
+
+        found = {}
+        for entry in self._search_usernames_batched(usernames, [], batch_size):
+            sam = str(entry.sAMAccountName.value or '').lower()
+            if sam:
+                found[sam] = entry.entry_dn
+        return found
+
+    def get_users_status(self, usernames, batch_size=200):
+        """
+        Fetch account-state attributes for many users with OR-filter searches.
+
+        Args:
+            usernames:   iterable of sAMAccountNames
+            batch_size:  names per (|(sAMAccountName=...)...) filter
+
+        Returns:
+            {lower-case sAMAccountName: {attribute: raw integer value}} for
+            USER_STATUS_ATTRIBUTES; missing attributes are 0.
+        """
+        self._ensure_bound()
+
+        found = {}
+        for entry in self._search_usernames_batched(usernames, USER_STATUS_ATTRIBUTES, batch_size):
+            sam = str(entry.sAMAccountName.value or '').lower()
+            if sam:
+                found[sam] = {attr: _raw_int(entry, attr) for attr in USER_STATUS_ATTRIBUTES}
+        return found
+
+    def search_users_uac(self, usernames, batch_size=200):
+        """
+        Resolve many sAMAccountNames to their DN and userAccountControl in one pass.
+
+        Returns:
+            {lower-case sAMAccountName: (DN, userAccountControl)} for every user found.
+        """
+        self._ensure_bound()
+
+        found = {}
+        for entry in self._search_usernames_batched(usernames, ['userAccountControl'], batch_size):
+            sam = str(entry.sAMAccountName.value or '').lower()
+            if sam:
+                found[sam] = (entry.entry_dn, _raw_int(entry, 'userAccountControl'))
+        return found
+
+    def get_password_policy(self):
+        """
+        Read the domain's maxPwdAge and lockoutDuration (raw, negative 100ns intervals).
+
+        Returns:
+            {'maxPwdAge': int, 'lockoutDuration': int}
+        """
+        self._ensure_bound()
+
+        self.conn.search(
+            self.base_dn,
+            '(objectClass=domain)',
+            search_scope=BASE,
+            attributes=['maxPwdAge', 'lockoutDuration'],
+        )
+        entry = self.conn.entries[0] if self.conn.entries else None
+        return {
+            'maxPwdAge': _raw_int(entry, 'maxPwdAge') if entry else 0,
+            'lockoutDuration': _raw_int(entry, 'lockoutDuration') if entry else 0,
+        }
+
+    def search_usernames(self, ldap_filter, page_size=1000, limit=None):
+        """
+        Return the lower-case sAMAccountNames of users matching ``ldap_filter``.
+
+        Uses the paged-results control, so filters matching more than the
+        server's size limit still return every user (up to ``limit``).
+        """
+        self._ensure_bound()
+
+        names = []
+        entries = self._paged_search(
+            f'(&(objectCategory=person)(objectClass=user){ldap_filter})', ['sAMAccountName'], page_size,
+        )
+        for entry in entries:
+            sam = str(entry.sAMAccountName.value or '').lower()
+            if sam:
+                names.append(sam)
+                if limit and len(names) >= limit:
+                    break
+        return names
+
+    def _paged_search(self, ldap_filter, attributes, page_size=1000):
+        """Yield every entry matching ``ldap_filter`` under base_dn, one page at a time."""
+        cookie = None
+        while True:
+            self.conn.search(
+                self.base_dn,
+                ldap_filter,
+                search_scope=SUBTREE,
+                attributes=attributes,
+                paged_size=page_size,
+                paged_cookie=cookie,
+            )
+            yield from self.conn.entries
+
+            cookie = (
+                self.conn.result.get('controls', {})
+                .get(PAGED_RESULTS_OID, {})
+                .get('value', {})
+                .get('cookie')
+            )
+            if not cookie:
+                return
+
+    # ------------------------------------------------------------------
+    # Groups
+    # ------------------------------------------------------------------
+
+    def get_token_groups(self, user_dn):
+        """
+        SIDs of every security group ``user_dn`` belongs to, nested and primary
+        group included, from the constructed tokenGroups attribute.
+
+        tokenGroups is only returned by a base-scope read of the user entry,
+        which makes this a single request however deep the nesting goes.
+
+        Returns:
+            list of SID strings, or None if there is no entry at ``user_dn``.
+        """
+        self._ensure_bound()
+
+        try:
+            found = self.conn.search(user_dn, '(objectClass=user)', search_scope=BASE, attributes=['tokenGroups'])
+        except Exception as e:
+            # e.g. noSuchObject after the user was moved to another OU
+            logger.warning(f"tokenGroups read failed for {user_dn}: {e}")
+            return None
+        if not found or not self.conn.entries:
+            return None
+
+        entry = self.conn.entries[0]
+        raw = entry['tokenGroups'].raw_values if 'tokenGroups' in entry else []
+        return [sid_to_str(value) for value in raw]
+
+    @staticmethod
+    def _group_from_entry(entry):
+        return {
+            'dn': entry.entry_dn,
+            'name': str(entry.cn.value or ''),
+            'sam': str(entry.sAMAccountName.value or ''),
+            'description': str(entry.description.value or '') if 'description' in entry else '',
+        }
+
+    def search_groups(self, query='', limit=50):
+        """
+        Groups whose cn or sAMAccountName starts with ``query`` (all groups if empty).
+
+        Returns:
+            [{'dn', 'name', 'sam', 'description'}, ...] sorted by name, at most ``limit``.
+        """
+        self._ensure_bound()
+
+        query = escape_filter_chars(query.strip())
+        name_filter = f'(|(cn={query}*)(sAMAccountName={query}*))' if query else ''
+        groups = []
+        for entry in self._paged_search(f'(&(objectClass=group){name_filter})', GROUP_ATTRIBUTES):
+            groups.append(self._group_from_entry(entry))
+            if len(groups) >= limit:
+                break
+        return sorted(groups, key=lambda group: group['name'].lower())
+
+    def get_group(self, group_dn):
+        """Return the group dict for ``group_dn``, or None if there is no such group."""
+        self._ensure_bound()
+
+        self.conn.search(group_dn, '(objectClass=group)', search_scope=BASE, attributes=GROUP_ATTRIBUTES)
+        return self._group_from_entry(self.conn.entries[0]) if self.conn.entries else None
+
+    def get_group_members(self, group_dn):
+        """
+        Direct member DNs of a group, read with ranged retrieval.
+
+        A plain read of ``member`` on a large group is silently truncated at
+        MaxValRange values; this asks for ``member;range=<start>-*`` until the
+        server marks the last chunk with ``-*``.
+        """
+        self._ensure_bound()
+
+        members = []
+        start = 0
+        while True:
+            self.conn.search(
+                group_dn, '(objectClass=*)', search_scope=BASE,
+                attributes=[f'member;range={start}-*'],
+            )
+            entries = [r for r in self.conn.response or [] if r.get('type') == 'searchResEntry']
+            if not entries:
+                return members
+
+            end = '*'
+            for name, values in entries[0].get('raw_attributes', {}).items():
+                match = MEMBER_RANGE_RE.match(name)
+                if match:
+                    end = match.group(2)
+                elif name.lower() != 'member':
+                    continue
+                members.extend(v.decode('utf-8') if isinstance(v, bytes) else str(v) for v in values)
+
+            if end == '*':
+                return members
+            start = int(end) + 1
+
+    def get_group_members_nested(self, group_dn, page_size=1000):
+        """
+        Every user that is a member of ``group_dn`` directly or through nested
+        groups, resolved by the DC in one (paged) LDAP_MATCHING_RULE_IN_CHAIN search.
+
+        Returns:
+            [{'dn', 'sam'}, ...]
+        """
+        self._ensure_bound()
+
+        ldap_filter = (
+            '(&(objectCategory=person)(objectClass=user)'
+            f'(memberOf:{LDAP_MATCHING_RULE_IN_CHAIN}:={escape_filter_chars(group_dn)}))'
+        )
+        return [
+            {'dn': entry.entry_dn, 'sam': str(entry.sAMAccountName.value or '').lower()}
+            for entry in self._paged_search(ldap_filter, ['sAMAccountName'], page_size)
+        ]
+
+    def get_user_groups(self, username):
+        """
+        Groups ``username`` belongs to, directly or through nesting, in one
+        LDAP_MATCHING_RULE_IN_CHAIN search.
+
+        Returns:
+            [{'dn', 'name', 'sam', 'description', 'direct'}, ...] sorted by
+            name, or None if the user is not in AD.
+        """
+        self._ensure_bound()
+
+        sam = username.split('@')[0].strip().lower()
+        self.conn.search(
+            self.base_dn,
+            f'(&(objectCategory=person)(objectClass=user)(sAMAccountName={escape_filter_chars(sam)}))',
+            search_scope=SUBTREE,
+            attributes=['memberOf'],
+        )
+        if not self.conn.entries:
+            return None
+        user = self.conn.entries[0]
+        direct = {dn.lower() for dn in (user.memberOf.values if 'memberOf' in user else [])}
+
+        groups = []
+        ldap_filter = f'(&(objectClass=group)(member:{LDAP_MATCHING_RULE_IN_CHAIN}:={escape_filter_chars(user.entry_dn)}))'
+        for entry in self._paged_search(ldap_filter, GROUP_ATTRIBUTES):
+            group = self._group_from_entry(entry)
+            group['direct'] = group['dn'].lower() in direct
+            groups.append(group)
+        return sorted(groups, key=lambda group: group['name'].lower())
+
+    def add_group_members(self, group_dn, member_dns, batch_size=500):
+        """Add many members to a group; see _modify_group_members."""
+        return self._modify_group_members(group_dn, member_dns, MODIFY_ADD, batch_size)
+
+    def remove_group_members(self, group_dn, member_dns, batch_size=500):
+        """Remove many members from a group; see _modify_group_members."""
+        return self._modify_group_members(group_dn, member_dns, MODIFY_DELETE, batch_size)
+
+    def _modify_group_members(self, group_dn, member_dns, operation, batch_size):
+        """
+        Change ``member`` with one modify per ``batch_size`` DNs.
+
+        The permissive-modify control makes re-adding an existing member (or
+        removing a missing one) a no-op, so a retried batch is harmless. If a
+        batch still fails, it is replayed one DN at a time to isolate the bad
+        entries.
+
+        Returns:
+            {member DN: error message} for the members that failed (empty on success).
+        """
+        self._ensure_bound()
+
+        controls = [(PERMISSIVE_MODIFY_OID, False, None)]
+        member_dns = list(dict.fromkeys(member_dns))
+        failures = {}
+
+        for start in range(0, len(member_dns), batch_size):
+            batch = member_dns[start:start + batch_size]
+            if self.conn.modify(group_dn, {'member': [(operation, batch)]}, controls=controls):
+                continue
+
+            for dn in batch:
+                if not self.conn.modify(group_dn, {'member': [(operation, [dn])]}, controls=controls):
+                    failures[dn] = self._last_error(f"Failed to update membership of {group_dn} for {dn}")
+
+        logger.info(
+            f"Group {group_dn}: {len(member_dns) - len(failures)}/{len(member_dns)} members "
+            f"{'added' if operation == MODIFY_ADD else 'removed'}"
+        )
+        return failures
+
+    def bulk_update_ou(self, moves):
+        """
+        Move many users to new OUs on the current connection.
+
+        Args:
+            moves:  iterable of (username, new_ou) pairs
+
+        Returns:
+            {lower-case username: (success, message, old_dn, new_dn)}
+        """
+        self._ensure_bound()
+
+        moves = [(u.split('@')[0].strip().lower(), ou.strip()) for u, ou in moves]
+        dns = self.search_users_dn(u for u, _ in moves)
+        results = {}
+
+        found = []
+        for username, new_ou in moves:
+            if dns.get(username):
+                found.append((username, new_ou))
+            else:
+                results[username] = (False, f"User '{username}' not found in Active Directory.", None, None)
+
+        # The moves are pipelined on one connection rather than one round trip each
+        moved = self.move_dns((dns[username], new_ou) for username, new_ou in found)
+        for (username, _), (success, message, new_dn) in zip(found, moved):
+            results[username] = (success, message, dns[username], new_dn)
+
+        moved = sum(1 for ok, *_ in results.values() if ok)
+        logger.info(f"Bulk OU transfer: {moved}/{len(results)} users moved")
+        return results
+
+    def move_dn(self, dn, new_ou):
+        """
+        Move the entry at ``dn`` to OU=new_ou under base_container.
+
+        An entry that is already in the target OU counts as moved, so a
+        retried move is harmless.
+
+        Returns:
+            (success, message, new_dn)
+        """
+        self._ensure_bound()
+
+        match = re.match(r'CN=([^,]+)', dn)
+        if not match:
+            return False, f"Invalid DN: {dn}", None
+
+        relative_dn = f"CN={match.group(1)}"
+        new_superior = f"OU={new_ou},{self.base_container}"
+        new_dn = f"{relative_dn},{new_superior}"
+
+        if dn.lower() == new_dn.lower():
+            return True, f"Already in OU={new_ou}", dn
+
+        if self.conn.modify_dn(dn=dn, relative_dn=relative_dn, new_superior=new_superior):
+            return True, f"Moved to OU={new_ou}", new_dn
+
+        error = self.conn.result.get('description', 'Unknown error')
+        message = self.conn.result.get('message', '')
+        return False, f"{error}: {message}" if message else error, None
+
     def update_ou(self, username, new_ou):
         self._ensure_bound()
 
@@ -211,23 +704,69 @@ class ADConnection:
         if not dns:
             return False, f"User '{username}' not found in Active Directory."
 
-        user_dn = dns[0]
+        success, message = self.set_password_dn(dns[0], new_password)
+        if not success:
+            return False, message
+
+        logger.info(f"Password changed for AD user: {username}")
+        return True, f"Password for '{username}' changed successfully."
+
+    def set_password_dn(self, dn, new_password, must_change=False):
+        """
+        Set the password of the account at ``dn`` (no DN lookup).
+
+        With ``must_change`` the user has to pick a new password at next logon.
+
+        Returns:
+            (True, message) on success, (False, error_message) on failure.
+        """
+        self._ensure_bound()
 
         # AD requires the password as a UTF-16-LE encoded, double-quoted string
         encoded_pwd = f'"{new_password}"'.encode('utf-16-le')
-        success = self.conn.modify(
-            user_dn,
-            {'unicodePwd': [(2, [encoded_pwd])]}  # 2 = MODIFY_REPLACE
-        )
+        changes = {'unicodePwd': [(2, [encoded_pwd])]}  # 2 = MODIFY_REPLACE
+        if must_change:
+            changes['pwdLastSet'] = [(2, ['0'])]
 
-        if not success:
-            error = self.conn.result.get('description', 'Unknown error')
-            message = self.conn.result.get('message', '')
-            logger.error(f"Failed to change password for {username}: {error} - {message}")
-            return False, f"{error}: {message}" if message else error
+        if not self.conn.modify(dn, changes):
+            return False, self._last_error(f"Failed to set password for {dn}")
+        return True, "Password set."
 
-        logger.info(f"Password changed for AD user: {username}")
-        return True, f"Password for '{username}' changed successfully."
+    def disable_dn(self, dn, user_account_control):
+        """
+        Disable the account at ``dn`` by setting ACCOUNTDISABLE (0x2) on its
+        current ``user_account_control`` value.
+
+        Returns:
+            (True, message) on success, (False, error_message) on failure.
+        """
+        self._ensure_bound()
+
+        if user_account_control & 0x2:
+            return True, "Account already disabled."
+
+        if not self.conn.modify(dn, {'userAccountControl': [(2, [str(user_account_control | 0x2)])]}):
+            return False, self._last_error(f"Failed to disable {dn}")
+        return True, "Account disabled."
+
+    def delete_dn(self, dn):
+        """
+        Delete the account at ``dn`` (no DN lookup).
+
+        Returns:
+            (True, message) on success, (False, error_message) on failure.
+        """
+        self._ensure_bound()
+
+        if not self.conn.delete(dn):
+            return False, self._last_error(f"Failed to delete {dn}")
+        return True, "Account deleted."
+
+    def _last_error(self, context):
+        error = self.conn.result.get('description', 'Unknown error')
+        message = self.conn.result.get('message', '')
+        logger.error(f"{context}: {error} - {message}")
+        return f"{error}: {message}" if message else error
     
     def delete_user(self, username):
         """
@@ -245,22 +784,284 @@ class ADConnection:
         if not dns:
             return False, f"User '{username}' not found in Active Directory."
 
-        user_dn = dns[0]
-
-        success = self.conn.delete(user_dn)
+        success, message = self.delete_dn(dns[0])
         if not success:
-            error = self.conn.result.get('description', 'Unknown error')
-            message = self.conn.result.get('message', '')
-            logger.error(f"Failed to delete AD user {username}: {error} - {message}")
-            return False, f"{error}: {message}" if message else error
+            return False, message
 
         logger.info(f"Deleted AD user: {username}")
         return True, f"User '{username}' deleted successfully from AD."
 
-    def __del__(self):
+    # ------------------------------------------------------------------
+    # Pipelined writes
+    # ------------------------------------------------------------------
+
+    def run_pipelined(self, operations, window=PIPELINE_WINDOW):
+        """
+        Send many write operations without waiting for each response.
+
+        The operations go out on a second connection, bound as the same account
+        with ldap3's ASYNC strategy. Up to ``window`` requests are in flight at
+        once, so a batch costs about one round trip per window instead of one
+        per operation. Operations are independent: a failure does not stop the
+        others, and their order on the DC is not guaranteed.
+
+        Args:
+            operations:  iterable of (kind, dn, argument):
+                         (OP_ADD, dn, attributes), (OP_MODIFY, dn, changes),
+                         (OP_MODIFY_DN, dn, (relative_dn, new_superior)),
+                         (OP_DELETE, dn, None)
+            window:      most operations awaiting a response at once
+
+        Returns:
+            [(success, message), ...] in the order of ``operations``; the
+            message is the DC's error on failure.
+        """
+        self._ensure_bound()
+
+        conn = self._pipeline_connection()
+        caller = ad_trace.find_caller()
+        results = []
+        in_flight = {}  # message ID -> (index in results, kind, dn, time sent)
+
+        for kind, dn, argument in operations:
+            if len(in_flight) >= window:
+                self._collect(conn, in_flight, results, caller)
+            results.append(None)
+            started = time.perf_counter()
+            try:
+                message_id = self._send_pipelined(conn, kind, dn, argument)
+            except Exception as e:
+                logger.error(f"Pipelined {kind} of {dn} could not be sent: {e}")
+                ad_trace.record(kind, dn, started, -1, f'{type(e).__name__}: {e}', caller=caller)
+                results[-1] = (False, str(e))
+                continue
+            in_flight[message_id] = (len(results) - 1, kind, dn, started)
+
+        while in_flight:
+            self._collect(conn, in_flight, results, caller)
+        return results
+
+    @staticmethod
+    def _send_pipelined(conn, kind, dn, argument):
+        if kind == OP_ADD:
+            return conn.add(dn, attributes=argument)
+        if kind == OP_MODIFY:
+            return conn.modify(dn, argument)
+        if kind == OP_MODIFY_DN:
+            relative_dn, new_superior = argument
+            return conn.modify_dn(dn, relative_dn, new_superior=new_superior)
+        if kind == OP_DELETE:
+            return conn.delete(dn)
+        raise ValueError(f"Unknown pipelined operation: {kind}")
+
+    def _collect(self, conn, in_flight, results, caller):
+        """Wait for the oldest operation in flight and record its (success, message)."""
+        message_id = next(iter(in_flight))
+        index, kind, dn, started = in_flight.pop(message_id)
+        try:
+            _, result = conn.get_response(message_id, timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"No response to pipelined operation {message_id}: {e}")
+            ad_trace.record(kind, dn, started, -1, f'{type(e).__name__}: {e}', caller=caller)
+            results[index] = (False, str(e))
+            return
+
+        ad_trace.record(kind, dn, started, result.get('result', 0), result.get('description'), caller=caller)
+
+        if result.get('result') == 0:
+            results[index] = (True, result.get('message') or 'Done.')
+            return
+        error = result.get('description', 'Unknown error')
+        message = result.get('message', '')
+        results[index] = (False, f"{error}: {message}" if message else error)
+
+    def _pipeline_connection(self):
+        if self._pipeline is None or not self._pipeline.bound:
+            self._ensure_bound()
+            # Binds as the account of the bound connection; no password is kept on self
+            conn = TracedConnection(
+                self.server,
+                user=self.conn.user,
+                password=self.conn.password,
+                client_strategy=ASYNC,
+                receive_timeout=self.timeout,
+            )
+            if self.start_tls:
+                conn.start_tls()
+            if not conn.bind():
+                raise Exception(f"Failed to open a pipelining connection as {self.username}")
+            self._pipeline = conn
+        return self._pipeline
+
+    def _close_pipeline(self):
+        try:
+            if self._pipeline and self._pipeline.bound:
+                self._pipeline.unbind()
+        except Exception:
+            pass
+        self._pipeline = None
+
+    def set_passwords_dn(self, items, must_change=False, window=PIPELINE_WINDOW):
+        """
+        set_password_dn() for many accounts, pipelined.
+
+        Args:
+            items:  iterable of (dn, new_password)
+
+        Returns:
+            [(success, message), ...] in the order of ``items``.
+        """
+        operations = []
+        for dn, new_password in items:
+            changes = {'unicodePwd': [(MODIFY_REPLACE, [f'"{new_password}"'.encode('utf-16-le')])]}
+            if must_change:
+                changes['pwdLastSet'] = [(MODIFY_REPLACE, ['0'])]
+            operations.append((OP_MODIFY, dn, changes))
+        return [
+            (True, "Password set.") if success else (False, message)
+            for success, message in self.run_pipelined(operations, window)
+        ]
+
+    def disable_dns(self, items, window=PIPELINE_WINDOW):
+        """
+        disable_dn() for many accounts, pipelined.
+
+        Args:
+            items:  iterable of (dn, user_account_control)
+
+        Returns:
+            [(success, message), ...] in the order of ``items``.
+        """
+        items = list(items)
+        pending = [(dn, uac) for dn, uac in items if not uac & 0x2]
+        sent = iter(self.run_pipelined(
+            [(OP_MODIFY, dn, {'userAccountControl': [(MODIFY_REPLACE, [str(uac | 0x2)])]}) for dn, uac in pending],
+            window,
+        ))
+
+        results = []
+        for _, uac in items:
+            if uac & 0x2:
+                results.append((True, "Account already disabled."))
+                continue
+            success, message = next(sent)
+            results.append((True, "Account disabled.") if success else (False, message))
+        return results
+
+    def delete_dns(self, dns, window=PIPELINE_WINDOW):
+        """delete_dn() for many accounts, pipelined; [(success, message), ...] in order."""
+        return [
+            (True, "Account deleted.") if success else (False, message)
+            for success, message in self.run_pipelined([(OP_DELETE, dn, None) for dn in dns], window)
+        ]
+
+    def move_dns(self, moves, window=PIPELINE_WINDOW):
+        """
+        move_dn() for many entries, pipelined.
+
+        Args:
+            moves:  iterable of (dn, new_ou)
+
+        Returns:
+            [(success, message, new_dn), ...] in the order of ``moves``.
+        """
+        results, operations, targets = [], [], []
+        for dn, new_ou in moves:
+            match = re.match(r'CN=([^,]+)', dn)
+            if not match:
+                results.append((False, f"Invalid DN: {dn}", None))
+                continue
+
+            relative_dn = f"CN={match.group(1)}"
+            new_superior = f"OU={new_ou},{self.base_container}"
+            new_dn = f"{relative_dn},{new_superior}"
+            if dn.lower() == new_dn.lower():
+                results.append((True, f"Already in OU={new_ou}", dn))
+                continue
+
+            results.append(None)
+            operations.append((OP_MODIFY_DN, dn, (relative_dn, new_superior)))
+            targets.append((len(results) - 1, new_ou, new_dn))
+
+        for (index, new_ou, new_dn), (success, message) in zip(targets, self.run_pipelined(operations, window)):
+            results[index] = (True, f"Moved to OU={new_ou}", new_dn) if success else (False, message, None)
+        return results
+
+    def close(self):
+        self._close_pipeline()
         try:
             if self.conn and self.conn.bound:
                 self.conn.unbind()
                 logger.info("Disconnected from AD")
         except Exception:
             pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # Silent: at interpreter shutdown the log streams may already be closed
+        for conn in (getattr(self, '_pipeline', None), getattr(self, 'conn', None)):
+            try:
+                if conn is not None and conn.bound:
+                    conn.unbind()
+            except Exception:
+                pass
+
+
+class ADConnectionPool:
+    """
+    Up to ``size`` bound connections for one account, shared between threads.
+
+    Connections are opened on first use and handed out with ``connection()``;
+    one that raised while in use is closed instead of going back to the pool.
+    """
+    def __init__(self, server_host, domain, base_dn, base_container, username, password, size=4):
+        self.server_host = server_host
+        self.domain = domain
+        self.base_dn = base_dn
+        self.base_container = base_container
+        self.username = username
+        self.password = password
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                ad = self._idle.get_nowait()
+            except queue.Empty:
+                ad = self._open()
+
+            try:
+                yield ad
+            except Exception:
+                ad.close()
+                raise
+
+            if ad.conn and ad.conn.bound:
+                self._idle.put(ad)
+
+    def _open(self):
+        ad = ADConnection(
+            server_host=self.server_host,
+            domain=self.domain,
+            base_dn=self.base_dn,
+            base_container=self.base_container,
+            probe=False,
+        )
+        if not ad.connect_ad(self.username, self.password):
+            raise Exception(f"Failed to connect to AD as {self.username}")
+        return ad
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,292 @@
+"""
+Asyncio Active Directory client for the ASGI deployment.
+
+AsyncADConnection speaks LDAP over an asyncio stream, so waiting on the DC
+suspends the coroutine instead of holding a worker thread. ldap3 still does
+the protocol work: requests are built with its operation encoders, and
+responses are decoded with its fast BER decoder into the same dicts ldap3
+returns. One connection can run several operations at once; a reader task
+routes each response to its request by message ID.
+
+It mirrors the read side of ADConnection that the login and profile paths
+use (connect_ad, search_user_full_info, search_user_dn, search_users_dn,
+get_token_groups). Writes stay on ADConnection.
+"""
+import asyncio
+import itertools
+import logging
+import ssl
+import time
+
+from ldap3 import BASE, DEREF_ALWAYS, SUBTREE, Server
+from ldap3.operation.bind import bind_operation, bind_response_to_dict_fast
+from ldap3.operation.extended import extended_operation, extended_response_to_dict_fast
+from ldap3.operation.search import search_operation, search_result_entry_response_to_dict_fast
+from ldap3.operation.unbind import unbind_operation
+from ldap3.protocol.rfc4511 import LDAPMessage, MessageID, ProtocolOp
+from ldap3.strategy.base import BaseStrategy
+from ldap3.utils.asn1 import decode_message_fast, encode, ldap_result_to_dict_fast
+from ldap3.utils.conv import escape_filter_chars
+
+from . import ad_trace
+from .ad_conn import BIND_INVALID, BIND_UNAVAILABLE, LDAP_INVALID_CREDENTIALS, sid_to_str
+
+logger = logging.getLogger(__name__)
+
+START_TLS_OID = '1.3.6.1.4.1.1466.20037'
+
+# Fast-decoder protocolOp numbers (RFC 4511 application tags)
+BIND_RESPONSE, SEARCH_ENTRY, SEARCH_DONE, EXTENDED_RESPONSE = 1, 4, 5, 24
+
+
+class AsyncEntry:
+    """Search result entry; attributes read like ldap3 entries (``entry.mail``), as value lists."""
+
+    def __init__(self, response):
+        self.entry_dn = response['dn']
+        self._attributes = {name.lower(): values for name, values in response['attributes'].items()}
+        self._raw = {name.lower(): values for name, values in response['raw_attributes'].items()}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_attributes'][name.lower()]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def raw(self, name):
+        return self._raw.get(name.lower()) or []
+
+
+class AsyncADConnection:
+    def __init__(self, server_host, domain, base_dn, base_container, timeout=None, start_tls=True):
+        self.server_host = server_host
+        self.domain = domain
+        self.base_dn = base_dn
+        self.base_container = base_container
+        self.timeout = timeout
+        self.start_tls = start_tls
+        self.username = None
+        self.bound = False
+        self.bind_error = None
+        self._reader = self._writer = self._listener = None
+        self._failure = None
+        self._pending = {}
+        self._message_ids = itertools.count(1)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # -- transport ----------------------------------------------------------
+
+    async def _open(self):
+        server = Server(self.server_host)
+        self._failure = None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(server.host, server.port, ssl=self._tls_context() if server.ssl else None),
+            self.timeout,
+        )
+        self._listener = asyncio.create_task(self._listen())
+
+        if self.start_tls and not server.ssl:
+            result = await self._request('extendedReq', extended_operation(START_TLS_OID))
+            if result['result'] != 0:
+                raise ConnectionError(f"StartTLS refused: {result['description']}")
+            await self._writer.start_tls(self._tls_context())
+
+    @staticmethod
+    def _tls_context():
+        # Same as ADConnection's start_tls(): encrypted, certificate not validated
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+
+    async def _listen(self):
+        """Read LDAP messages and hand each to the queue of its message ID."""
+        buffer = b''
+        try:
+            while True:
+                size = BaseStrategy.compute_ldap_message_size(buffer)
+                if size == -1 or len(buffer) < size:
+                    data = await self._reader.read(65536)
+                    if not data:
+                        raise ConnectionError('connection closed by the server')
+                    buffer += data
+                    continue
+
+                message, buffer = decode_message_fast(buffer[:size]), buffer[size:]
+                queue = self._pending.get(message['messageID'])
+                if queue is not None:
+                    queue.put_nowait(message)
+        except Exception as exc:
+            # Nothing reads replies any more: later requests must fail, not wait forever
+            self.bound = False
+            self._failure = exc
+            for queue in self._pending.values():
+                queue.put_nowait(exc)
+
+    def _raise_if_failed(self):
+        if self._failure is not None:
+            raise ConnectionError(f"AD connection lost: {self._failure}") from self._failure
+
+    async def _send(self, operation, request, controls=None):
+        self._raise_if_failed()
+        message_id = next(self._message_ids)
+        message = LDAPMessage()
+        message['messageID'] = MessageID(message_id)
+        message['protocolOp'] = ProtocolOp().setComponentByName(operation, request)
+        if controls is not None:
+            message['controls'] = controls
+        self._pending[message_id] = asyncio.Queue()
+        self._writer.write(encode(message))
+        await self._writer.drain()
+        return message_id
+
+    async def _receive(self, message_id):
+        if self._pending[message_id].empty():
+            self._raise_if_failed()
+        item = await asyncio.wait_for(self._pending[message_id].get(), self.timeout)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def _request(self, operation, request):
+        """Send a single-response request and return the decoded result dict."""
+        message_id = await self._send(operation, request)
+        try:
+            message = await self._receive(message_id)
+        finally:
+            self._pending.pop(message_id, None)
+        if message['protocolOp'] == BIND_RESPONSE:
+            return bind_response_to_dict_fast(message['payload'])
+        if message['protocolOp'] == EXTENDED_RESPONSE:
+            return extended_response_to_dict_fast(message['payload'])
+        return ldap_result_to_dict_fast(message['payload'])
+
+    async def _search(self, base, ldap_filter, scope=SUBTREE, attributes=None):
+        """Entries matching ``ldap_filter`` (referrals are ignored); raises on an error result."""
+        self._ensure_bound()
+        request = search_operation(
+            base, ldap_filter, scope, DEREF_ALWAYS, attributes or ['1.1'],
+            0, 0, False, False, True,
+        )
+        started = time.perf_counter()
+        message_id = await self._send('searchRequest', request)
+        entries = []
+        try:
+            while True:
+                message = await self._receive(message_id)
+                op = message['protocolOp']
+                if op == SEARCH_ENTRY:
+                    entries.append(AsyncEntry(search_result_entry_response_to_dict_fast(
+                        message['payload'], None, None, False,
+                    )))
+                elif op == SEARCH_DONE:
+                    result = ldap_result_to_dict_fast(message['payload'])
+                    ad_trace.record('search', base, started, result['result'], result['description'], len(entries))
+                    if result['result'] != 0:
+                        raise LookupError(f"Search failed: {result['description']} {result['message']}")
+                    return entries
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            ad_trace.record('search', base, started, -1, f'{type(e).__name__}: {e}')
+            raise
+        finally:
+            self._pending.pop(message_id, None)
+
+    def _ensure_bound(self):
+        if not self.bound:
+            raise Exception("Not connected to AD")
+
+    # -- ADConnection API ---------------------------------------------------
+
+    async def connect_ad(self, username: str, password: str) -> bool:
+        self.username = (
+            username if f"@{self.domain}" in username
+            else f"{username}@{self.domain}"
+        )
+        self.bind_error = None
+        await self.close()
+
+        started = time.perf_counter()
+        try:
+            await self._open()
+            result = await self._request('bindRequest', bind_operation(3, 'SIMPLE', self.username, password))
+        except Exception as e:
+            ad_trace.record('bind', self.username, started, -1, f'{type(e).__name__}: {e}')
+            logger.error(f"Error connecting to AD: {e!r}")
+            self.bind_error = BIND_UNAVAILABLE
+            await self.close()
+            return False
+
+        ad_trace.record('bind', self.username, started, result['result'], result['description'])
+        if result['result'] != 0:
+            logger.error("Authentication failed")
+            self.bind_error = BIND_INVALID if result['result'] == LDAP_INVALID_CREDENTIALS else BIND_UNAVAILABLE
+            await self.close()
+            return False
+
+        self.bound = True
+        logger.info(f"Successfully connected as {self.username}")
+        return True
+
+    async def search_user_full_info(self, username, attributes=None):
+        return await self._search(
+            self.base_dn, f'(sAMAccountName={escape_filter_chars(username)})', attributes=attributes or ['*'],
+        )
+
+    async def search_user_dn(self, username):
+        entries = await self._search(self.base_dn, f'(sAMAccountName={escape_filter_chars(username)})')
+        return [entry.entry_dn for entry in entries]
+
+    async def search_users_dn(self, usernames, batch_size=200):
+        """{sAMAccountName (lower-case): DN}; the batches are searched concurrently."""
+        names = sorted({u.split('@')[0].strip().lower() for u in usernames if u and u.strip()})
+        batches = [names[start:start + batch_size] for start in range(0, len(names), batch_size)]
+        results = await asyncio.gather(*(
+            self._search(
+                self.base_dn,
+                '(|{})'.format(''.join(f'(sAMAccountName={escape_filter_chars(name)})' for name in batch)),
+                attributes=['sAMAccountName'],
+            )
+            for batch in batches
+        ))
+        return {
+            str(entry.sAMAccountName[0]).lower(): entry.entry_dn
+            for entries in results for entry in entries if getattr(entry, 'sAMAccountName', None)
+        }
+
+    async def get_token_groups(self, user_dn):
+        """See ADConnection.get_token_groups."""
+        try:
+            entries = await self._search(user_dn, '(objectClass=user)', scope=BASE, attributes=['tokenGroups'])
+        except LookupError as e:
+            logger.warning(f"tokenGroups read failed for {user_dn}: {e}")
+            return None
+        if not entries:
+            return None
+        return [sid_to_str(sid) for sid in entries[0].raw('tokenGroups')]
+
+    async def close(self):
+        self.bound = False
+        if self._writer is None:
+            return
+        writer, listener = self._writer, self._listener
+        self._reader = self._writer = self._listener = None
+        try:
+            writer.write(encode(_unbind_message(next(self._message_ids))))
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), 1)
+        except Exception:
+            pass
+        if listener:
+            listener.cancel()
+
+
+def _unbind_message(message_id):
+    message = LDAPMessage()
+    message['messageID'] = MessageID(message_id)
+    message['protocolOp'] = ProtocolOp().setComponentByName('unbindRequest', unbind_operation())
+    return message
@@ -0,0 +1,196 @@
+"""
+Timing of every LDAP operation ADConnection sends.
+
+Each bind, search, add, modify, modify_dn and delete becomes a Span. The
+process-wide ``tracer`` keeps, per (operation, caller):
+  * a latency histogram,
+  * the result codes of failed operations,
+  * the total result size (entries returned).
+The slowest recent spans (at least ``slow_ms``) are kept for the admin's
+"AD operations" page. Hooks are callables that receive every span, e.g. to
+ship them to a tracing backend (AD_TRACE_HOOKS). A hook that raises is
+logged and skipped.
+
+The caller is the first function up the stack outside ADIWA.ad_conn and
+ldap3, e.g. 'core.auth_backends._login'. Numbers are per process.
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Frames from these modules are skipped when looking for the caller
+_INTERNAL_MODULES = ('ADIWA.ad_conn', 'ADIWA.ad_trace', 'ldap3')
+
+
+@dataclass(frozen=True)
+class Span:
+    operation: str
+    caller: str
+    target: str          # bind user, search base or entry DN
+    started_at: float    # time.time()
+    duration_ms: float
+    result_code: int     # LDAP result code; -1 if no response (exception)
+    result: str          # LDAP result description or exception text
+    size: int = 0        # entries returned by a search
+
+    @property
+    def ok(self):
+        return self.result_code == 0
+
+    @property
+    def started(self):
+        return datetime.fromtimestamp(self.started_at, tz=timezone.utc)
+
+    def as_dict(self):
+        return {**asdict(self), 'ok': self.ok}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (``max`` for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return self.max
+
+
+class _OperationStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = Counter()
+        self.results = 0
+
+
+class ADTracer:
+    def __init__(self, slow_ms=500, keep_slow=100):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slow = deque(maxlen=keep_slow)
+        self._hooks = []
+
+    def configure(self, slow_ms=None, hooks=None):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if hooks is not None:
+            self._hooks = list(hooks)
+
+    def add_hook(self, hook):
+        self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        self._hooks = [h for h in self._hooks if h is not hook]
+
+    def record(self, span):
+        with self._lock:
+            stats = self._stats.get((span.operation, span.caller))
+            if stats is None:
+                stats = self._stats[(span.operation, span.caller)] = _OperationStats()
+            stats.latency.observe(span.duration_ms)
+            stats.results += span.size
+            if not span.ok:
+                stats.errors[f'{span.result_code} {span.result}'.strip()] += 1
+            if span.duration_ms >= self.slow_ms:
+                self._slow.append(span)
+
+        for hook in self._hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                logger.warning(f"AD trace hook {hook!r} failed: {e}")
+
+    def stats(self):
+        """One dict per (operation, caller), the most total time first."""
+        with self._lock:
+            rows = [
+                {
+                    'operation': operation,
+                    'caller': caller,
+                    'count': stats.latency.count,
+                    'total_ms': round(stats.latency.sum, 1),
+                    'mean_ms': round(stats.latency.sum / stats.latency.count, 1),
+                    'p50_ms': stats.latency.quantile(0.5),
+                    'p95_ms': stats.latency.quantile(0.95),
+                    'max_ms': round(stats.latency.max, 1),
+                    'buckets': dict(zip([*map(str, stats.latency.buckets), '+Inf'], stats.latency.counts)),
+                    'results': stats.results,
+                    'errors': dict(stats.errors),
+                }
+                for (operation, caller), stats in self._stats.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def slow_operations(self):
+        """The kept slow spans, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+
+
+tracer = ADTracer()
+
+
+def find_caller():
+    """'module.function' of the first frame outside the AD client and ldap3."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(_INTERNAL_MODULES):
+            return f'{module}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+def record(operation, target, started, result_code, result, size=0, caller=None):
+    """Record a span that began at ``started`` (time.perf_counter())."""
+    duration_ms = (time.perf_counter() - started) * 1000
+    tracer.record(Span(
+        operation=operation,
+        caller=caller or find_caller(),
+        target=str(target or ''),
+        started_at=time.time() - duration_ms / 1000,
+        duration_ms=round(duration_ms, 3),
+        result_code=result_code,
+        result=result or '',
+        size=size,
+    ))
+
+
+def log_slow_span(span):
+    """Hook: log spans slower than the tracer's slow threshold."""
+    if span.duration_ms >= tracer.slow_ms:
+        logger.warning(
+            f"Slow AD {span.operation} from {span.caller}: {span.duration_ms:.0f} ms "
+            f"({span.result or span.result_code}, {span.size} entries) on {span.target}"
+        )
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -106,8 +107,107 @@ ACTIVE_DIR = ADConnection(
     domain=DOMAIN,
     base_dn=BASE_DN,
     base_container=CONTAINER_DN_BASE,
+    # Check the DC is reachable at startup; benchmarks turn this off
+    probe=os.getenv('AD_PROBE_ON_STARTUP', 'True') == 'True',
+    # Seconds to wait for the DC on connect/bind before treating it as unavailable
+    timeout=int(os.getenv('AD_TIMEOUT', 10)),
+    start_tls=os.getenv('AD_START_TLS', 'True') == 'True',
 )
 
+# Read-only directory snapshot written by "Sync Users" and mmap'ed by every worker
+DIRECTORY_SNAPSHOT_PATH = os.getenv(
+    'DIRECTORY_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'var', 'directory.snap')
+)
+DIRECTORY_SNAPSHOT_MAX_AGE = int(os.getenv('DIRECTORY_SNAPSHOT_MAX_AGE', 24 * 60 * 60))
+
+# Audit events (OU transfers, admin AD actions) are written in batches off the request path
+AUDIT_WRITE_BEHIND = os.getenv('AUDIT_WRITE_BEHIND', 'True') == 'True'
+AUDIT_SPOOL_PATH = os.getenv('AUDIT_SPOOL_PATH', os.path.join(BASE_DIR, 'var', 'audit_spool.ndjson'))
+# Spooled events that fail this many writes are moved to <AUDIT_SPOOL_PATH>.dead
+AUDIT_SPOOL_MAX_ATTEMPTS = int(os.getenv('AUDIT_SPOOL_MAX_ATTEMPTS', 5))
+
+# "manage.py archive_audit" moves older OU transfer logs out of the hot table
+AUDIT_RETENTION_MONTHS = int(os.getenv('AUDIT_RETENTION_MONTHS', 12))
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'var', 'audit_archive'))
+
+# Directory writes go through the core.outbox table and are applied by a worker
+# ("manage.py process_directory_outbox --loop"); with INLINE they are also
+# applied from a background thread right after the request commits.
+DIRECTORY_OUTBOX_INLINE = os.getenv('DIRECTORY_OUTBOX_INLINE', 'True') == 'True'
+DIRECTORY_OUTBOX_WORKERS = int(os.getenv('DIRECTORY_OUTBOX_WORKERS', 4))
+DIRECTORY_OUTBOX_MAX_ATTEMPTS = int(os.getenv('DIRECTORY_OUTBOX_MAX_ATTEMPTS', 8))
+
+# Optional service account for the outbox worker; without it the requesting
+# admin's cached login is used (only available to the inline worker).
+AD_SERVICE_USERNAME = os.getenv('AD_SERVICE_USERNAME')
+AD_SERVICE_PASSWORD = os.getenv('AD_SERVICE_PASSWORD')
+
+# Parallel LDAP connections used by bulk user creation (admin CSV import and
+# "manage.py provision_ad_users")
+AD_PROVISION_WORKERS = int(os.getenv('AD_PROVISION_WORKERS', 8))
+
+# Sync Django groups / is_staff / is_superuser from AD groups at every login
+# (mappings are managed under Core > AD Group Mappings)
+AD_GROUP_SYNC = os.getenv('AD_GROUP_SYNC', 'True') == 'True'
+
+# AD credentials captured at login (core.vault): encrypted, shared by all
+# workers, expire after CREDENTIAL_VAULT_TTL idle seconds, revoked on logout.
+CREDENTIAL_VAULT_BACKEND = os.getenv('CREDENTIAL_VAULT_BACKEND', 'core.vault.DatabaseVault')
+CREDENTIAL_VAULT_TTL = int(os.getenv('CREDENTIAL_VAULT_TTL', 15 * 60))
+CREDENTIAL_VAULT_DIR = os.getenv('CREDENTIAL_VAULT_DIR', os.path.join(BASE_DIR, 'var', 'credentials'))
+
+# Fernet keys for the secrets stored by core.crypto, comma-separated, newest first.
+# Generate one with:
+#   python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+# Unset, a development key is derived from SECRET_KEY.
+CREDENTIAL_ENCRYPTION_KEYS = [
+    key.strip() for key in os.getenv('CREDENTIAL_ENCRYPTION_KEYS', '').split(',') if key.strip()
+]
+
+# The API only uses JWT. Set to True to also open a Django session on API
+# login (one django_session write per login; purge with purge_stale_sessions).
+API_LOGIN_SESSIONS = os.getenv('API_LOGIN_SESSIONS', 'False') == 'True'
+
+# Seconds a worker caches a user's JWT version (core.tokens). The default cache
+# is per process, so a revoked or deactivated user's tokens keep working on
+# the other workers for up to this long. Raise it only with a shared CACHES backend.
+TOKEN_VERSION_CACHE_TIMEOUT = int(os.getenv('TOKEN_VERSION_CACHE_TIMEOUT', 5))
+
+# Every LDAP operation is timed (ADIWA.ad_trace). Operations slower than this
+# are listed on the admin's "AD operations" page; AD_TRACE_HOOKS are dotted
+# paths of callables that receive every span (e.g. 'ADIWA.ad_trace.log_slow_span').
+AD_SLOW_OPERATION_MS = int(os.getenv('AD_SLOW_OPERATION_MS', 500))
+AD_TRACE_HOOKS = [hook for hook in os.getenv('AD_TRACE_HOOKS', '').split(',') if hook]
+
+# GET /metrics (Prometheus text format, core.metrics). With METRICS_DIR each
+# worker process writes its numbers there and /metrics reports all of them.
+# With METRICS_TOKEN set, scrapes must send "Authorization: Bearer <token>".
+# Without it, only staff sessions and clients whose address (REMOTE_ADDR) is in
+# METRICS_ALLOWED_IPS (addresses or networks, comma separated) may scrape.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()
+]
+
+# /readyz fails when the domain controller is unreachable only if this is set
+# (see core.health)
+READINESS_REQUIRES_AD = os.getenv('READINESS_REQUIRES_AD', 'False') == 'True'
+
+# Serve the login and profile endpoints from the asyncio views (for the ASGI
+# deployment): LDAP waits then suspend a coroutine instead of holding a thread.
+ASYNC_API_VIEWS = os.getenv('ASYNC_API_VIEWS', 'False') == 'True'
+
+# Opt-in (core.verifier): after a successful bind keep a salted slow hash of
+# the password for AD_LOGIN_VERIFIER_TTL seconds (0 = off). While the DC is
+# unavailable a repeat login in that window is verified locally, at most
+# AD_LOGIN_VERIFIER_MAX_USES times, and confirmed by a bind once the DC answers.
+AD_LOGIN_VERIFIER_TTL = int(os.getenv('AD_LOGIN_VERIFIER_TTL', 0))
+AD_LOGIN_VERIFIER_MAX_USES = int(os.getenv('AD_LOGIN_VERIFIER_MAX_USES', 3))
+# After a failed bind the DC counts as degraded for this long; logins with a
+# verifier then skip the bind instead of waiting for AD_TIMEOUT again.
+AD_DEGRADED_SECONDS = int(os.getenv('AD_DEGRADED_SECONDS', 60))
+
 CACHES = {
     'default':{
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -192,6 +292,12 @@ JAZZMIN_SETTINGS = {
                 "icon": "fas fa-exchange-alt", 
                 "permissions": ["employee.view_employee"]
             },
+            {
+                "name": "Bulk Transfer OU",
+                "url": "admin:bulk_transfer_ou",
+                "icon": "fas fa-people-arrows",
+                "permissions": ["employee.change_employee"]
+            },
         ],
     },
     
@@ -201,7 +307,7 @@ JAZZMIN_SETTINGS = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -224,4 +330,17 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'AD Web App API',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
-}
\ No newline at end of file
+}
+
+# The app's own loggers go to the console; the root logger is left alone
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        name: {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO'), 'propagate': False}
+        for name in ('ADIWA', 'core', 'employee')
+    },
+}
@@ -4,10 +4,14 @@ from django.urls import path,include
 from django.conf import settings
 from django.views.generic import TemplateView
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from core.views import healthz, metrics, readyz
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('', TemplateView.as_view(template_name='index.html')),
     
     
@@ -0,0 +1,123 @@
+"""
+Concurrent API logins against a slow domain controller, sync vs async views.
+
+    python -m benchmarks.async_load [--logins 50] [--delay 0.2] [--json results.json]
+
+Both views run under Django's ASGI handler in one process (one worker). The
+DC is benchmarks.slow_dc, which answers every request after ``--delay``
+seconds. LoginView runs in the worker's single sync thread, so its binds
+queue up; AsyncLoginView suspends while it waits, so its binds overlap.
+``max_in_flight`` is the most binds the DC saw at once.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from django.urls import path
+
+LOGIN_PATHS = {'sync': '/sync/login/', 'async': '/async/login/'}
+
+# This module is the ROOT_URLCONF during the run; filled in after django.setup()
+urlpatterns = []
+
+
+def _urlpatterns():
+    from django.views.decorators.csrf import csrf_exempt
+
+    from core.views import AsyncLoginView, LoginView
+
+    return [
+        path(LOGIN_PATHS['sync'].lstrip('/'), LoginView.as_view()),
+        path(LOGIN_PATHS['async'].lstrip('/'), csrf_exempt(AsyncLoginView.as_view())),
+    ]
+
+
+async def measure(server, client, mode, usernames):
+    server.max_in_flight = server.requests = 0
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post(LOGIN_PATHS[mode], {'username': name, 'password': 'secret'}, content_type='application/json')
+        for name in usernames
+    ))
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses), [r.content for r in responses]
+    return {
+        'logins': len(usernames),
+        'wall_s': round(elapsed, 3),
+        'logins_per_s': round(len(usernames) / elapsed, 1),
+        'max_in_flight': server.max_in_flight,
+    }
+
+
+async def run(args):
+    from django.conf import settings
+    from django.test import AsyncClient
+    from django.test.utils import override_settings
+
+    from ADIWA.ad_conn import ADConnection
+    from benchmarks.slow_dc import SlowDirectoryServer
+
+    names = [f'bench{index}' for index in range(args.logins)]
+    server = SlowDirectoryServer(
+        {name: {'dn': f'CN={name},OU=New,{settings.BASE_DN}', 'sAMAccountName': name} for name in names},
+        delay=args.delay,
+    )
+    host = f'127.0.0.1:{await server.start()}'
+    directory = ADConnection(
+        server_host=host, domain=settings.DOMAIN, base_dn=settings.BASE_DN,
+        base_container=settings.CONTAINER_DN_BASE, probe=False, timeout=10, start_tls=False,
+    )
+
+    urlpatterns[:] = _urlpatterns()
+    results = {}
+    try:
+        with override_settings(
+            ROOT_URLCONF=__name__, SERVER_HOST=host, ACTIVE_DIR=directory, AD_GROUP_SYNC=False,
+        ):
+            for mode in ('sync', 'async'):
+                results[mode] = await measure(server, AsyncClient(), mode, names)
+    finally:
+        await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.2, help='DC response delay in seconds')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    os.environ.setdefault('AD_START_TLS', 'False')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from core.models import User
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    User.objects.bulk_create(
+        User(username=f'bench{index}@{settings.DOMAIN}') for index in range(args.logins)
+    )
+
+    results = asyncio.run(run(args))
+    results['delay_s'] = args.delay
+
+    for mode in ('sync', 'async'):
+        print(f"{mode:<6} " + '  '.join(f'{key}={value}' for key, value in results[mode].items()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
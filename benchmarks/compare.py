@@ -0,0 +1,46 @@
+"""
+Compare two benchmark JSON files, e.g. from benchmarks.scale on two commits.
+
+    python -m benchmarks.compare before.json after.json [--threshold 10]
+
+Prints every number found in both files with the relative change. Changes
+beyond --threshold percent are marked; all the measures are costs, so
+``+`` is a regression.
+"""
+import argparse
+import json
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='Percent change worth flagging')
+    args = parser.parse_args()
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"before {before.get('commit')}  after {after.get('commit')}")
+    old = dict(flatten(before.get('sizes', before)))
+    width = max(map(len, old), default=0)
+    for key, new in flatten(after.get('sizes', after)):
+        if key not in old:
+            continue
+        change = (new - old[key]) / old[key] * 100 if old[key] else 0.0
+        flag = ' <<' if abs(change) >= args.threshold else ''
+        print(f"{key:<{width}}  {old[key]:>12}  {new:>12}  {change:+7.1f}%{flag}")
+
+
+if __name__ == '__main__':
+    main()
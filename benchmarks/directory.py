@@ -0,0 +1,124 @@
+"""
+A synthetic Active Directory on ldap3's mock strategies.
+
+    directory = SyntheticDirectory(users=10_000)
+    ad = directory.connection()      # an ADConnection on it, not yet bound
+    ad.connect_ad(ADMIN_USERNAME, PASSWORD)
+
+The users are spread round-robin over ``ous`` OUs under CONTAINER_DN_BASE.
+They have a display name, job title, mail and phone, the attributes read by
+the sync and the profile. Every connection shares one ldap3 Server, so a
+move made through one connection is seen by the next search.
+
+ldap3's mock evaluates each filter against every entry in Python. A search
+therefore costs O(users): compare numbers at the same size only.
+"""
+from ldap3 import MOCK_ASYNC, MOCK_SYNC, Connection, Server
+
+from ADIWA.ad_conn import BIND_INVALID, ADConnection, TracedConnection
+
+ADMIN_USERNAME = 'bench.admin'
+PASSWORD = 'Bench-Passw0rd'
+
+
+class SyntheticDirectory:
+    def __init__(self, users, ous=20, jobs=50, domain='eissa.local',
+                 base_dn='DC=eissa,DC=local', container='OU=New,DC=eissa,DC=local'):
+        self.users = users
+        self.domain = domain
+        self.base_dn = base_dn
+        self.container = container
+        self.ous = [f'Dept{i:02d}' for i in range(ous)]
+        self.server = Server('synthetic-dc')
+
+        add = Connection(self.server, client_strategy=MOCK_SYNC).strategy.add_entry
+        add(container, {'objectClass': ['top', 'organizationalUnit'], 'ou': container.split(',')[0][3:]})
+        for ou in self.ous:
+            add(f'OU={ou},{container}', {'objectClass': ['top', 'organizationalUnit'], 'ou': ou})
+
+        add(f'CN={ADMIN_USERNAME},{container}', {
+            'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+            'sAMAccountName': ADMIN_USERNAME,
+            'userPrincipalName': f'{ADMIN_USERNAME}@{domain}',
+            'userPassword': PASSWORD,
+        })
+        for i in range(users):
+            username = self.username(i)
+            add(self.dn(i), {
+                'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+                'sAMAccountName': username,
+                'userPrincipalName': f'{username}@{domain}',
+                'displayName': f'User {i:06d}',
+                'title': f'Job {i % jobs:02d}',
+                'mail': f'{username}@{domain}',
+                'telephoneNumber': str(100000 + i),
+                'userPassword': PASSWORD,
+            })
+
+    @staticmethod
+    def username(i):
+        # Fixed width, so no username is a substring of another
+        return f'user{i:06d}'
+
+    def dn(self, i):
+        return f'CN={self.username(i)},OU={self.ous[i % len(self.ous)]},{self.container}'
+
+    def bind_dn(self, username):
+        """The DN AD would resolve a UPN bind to; the mock only binds by DN."""
+        sam = username.split('@')[0].lower()
+        if sam == ADMIN_USERNAME:
+            return f'CN={ADMIN_USERNAME},{self.container}'
+        dn = self.dn(int(sam[len('user'):]))
+        if dn in self.server.dit:
+            return dn
+        # Moved since it was created; the mock keeps attribute values as bytes
+        return next(
+            (dn for dn, attributes in self.server.dit.items()
+             if attributes.get('sAMAccountName') == [sam.encode()]),
+            dn,
+        )
+
+    def connection(self, **kwargs):
+        """An ADConnection on this directory; accepts (and ignores) ADConnection's server settings."""
+        return MockADConnection(self, **kwargs)
+
+
+class MockADConnection(ADConnection):
+    """ADConnection whose binds go to a SyntheticDirectory instead of a DC."""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(
+            server_host=directory.server.host,
+            domain=directory.domain,
+            base_dn=directory.base_dn,
+            base_container=directory.container,
+            probe=False,
+            start_tls=False,
+        )
+        self.directory = directory
+
+    def connect_ad(self, username, password):
+        self.username = username if f"@{self.domain}" in username else f"{username}@{self.domain}"
+        self.server = self.directory.server
+        self.bind_error = None
+        self._close_pipeline()
+
+        self.conn = TracedConnection(
+            self.server, user=self.directory.bind_dn(self.username), password=password,
+            client_strategy=MOCK_SYNC,
+        )
+        if not self.conn.bind():
+            self.bind_error = BIND_INVALID
+            return False
+        return True
+
+    def _pipeline_connection(self):
+        if self._pipeline is None or not self._pipeline.bound:
+            self._ensure_bound()
+            conn = TracedConnection(
+                self.server, user=self.conn.user, password=self.conn.password, client_strategy=MOCK_ASYNC,
+            )
+            if not conn.bind():
+                raise Exception(f"Failed to open a pipelining connection as {self.username}")
+            self._pipeline = conn
+        return self._pipeline
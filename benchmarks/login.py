@@ -0,0 +1,99 @@
+"""
+API login latency and database writes, with and without a Django session.
+
+    python -m benchmarks.login [--logins 500] [--json results.json]
+
+The directory is a stand-in that accepts every bind, so the numbers are the
+cost of the Django side of a login (vault write, session, JWT).
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from unittest import mock
+
+
+class AcceptingDirectory:
+    """Accepts every bind; group sync is skipped because no mapping exists."""
+
+    def connect_ad(self, username, password):
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def measure(client, logins):
+    from django.contrib.sessions.models import Session
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # Warm up (imports, first queries) before timing
+    for _ in range(10):
+        client.post('/api/auth/login/', {'username': 'bench', 'password': 'x'}, content_type='application/json')
+    Session.objects.all().delete()
+    client.cookies.clear()
+    latencies, writes = [], 0
+    for _ in range(logins):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.post(
+                '/api/auth/login/', {'username': 'bench', 'password': 'x'}, content_type='application/json',
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.content
+        writes += sum(1 for query in queries if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')))
+        client.cookies.clear()
+
+    latencies.sort()
+    return {
+        'logins': logins,
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        'writes_per_login': round(writes / logins, 2),
+        'sessions_created': Session.objects.count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+
+    from core.models import User
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    User.objects.create_user(username=f'bench@{settings.DOMAIN}', password='x')
+
+    results = {}
+    for mode, sessions in (('session', True), ('stateless', False)):
+        with override_settings(API_LOGIN_SESSIONS=sessions), \
+                mock.patch('core.auth_backends.new_directory', AcceptingDirectory):
+            results[mode] = measure(Client(), args.logins)
+
+    for mode, result in results.items():
+        print(f"{mode:<10} " + '  '.join(f'{key}={value}' for key, value in result.items()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
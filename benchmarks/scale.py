@@ -0,0 +1,276 @@
+"""
+AD sync, profile, OU transfer and admin changelist costs at 1k/10k/100k users.
+
+    python -m benchmarks.scale [--sizes 1000 10000 100000] [--samples 50] [--json results.json]
+    python -m benchmarks.compare before.json after.json
+
+Each size starts from an empty database and a fresh benchmarks.directory
+SyntheticDirectory with that many users. One Department exists per OU. The
+admin "Sync Users from AD" view then fills the user and employee tables
+from the directory. Measured:
+  * sync        - the first sync (creates everything) and a repeat (no changes)
+  * profile     - GET /api/employee/profile/ for sampled employees (JWT)
+  * transfer    - the transfer page lookup, queuing the move and the outbox applying it
+  * changelist  - the employee admin changelist, first page and a search
+  * memory      - peak Python allocations (tracemalloc) during another repeat
+                  sync, and the process's peak RSS so far
+
+The database is in-memory SQLite by default. BENCHMARK_DB=project uses the
+project's SQL Server instead (see benchmarks/settings.py). The JSON has the
+commit, so two runs can be compared with benchmarks.compare.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest import mock
+
+from .directory import ADMIN_USERNAME, PASSWORD, SyntheticDirectory
+
+EMPLOYEE_CHANGELIST = '/admin/employee/employee/'
+SYNC_URL = '/admin/employee/employee/sync-users/'
+TRANSFER_URL = '/admin/employee/employee/transfer-ou/'
+PROFILE_URL = '/api/employee/profile/'
+CHANGELIST_RENDERS = 10
+
+
+def timings(latencies):
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(latencies[math.ceil(len(latencies) * 0.5) - 1], 3),
+        'p95_ms': round(latencies[math.ceil(len(latencies) * 0.95) - 1], 3),
+        'max_ms': round(latencies[-1], 3),
+    }
+
+
+@contextmanager
+def counting_queries():
+    """Count queries without keeping their SQL (a sync at 100k runs ~500k)."""
+    from django.db import connection
+
+    counter = {'queries': 0}
+
+    def count(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        yield counter
+
+
+def timed(client, method, url, expected, **kwargs):
+    with counting_queries() as counter:
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == expected, (url, response.status_code, response.content[:500])
+    return elapsed, counter['queries']
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure_sync(client, users):
+    from employee.models import Employee
+
+    first, first_queries = timed(client, 'get', SYNC_URL, 302)
+    synced = Employee.objects.count()
+    assert synced == users + 1, f"expected {users + 1} employees after the sync, found {synced}"
+    repeat, repeat_queries = timed(client, 'get', SYNC_URL, 302)
+    return {
+        'employees': synced,
+        'first_s': round(first / 1000, 3),
+        'first_queries': first_queries,
+        'repeat_s': round(repeat / 1000, 3),
+        'repeat_queries': repeat_queries,
+    }
+
+
+def measure_profile(client, sample):
+    from core.models import User
+    from core.tokens import tokens_for_user
+
+    latencies, queries = [], 0
+    for user in User.objects.filter(username__in=sample):
+        token = tokens_for_user(user).access_token
+        elapsed, count = timed(client, 'get', PROFILE_URL, 200, HTTP_AUTHORIZATION=f'JWT {token}')
+        latencies.append(elapsed)
+        queries += count
+    return {**timings(latencies), 'queries_per_request': round(queries / len(latencies), 2)}
+
+
+def measure_transfer(client, directory, sample):
+    from core.models import DirectoryOperation
+    from core.outbox import process_outbox
+    from employee.audit import audit_writer
+    from employee.models import OUTransferLog
+
+    lookups, queues, applies = [], [], []
+    for username in sample:
+        lookups.append(timed(client, 'get', TRANSFER_URL, 200, data={'username': username})[0])
+
+        i = int(username[len('user'):])
+        new_ou = directory.ous[(i + 1) % len(directory.ous)]
+        queues.append(timed(client, 'post', TRANSFER_URL, 302, data={
+            'username': username, 'new_ou': new_ou, 'update_db': 'on', 'current_dn': directory.dn(i),
+        })[0])
+
+        start = time.perf_counter()
+        assert process_outbox() == 1
+        applies.append((time.perf_counter() - start) * 1000)
+
+    failed = DirectoryOperation.objects.exclude(status='applied').count()
+    assert not failed, f"{failed} transfers were not applied"
+    audit_writer.flush()
+    moved = OUTransferLog.objects.filter(status='success', database_updated=True).count()
+    assert moved == len(sample), f"only {moved} of {len(sample)} transfers updated the employee"
+    return {'lookup': timings(lookups), 'queue': timings(queues), 'apply': timings(applies)}
+
+
+def measure_changelist(client, username):
+    pages, searches, page_queries, search_queries = [], [], 0, 0
+    for _ in range(CHANGELIST_RENDERS):
+        elapsed, count = timed(client, 'get', EMPLOYEE_CHANGELIST, 200)
+        pages.append(elapsed)
+        page_queries = count
+        elapsed, count = timed(client, 'get', EMPLOYEE_CHANGELIST, 200, data={'q': username})
+        searches.append(elapsed)
+        search_queries = count
+    return {
+        'first_page': {**timings(pages), 'queries': page_queries},
+        'search': {**timings(searches), 'queries': search_queries},
+    }
+
+
+def measure_sync_memory(client):
+    tracemalloc.start()
+    try:
+        timed(client, 'get', SYNC_URL, 302)
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(users, samples, transfers, snapshot_dir):
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from core import outbox
+    from core.models import User
+    from core.vault import get_vault
+    from employee.models import Department
+
+    call_command('flush', interactive=False, verbosity=0)
+
+    start = time.perf_counter()
+    directory = SyntheticDirectory(users)
+    build_s = time.perf_counter() - start
+
+    Department.objects.bulk_create(Department(name=ou) for ou in directory.ous)
+    admin = User.objects.create_superuser(username=f'{ADMIN_USERNAME}@{settings.DOMAIN}', password=PASSWORD)
+    get_vault().store(admin.pk, ADMIN_USERNAME, PASSWORD)
+    client = Client()
+    client.force_login(admin)
+
+    rng = random.Random(users)
+    picked = [directory.username(i) for i in rng.sample(range(users), min(samples, users))]
+
+    outbox._drop_connection(ADMIN_USERNAME)
+    with override_settings(
+        ACTIVE_DIR=directory.connection(),
+        AD_SERVICE_USERNAME=ADMIN_USERNAME,
+        AD_SERVICE_PASSWORD=PASSWORD,
+        DIRECTORY_OUTBOX_INLINE=False,
+        DIRECTORY_SNAPSHOT_PATH=os.path.join(snapshot_dir, f'directory-{users}.snap'),
+    ), mock.patch('core.outbox.ADConnection', directory.connection), \
+            mock.patch('employee.utils.new_directory', directory.connection), \
+            mock.patch('employee.views.new_directory', directory.connection):
+        result = {
+            'directory_build_s': round(build_s, 3),
+            'sync': measure_sync(client, users),
+            'profile': measure_profile(client, [f'{name}@{settings.DOMAIN}' for name in picked]),
+            'transfer': measure_transfer(client, directory, picked[:transfers]),
+            'changelist': measure_changelist(client, picked[0]),
+            'memory': {'sync_peak_mb': measure_sync_memory(client), 'peak_rss_mb': peak_rss_mb()},
+        }
+    outbox._drop_connection(ADMIN_USERNAME)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--samples', type=int, default=50, help='Profile requests per size')
+    parser.add_argument('--transfers', type=int, default=20, help='OU transfers per size')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        for users in args.sizes:
+            result = results['sizes'][str(users)] = run_size(users, args.samples, args.transfers, snapshot_dir)
+            sync, profile, transfer, changelist = (
+                result['sync'], result['profile'], result['transfer'], result['changelist'],
+            )
+            print(
+                f"{users:>7} users  sync {sync['first_s']}s (repeat {sync['repeat_s']}s)  "
+                f"profile p95 {profile['p95_ms']}ms  "
+                f"transfer lookup/queue/apply p95 {transfer['lookup']['p95_ms']}/"
+                f"{transfer['queue']['p95_ms']}/{transfer['apply']['p95_ms']}ms  "
+                f"changelist p95 {changelist['first_page']['p95_ms']}ms  "
+                f"sync peak {result['memory']['sync_peak_mb']}MB  rss {result['memory']['peak_rss_mb']}MB"
+            )
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""
+Settings for the benchmarks: the project settings on a throwaway database
+(SQLite unless BENCHMARK_DB=project), without the startup AD probe or the
+debug toolbar.
+"""
+import os
+
+os.environ.setdefault('AD_PROBE_ON_STARTUP', 'False')
+os.environ.setdefault('AD_DOMAIN', 'eissa.local')
+os.environ.setdefault('AD_BASE_DN', 'DC=eissa,DC=local')
+os.environ.setdefault('AD_CONTAINER_DN_BASE', 'OU=New,DC=eissa,DC=local')
+os.environ.setdefault('SECRET_KEY', 'benchmarks-only')
+
+from ADIWA.settings import *  # noqa: E402,F401,F403
+
+DEBUG = False
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']  # noqa: F405
+MIDDLEWARE = [name for name in MIDDLEWARE if 'debug_toolbar' not in name]  # noqa: F405
+
+# BENCHMARK_DB=project keeps the project's database server (SQL Server from
+# the DB_* variables); the benchmarks then run in its test_<DB_NAME> database.
+if os.getenv('BENCHMARK_DB') != 'project':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCHMARK_DB', ':memory:'),
+        }
+    }
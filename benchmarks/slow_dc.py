@@ -0,0 +1,181 @@
+"""
+A minimal LDAP server that answers like a slow domain controller.
+
+Enough of the protocol for the login and profile paths: simple bind,
+search by sAMAccountName (single or OR-ed), base-scope reads of a user DN
+(tokenGroups) and unbind. Every response is delayed by ``delay`` seconds.
+No TLS, so clients must connect with start_tls=False.
+
+    server = SlowDirectoryServer(users={'jsmith': {...}}, delay=0.2)
+    port = await server.start()
+"""
+import asyncio
+import re
+
+from ldap3.protocol.rfc4511 import (
+    AttributeDescription, AttributeValue, BindResponse, LDAPDN, LDAPMessage, LDAPString, MessageID,
+    PartialAttribute, PartialAttributeList, ProtocolOp, ResultCode, SearchResultDone, SearchResultEntry, Vals,
+)
+from ldap3.strategy.base import BaseStrategy
+from ldap3.utils.asn1 import encode
+
+# Equality assertion on sAMAccountName inside a BER-encoded filter
+SAM_RE = re.compile(rb'\x04\x0esAMAccountName\x04([\x00-\x7f])', re.IGNORECASE)
+
+BIND_REQUEST, UNBIND_REQUEST, SEARCH_REQUEST = 0x60, 0x42, 0x63
+
+SUCCESS, NO_SUCH_OBJECT, INVALID_CREDENTIALS = 0, 32, 49
+
+
+class SlowDirectoryServer:
+    def __init__(self, users, password='secret', delay=0.0):
+        """``users``: {sam: {'dn': ..., attribute: value or [values], ...}}; every user binds with ``password``."""
+        self.users = {sam.lower(): attrs for sam, attrs in users.items()}
+        self.password = password
+        self.delay = delay
+        self.requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._server = None
+        self._writers = set()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        buffer = b''
+        tasks = set()
+        self._writers.add(writer)
+        try:
+            while True:
+                size = BaseStrategy.compute_ldap_message_size(buffer)
+                if size == -1 or len(buffer) < size:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    buffer += data
+                    continue
+                raw, buffer = buffer[:size], buffer[size:]
+                message_id, operation, fields = _parse(raw)
+                if operation == UNBIND_REQUEST:
+                    break
+                # Requests on one connection are answered concurrently, like a DC
+                task = asyncio.ensure_future(self._answer(writer, message_id, operation, fields))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _answer(self, writer, message_id, operation, fields):
+        self.requests += 1
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._in_flight -= 1
+
+        if operation == BIND_REQUEST:
+            user = fields['name'].split('@')[0].lower()
+            ok = user in self.users and fields['password'] == self.password
+            writer.write(_response(message_id, 'bindResponse', BindResponse(), SUCCESS if ok else INVALID_CREDENTIALS))
+        elif operation == SEARCH_REQUEST:
+            entries, code = self._search(fields)
+            for dn, attributes in entries:
+                writer.write(_entry(message_id, dn, attributes, fields['attributes']))
+            writer.write(_response(message_id, 'searchResDone', SearchResultDone(), code))
+        await writer.drain()
+
+    def _search(self, fields):
+        if fields['scope'] == 0:  # base: read one entry by DN
+            for attrs in self.users.values():
+                if attrs['dn'].lower() == fields['base'].lower():
+                    return [(attrs['dn'], attrs)], SUCCESS
+            return [], NO_SUCH_OBJECT
+        names = [name.lower() for name in fields['names']]
+        return [(self.users[name]['dn'], self.users[name]) for name in names if name in self.users], SUCCESS
+
+
+def _tlv(data, start):
+    """(tag, value start, value end) of the BER element at ``start``."""
+    tag, length, offset = data[start], data[start + 1], start + 2
+    if length & 0x80:
+        count = length & 0x7f
+        length = int.from_bytes(data[offset:offset + count], 'big')
+        offset += count
+    return tag, offset, offset + length
+
+
+def _children(data, start, end):
+    while start < end:
+        tag, value_start, value_end = _tlv(data, start)
+        yield tag, data[value_start:value_end]
+        start = value_end
+
+
+def _parse(raw):
+    """(message id, operation tag, fields) of a bind, search or unbind request."""
+    _, start, end = _tlv(raw, 0)
+    (_, message_id), (operation, body) = list(_children(raw, start, end))[:2]
+    message_id = int.from_bytes(message_id, 'big')
+    fields = {}
+    if operation == BIND_REQUEST:
+        _, name, password = list(_children(body, 0, len(body)))[:3]
+        fields = {'name': name[1].decode(), 'password': password[1].decode()}
+    elif operation == SEARCH_REQUEST:
+        parts = list(_children(body, 0, len(body)))
+        filter_bytes = parts[6][1]
+        names = []
+        for match in SAM_RE.finditer(filter_bytes):
+            value_start = match.end()
+            names.append(filter_bytes[value_start:value_start + match.group(1)[0]].decode())
+        fields = {
+            'base': parts[0][1].decode(),
+            'scope': parts[1][1][0],
+            'names': names,
+            'attributes': [value.decode() for _, value in _children(parts[7][1], 0, len(parts[7][1]))],
+        }
+    return message_id, operation, fields
+
+
+def _response(message_id, name, component, code):
+    component['resultCode'] = ResultCode(code)
+    component['matchedDN'] = LDAPDN('')
+    component['diagnosticMessage'] = LDAPString('')
+    return _message(message_id, name, component)
+
+
+def _entry(message_id, dn, attributes, requested):
+    wanted = {name.lower() for name in requested or []}
+    entry = SearchResultEntry()
+    entry['object'] = LDAPDN(dn)
+    entry['attributes'] = PartialAttributeList()
+    for name, values in attributes.items():
+        if name == 'dn' or not ({'*', name.lower()} & wanted):
+            continue
+        attribute = PartialAttribute()
+        attribute['type'] = AttributeDescription(name)
+        attribute['vals'] = Vals()
+        for index, value in enumerate(values if isinstance(values, list) else [values]):
+            attribute['vals'][index] = AttributeValue(value)
+        entry['attributes'].append(attribute)
+    return _message(message_id, 'searchResEntry', entry)
+
+
+def _message(message_id, name, component):
+    message = LDAPMessage()
+    message['messageID'] = MessageID(message_id)
+    message['protocolOp'] = ProtocolOp().setComponentByName(name, component)
+    return encode(message)
@@ -0,0 +1,21 @@
+"""
+Test-run overrides for objects that are built from settings at import, where
+override_settings cannot reach them.
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def synchronous_audit_writer(tmp_path_factory):
+    """
+    Write audit events synchronously, inside each test's transaction, and
+    spool into a temp directory instead of var/. The write-behind thread
+    would otherwise write outside the test transaction, leak events into
+    later tests and lock SQLite.
+    """
+    from employee.audit import audit_writer
+
+    # Not restored afterwards: the writer's atexit flush runs after the session
+    audit_writer.write_behind = False
+    audit_writer.spool_path = str(tmp_path_factory.mktemp('audit') / 'audit_spool.ndjson')
+    return audit_writer
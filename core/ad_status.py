@@ -0,0 +1,157 @@
+"""
+Live Active Directory account state (enabled / locked out / password expired)
+for the User changelist.
+
+Statuses for a whole page are fetched with one OR-filter search
+(ADConnection.get_users_status) and cached briefly per account, so a page
+refresh does not go back to the DC.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# userAccountControl flags
+UF_ACCOUNTDISABLE = 0x2
+UF_DONT_EXPIRE_PASSWD = 0x10000
+UF_PASSWORD_EXPIRED = 0x800000
+
+LDAP_MATCHING_RULE_BIT_AND = '1.2.840.113556.1.4.803'
+
+STATUS_CACHE_TIMEOUT = 60
+POLICY_CACHE_TIMEOUT = 60 * 60
+POLICY_CACHE_KEY = 'ad_password_policy'
+
+# Cached marker for accounts that do not exist in AD.
+NOT_FOUND = {'found': False}
+
+FILETIME_EPOCH = datetime(1601, 1, 1, tzinfo=dt_timezone.utc)
+FILETIME_NEVER = 0x7FFFFFFFFFFFFFFF
+INTERVAL_NEVER = -0x8000000000000000
+
+
+def filetime_to_datetime(value):
+    """AD timestamp (100ns intervals since 1601) to an aware datetime, or None if unset."""
+    if not value or value >= FILETIME_NEVER:
+        return None
+    return FILETIME_EPOCH + timedelta(microseconds=value // 10)
+
+
+def datetime_to_filetime(value):
+    return int((value - FILETIME_EPOCH).total_seconds() * 10_000_000)
+
+
+def interval_to_timedelta(value):
+    """AD interval (negative 100ns count, e.g. maxPwdAge) to a timedelta; None means never/forever."""
+    if value == INTERVAL_NEVER or not value:
+        return None
+    return timedelta(microseconds=abs(value) // 10)
+
+
+def decode_policy(raw):
+    return {
+        'max_password_age': interval_to_timedelta(raw.get('maxPwdAge')),
+        # 0 or "never" means the account stays locked until an admin unlocks it
+        'lockout_duration': interval_to_timedelta(raw.get('lockoutDuration')),
+    }
+
+
+def decode_status(raw, policy, now=None):
+    """Turn raw get_users_status() values into the flags shown in the admin."""
+    now = now or timezone.now()
+    uac = raw.get('userAccountControl', 0)
+
+    lockout_time = filetime_to_datetime(raw.get('lockoutTime'))
+    duration = policy['lockout_duration']
+    locked = bool(lockout_time) and (duration is None or lockout_time + duration > now)
+
+    never_expires = bool(uac & UF_DONT_EXPIRE_PASSWD)
+    pwd_last_set = filetime_to_datetime(raw.get('pwdLastSet'))
+    max_age = policy['max_password_age']
+    password_expired = (
+        bool(uac & UF_PASSWORD_EXPIRED)
+        or not raw.get('pwdLastSet')
+        or (not never_expires and max_age is not None and pwd_last_set is not None
+            and pwd_last_set + max_age <= now)
+    )
+
+    return {
+        'found': True,
+        'enabled': not uac & UF_ACCOUNTDISABLE,
+        'locked': locked,
+        'password_expired': password_expired,
+        'password_never_expires': never_expires,
+        'password_last_set': pwd_last_set,
+        'last_logon': filetime_to_datetime(raw.get('lastLogonTimestamp')),
+    }
+
+
+def get_password_policy(ad):
+    policy = cache.get(POLICY_CACHE_KEY)
+    if policy is None:
+        policy = decode_policy(ad.get_password_policy())
+        cache.set(POLICY_CACHE_KEY, policy, POLICY_CACHE_TIMEOUT)
+    return policy
+
+
+def get_account_statuses(usernames, connect):
+    """
+    Return {sAMAccountName: status dict} for ``usernames``.
+
+    Cached statuses are used as-is; the rest are fetched with one batched
+    search on the connection returned by ``connect()``, which is only called
+    when something is missing. Accounts absent from AD map to NOT_FOUND;
+    accounts that could not be looked up are left out.
+    """
+    keys = {f'ad_status_{name}': name for name in {u.split('@')[0].lower() for u in usernames if u}}
+    statuses = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = [name for name in keys.values() if name not in statuses]
+    if not missing:
+        return statuses
+
+    try:
+        ad = connect()
+        if not ad:
+            return statuses
+        raw = ad.get_users_status(missing)
+        policy = get_password_policy(ad)
+    except Exception as exc:
+        logger.warning(f"Could not read AD account status: {exc}")
+        return statuses
+
+    fetched = {name: decode_status(raw[name], policy) if name in raw else NOT_FOUND for name in missing}
+    cache.set_many({f'ad_status_{name}': value for name, value in fetched.items()}, STATUS_CACHE_TIMEOUT)
+    statuses.update(fetched)
+    return statuses
+
+
+def status_ldap_filter(status, policy, now=None):
+    """LDAP filter selecting users in ``status`` (enabled / disabled / locked / password_expired)."""
+    now = now or timezone.now()
+    disabled = f'(userAccountControl:{LDAP_MATCHING_RULE_BIT_AND}:={UF_ACCOUNTDISABLE})'
+
+    if status == 'enabled':
+        return f'(!{disabled})'
+    if status == 'disabled':
+        return disabled
+    if status == 'locked':
+        duration = policy['lockout_duration']
+        since = datetime_to_filetime(now - duration) if duration else 1
+        return f'(lockoutTime>={since})'
+    if status == 'password_expired':
+        clauses = [
+            '(pwdLastSet=0)',
+            f'(userAccountControl:{LDAP_MATCHING_RULE_BIT_AND}:={UF_PASSWORD_EXPIRED})',
+        ]
+        if policy['max_password_age']:
+            cutoff = datetime_to_filetime(now - policy['max_password_age'])
+            clauses.append(
+                f'(&(!(userAccountControl:{LDAP_MATCHING_RULE_BIT_AND}:={UF_DONT_EXPIRE_PASSWD}))'
+                f'(pwdLastSet<={cutoff}))'
+            )
+        return f'(|{"".join(clauses)})'
+    raise ValueError(f"Unknown AD status '{status}'")
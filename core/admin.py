@@ -2,21 +2,105 @@ import logging
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.conf import settings
-from django.shortcuts import redirect, render
-from django.urls import path
-from .utils import _get_ad_creds, _connect_ad
-from .forms import ADUserCreationForm, ADPasswordChangeForm
-from .models import User
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import format_html
+from django.utils.http import urlencode
+from ADIWA.ad_trace import tracer
+from .ad_status import (
+    STATUS_CACHE_TIMEOUT, get_account_statuses, get_password_policy, status_ldap_filter,
+)
+from .changelist import LargeTableAdminMixin
+from .outbox import enqueue, process_in_background
+from .utils import _get_ad_creds, _connect_ad, new_idempotency_key, message_operation_queued
+from .forms import ADGroupMembersForm, ADUserBulkCreationForm, ADUserCreationForm, ADPasswordChangeForm
+from .groups import get_group_members, get_user_groups, invalidate_group_mapping
+from .provisioning import connection_pool, provision_users, row_result
+from .jobs import fail_stale_jobs, start_job, take_passwords
+from .models import ADGroupMapping, BulkDirectoryJob, DirectoryOperation, User
+from .tokens import revoke_tokens
 
 logger = logging.getLogger(__name__)
 
+# The username__in lookup below stays under SQL Server's 2100-parameter limit.
+AD_STATUS_FILTER_MAX_USERS = 1000
+
+AD_GROUP_MEMBERS_PER_PAGE = 100
+
+
+def _request_ad_connection(request):
+    """Connection factory for the logged-in admin's cached AD credentials."""
+    def connect():
+        creds = _get_ad_creds(request)
+        return _connect_ad(creds) if creds else None
+    return connect
+
+
+class ADAccountStatusFilter(admin.SimpleListFilter):
+    """Filter users by live AD state, evaluated in AD with one (paged) LDAP search."""
+    title = 'AD status'
+    parameter_name = 'ad_status'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('enabled', 'Enabled'),
+            ('disabled', 'Disabled'),
+            ('locked', 'Locked out'),
+            ('password_expired', 'Password expired'),
+        )
+
+    def queryset(self, request, queryset):
+        status = self.value()
+        if status not in dict(self.lookup_choices):
+            return queryset
+
+        cache_key = f'ad_status_filter_{status}'
+        usernames = cache.get(cache_key)
+        if usernames is None:
+            try:
+                ad = _request_ad_connection(request)()
+                if not ad:
+                    messages.warning(request, "AD credentials not found in cache. Please re-login to filter by AD status.")
+                    return queryset.none()
+
+                ldap_filter = status_ldap_filter(status, get_password_policy(ad))
+                usernames = ad.search_usernames(ldap_filter, limit=AD_STATUS_FILTER_MAX_USERS + 1)
+            except Exception as e:
+                messages.error(request, f"Could not filter by AD status: {e}")
+                return queryset.none()
+            cache.set(cache_key, usernames, STATUS_CACHE_TIMEOUT)
+
+        if len(usernames) > AD_STATUS_FILTER_MAX_USERS:
+            messages.warning(
+                request,
+                f"More than {AD_STATUS_FILTER_MAX_USERS} AD accounts match; showing the first {AD_STATUS_FILTER_MAX_USERS}.",
+            )
+            usernames = usernames[:AD_STATUS_FILTER_MAX_USERS]
+
+        return queryset.filter(
+            Q(username__in=usernames)
+            | Q(username__in=[f'{name}@{settings.DOMAIN}' for name in usernames])
+        )
+
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
-    list_display = ('username', 'is_active', 'is_staff', 'is_superuser', 'last_login', 'date_joined')
-    list_filter = ('is_active', 'is_staff', 'is_superuser')
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
+    list_display = (
+        'username', 'ad_enabled', 'ad_locked', 'ad_password', 'ad_last_logon',
+        'is_active', 'is_staff', 'is_superuser', 'last_login', 'date_joined',
+    )
+    list_filter = (ADAccountStatusFilter, 'is_active', 'is_staff', 'is_superuser')
+    actions = ('reset_ad_passwords', 'disable_ad_accounts', 'delete_ad_accounts')
     search_fields = ('username',)
     ordering = ('username',)
+    keyset_ordering = ('username', 'pk')
 
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -36,6 +120,12 @@ class UserAdmin(BaseUserAdmin):
     def has_add_permission(self, request):
         return False
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # These are JWT claims (or, for is_active, only enforced at login)
+        if change and {'is_active', 'is_staff', 'is_superuser'} & set(form.changed_data):
+            revoke_tokens([obj.pk])
+
     def get_urls(self):
         custom_urls = [
             path(
@@ -43,6 +133,21 @@ class UserAdmin(BaseUserAdmin):
                 self.admin_site.admin_view(self.create_ad_user_view),
                 name='create_ad_user',
             ),
+            path(
+                'ad-groups/',
+                self.admin_site.admin_view(self.ad_groups_view),
+                name='ad_groups',
+            ),
+            path(
+                'ad-operations/',
+                self.admin_site.admin_view(self.ad_operations_view),
+                name='ad_operations',
+            ),
+            path(
+                'bulk-create-ad-users/',
+                self.admin_site.admin_view(self.bulk_create_ad_users_view),
+                name='bulk_create_ad_users',
+            ),
             path(
                 '<path:object_id>/change-ad-password/',
                 self.admin_site.admin_view(self.change_ad_password_view),
@@ -61,11 +166,238 @@ class UserAdmin(BaseUserAdmin):
         extra_context['show_create_ad_user_button'] = True
         return super().changelist_view(request, extra_context=extra_context)
 
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = extra_context or {}
+        user_obj = self.get_object(request, object_id)
+        if user_obj and request.method == 'GET':
+            try:
+                extra_context['ad_groups'] = get_user_groups(user_obj.username, _request_ad_connection(request))
+            except Exception as e:
+                logger.warning(f"Could not read AD groups of {user_obj.username}: {e}")
+                extra_context['ad_groups_error'] = str(e)
+        return super().change_view(request, object_id, form_url, extra_context=extra_context)
+
+    # ------------------------------------------------------------------
+    # Live AD status columns (one batched LDAP search per page)
+    # ------------------------------------------------------------------
+
+    def get_changelist_instance(self, request):
+        cl = super().get_changelist_instance(request)
+        cl.result_list = list(cl.result_list)
+
+        statuses = get_account_statuses(
+            [user.username for user in cl.result_list],
+            _request_ad_connection(request),
+        )
+        for user in cl.result_list:
+            user.ad_status = statuses.get(user.username.split('@')[0].lower())
+        return cl
+
+    @staticmethod
+    def _ad_status(obj):
+        status = getattr(obj, 'ad_status', None)
+        return status if status and status['found'] else None
+
+    @admin.display(description='AD Enabled', boolean=True)
+    def ad_enabled(self, obj):
+        status = self._ad_status(obj)
+        return status['enabled'] if status else None
+
+    @admin.display(description='Locked Out', boolean=True)
+    def ad_locked(self, obj):
+        status = self._ad_status(obj)
+        return status['locked'] if status else None
+
+    @admin.display(description='AD Password')
+    def ad_password(self, obj):
+        status = self._ad_status(obj)
+        if not status:
+            return '—'
+        if status['password_expired']:
+            return format_html('<span class="badge badge-danger">{}</span>', 'Expired')
+        if status['password_never_expires']:
+            return format_html('<span class="badge badge-secondary">{}</span>', 'Never expires')
+        return format_html('<span class="badge badge-success">{}</span>', 'OK')
+
+    @admin.display(description='AD Last Logon')
+    def ad_last_logon(self, obj):
+        status = self._ad_status(obj)
+        return status['last_logon'] if status and status['last_logon'] else '—'
+
+    # ------------------------------------------------------------------
+    # AD Groups  (GET = search / members, POST = queue membership change)
+    # ------------------------------------------------------------------
+
+    def ad_groups_view(self, request):
+        if request.method == 'POST' and not request.user.has_perm('core.change_ad_group_membership'):
+            raise PermissionDenied
+
+        creds = _get_ad_creds(request)
+        if not creds:
+            messages.error(request, "AD credentials not found in cache. Please re-login.")
+            return redirect('admin:core_user_changelist')
+
+        ad = _connect_ad(creds)
+        if not ad:
+            messages.error(request, "Failed to connect to AD with your credentials.")
+            return redirect('admin:core_user_changelist')
+
+        group_dn = request.GET.get('group')
+        group = ad.get_group(group_dn) if group_dn else None
+        if group_dn and not group:
+            messages.error(request, "Group not found in Active Directory.")
+            return redirect('admin:ad_groups')
+
+        if request.method == 'POST' and group:
+            return self._process_group_change(request, ad, group)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"AD Group — {group['name']}" if group else 'AD Groups',
+            'opts': self.model._meta,
+            'group': group,
+        }
+        if group:
+            nested = request.GET.get('nested') == '1'
+            if nested:
+                members = [{'dn': m['dn'], 'name': m['sam']} for m in ad.get_group_members_nested(group['dn'])]
+            else:
+                members = get_group_members(group['dn'], ad)
+            context.update({
+                'nested': nested,
+                'member_count': len(members),
+                'page': Paginator(members, AD_GROUP_MEMBERS_PER_PAGE).get_page(request.GET.get('page')),
+                'form': ADGroupMembersForm(),
+                'idempotency_key': new_idempotency_key(request),
+            })
+        else:
+            query = request.GET.get('q', '')
+            context.update({'query': query, 'groups': ad.search_groups(query)})
+        return render(request, 'admin/ad_groups.html', context)
+
+    def _process_group_change(self, request, ad, group):
+        add, remove = [], request.POST.getlist('member')
+        if 'add' in request.POST:
+            remove = []
+            form = ADGroupMembersForm(request.POST)
+            if not form.is_valid():
+                for error in form.errors.get('usernames', []):
+                    messages.error(request, error)
+                return redirect(f"{reverse('admin:ad_groups')}?{urlencode({'group': group['dn']})}")
+
+            usernames = form.cleaned_data['usernames']
+            dns = ad.search_users_dn(usernames)
+            missing = [name for name in usernames if name not in dns]
+            if missing:
+                messages.warning(request, f"Not found in AD (skipped): {', '.join(missing[:20])}")
+            add = [dns[name] for name in usernames if name in dns]
+
+        if add or remove:
+            op, created = enqueue(
+                'update_group', group['sam'] or group['name'],
+                payload={'group_dn': group['dn'], 'group_name': group['name'], 'add': add, 'remove': remove},
+                requested_by=request.user,
+                idempotency_key=request.POST.get('idempotency_key'),
+            )
+            message_operation_queued(
+                request, op, created,
+                f"{'Adding' if add else 'Removing'} {len(add or remove)} member(s) of group '{group['name']}'",
+            )
+            logger.info(
+                f"Admin {request.user.username} queued membership change of {group['name']}: "
+                f"+{len(add)} -{len(remove)}"
+            )
+        else:
+            messages.warning(request, "No members selected.")
+
+        return redirect(f"{reverse('admin:ad_groups')}?{urlencode({'group': group['dn']})}")
+
+    # ------------------------------------------------------------------
+    # AD Operations  (LDAP latency of this worker, see ADIWA.ad_trace)
+    # ------------------------------------------------------------------
+
+    def ad_operations_view(self, request):
+        """LDAP latency per operation and caller, and recent slow operations, for this worker process."""
+        stats, slow = tracer.stats(), tracer.slow_operations()
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'slow_ms': tracer.slow_ms,
+                'operations': stats,
+                'slow': [span.as_dict() for span in slow],
+            })
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'AD Operations',
+            'opts': self.model._meta,
+            'slow_ms': tracer.slow_ms,
+            'operations': stats,
+            'slow': slow,
+        }
+        return render(request, 'admin/ad_operations.html', context)
+
+    # ------------------------------------------------------------------
+    # Bulk lifecycle actions (run as a BulkDirectoryJob)
+    # ------------------------------------------------------------------
+
+    @admin.action(description='Reset AD passwords of selected users', permissions=['change'])
+    def reset_ad_passwords(self, request, queryset):
+        return self._bulk_lifecycle_action(request, queryset, 'reset_password')
+
+    @admin.action(description='Disable selected AD accounts', permissions=['change'])
+    def disable_ad_accounts(self, request, queryset):
+        return self._bulk_lifecycle_action(request, queryset, 'disable')
+
+    @admin.action(description='Delete selected AD accounts', permissions=['delete'])
+    def delete_ad_accounts(self, request, queryset):
+        return self._bulk_lifecycle_action(request, queryset, 'delete')
+
+    def _bulk_lifecycle_action(self, request, queryset, action):
+        """Confirm, then hand the selected accounts to a background job."""
+        description = dict(BulkDirectoryJob.ACTION_CHOICES)[action]
+        users = list(queryset.exclude(pk=request.user.pk).order_by('username'))
+        skipped_self = len(users) < queryset.count()
+
+        if 'apply' not in request.POST:
+            context = {
+                **self.admin_site.each_context(request),
+                'title': f'{description} — {len(users)} user{"s" if len(users) != 1 else ""}',
+                'action': action,
+                'action_name': request.POST.get('action'),
+                'description': description,
+                'users': users,
+                'skipped_self': skipped_self,
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                'opts': self.model._meta,
+            }
+            return render(request, 'admin/bulk_user_action.html', context)
+
+        creds = _get_ad_creds(request)
+        if not creds:
+            self.message_user(request, "AD credentials not found in cache. Please re-login.", messages.ERROR)
+            return None
+        if not users:
+            self.message_user(request, "No users to process (you cannot run this on your own account).", messages.WARNING)
+            return None
+
+        job = start_job(action, users, request.user, (creds['username'], creds['password']))
+        logger.info(f"Admin {request.user.username} started bulk job {job.pk}: {action} on {len(users)} users")
+        self.message_user(
+            request,
+            format_html('{} started for {} user(s). <a href="{}">Track progress</a>',
+                        description, len(users), reverse('admin:core_bulkdirectoryjob_change', args=[job.pk])),
+            messages.INFO,
+        )
+        return redirect('admin:core_bulkdirectoryjob_change', job.pk)
+
     # ------------------------------------------------------------------
     # Create AD User View
     # ------------------------------------------------------------------
 
     def create_ad_user_view(self, request):
+        if not request.user.has_perm('core.add_user'):
+            raise PermissionDenied
+
         creds = _get_ad_creds(request)
         if not creds:
             messages.error(request, "AD credentials not found in cache. Please re-login.")
@@ -74,7 +406,7 @@ class UserAdmin(BaseUserAdmin):
         if request.method == 'POST':
             form = ADUserCreationForm(request.POST)
             if form.is_valid():
-                return self._process_ad_user_creation(request, form, creds)
+                return self._process_ad_user_creation(request, form)
         else:
             form = ADUserCreationForm()
 
@@ -82,11 +414,12 @@ class UserAdmin(BaseUserAdmin):
             **self.admin_site.each_context(request),
             'title': 'Create AD User',
             'form': form,
+            'idempotency_key': new_idempotency_key(request),
             'opts': self.model._meta,
         }
         return render(request, 'admin/create_ad_user.html', context)
 
-    def _process_ad_user_creation(self, request, form, creds):
+    def _process_ad_user_creation(self, request, form):
         username = form.cleaned_data['username'].strip().lower()
         password = form.cleaned_data['password']
         given_name = form.cleaned_data['given_name'].strip()
@@ -96,25 +429,78 @@ class UserAdmin(BaseUserAdmin):
         ou_dept = form.cleaned_data['ou']
         ou_name = ou_dept.name if ou_dept else None
 
-        ad = _connect_ad(creds)
-        if not ad:
-            messages.error(request, "Failed to connect to Active Directory.")
-            return redirect('admin:create_ad_user')
-
-        success, msg = ad.create_user(
-            username=username, password=password,
-            given_name=given_name, surname=surname,
-            mail=email, telephone=telephone, ou=ou_name,
+        op, created = enqueue(
+            'create_user', username,
+            payload={
+                'given_name': given_name, 'surname': surname,
+                'mail': email, 'telephone': telephone, 'ou': ou_name,
+            },
+            secret={'password': password},
+            requested_by=request.user,
+            idempotency_key=request.POST.get('idempotency_key'),
         )
+        message_operation_queued(request, op, created, f"Creation of AD user '{username}'")
+        logger.info(f"Admin {request.user.username} queued AD user creation: {username}")
+        return redirect('admin:core_user_changelist')
+
+    # ------------------------------------------------------------------
+    # Bulk Create AD Users (CSV)
+    # ------------------------------------------------------------------
+
+    def bulk_create_ad_users_view(self, request):
+        """Create many AD users from an uploaded CSV and show one result per row."""
+        if not request.user.has_perm('core.add_user'):
+            raise PermissionDenied
+
+        creds = _get_ad_creds(request)
+        if not creds:
+            messages.error(request, "AD credentials not found in cache. Please re-login.")
+            return redirect('admin:core_user_changelist')
 
-        if success:
-            messages.success(request, f"✓ {msg}")
-            logger.info(f"Admin {request.user.username} created AD user: {username}")
+        results = None
+        if request.method == 'POST':
+            form = ADUserBulkCreationForm(request.POST, request.FILES)
+            if form.is_valid():
+                rows, rejected = form.cleaned_data['rows'], form.cleaned_data['rejected']
+                if form.cleaned_data['dry_run']:
+                    results = rejected + [row_result(row, 'valid', '') for row in rows]
+                else:
+                    results = rejected + self._run_bulk_creation(request, creds, rows, form.cleaned_data['create_employees'])
+                results.sort(key=lambda row: row['line'])
         else:
-            messages.error(request, f"Failed to create AD user: {msg}")
-            return redirect('admin:create_ad_user')
+            form = ADUserBulkCreationForm()
 
-        return redirect('admin:core_user_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Bulk Create AD Users',
+            'form': form,
+            'results': results,
+            'opts': self.model._meta,
+        }
+        if results is not None:
+            context['summary'] = {
+                status: sum(1 for row in results if row['status'] == status)
+                for status in ('valid', 'created', 'partial', 'exists', 'failed', 'invalid')
+            }
+        return render(request, 'admin/bulk_create_ad_users.html', context)
+
+    def _run_bulk_creation(self, request, creds, rows, create_employees):
+        pool = connection_pool(creds['username'], creds['password'])
+        try:
+            results = provision_users(
+                rows, pool, create_employees=create_employees, requested_by=request.user,
+            )
+        except Exception as e:
+            logger.error(f"Bulk AD user creation failed: {e}", exc_info=True)
+            return [row_result(row, 'failed', str(e)) for row in rows]
+        finally:
+            pool.close()
+
+        logger.info(
+            f"Admin {request.user.username} bulk-created AD users: "
+            f"{sum(1 for row in results if row['status'] == 'created')} of {len(rows)}"
+        )
+        return results
 
     # ------------------------------------------------------------------
     # Change AD Password View
@@ -122,6 +508,9 @@ class UserAdmin(BaseUserAdmin):
 
     def change_ad_password_view(self, request, object_id):
         """Change a user's password directly in Active Directory."""
+        if not request.user.has_perm('core.change_user'):
+            raise PermissionDenied
+
         try:
             user_obj = User.objects.get(pk=object_id)
         except User.DoesNotExist:
@@ -140,7 +529,7 @@ class UserAdmin(BaseUserAdmin):
             form = ADPasswordChangeForm(request.POST)
             if form.is_valid():
                 return self._process_password_change(
-                    request, form, creds, ad_username, object_id,
+                    request, form, ad_username, object_id,
                 )
         else:
             form = ADPasswordChangeForm()
@@ -149,31 +538,26 @@ class UserAdmin(BaseUserAdmin):
             **self.admin_site.each_context(request),
             'title': f'Change AD Password — {ad_username}',
             'form': form,
+            'idempotency_key': new_idempotency_key(request),
             'ad_username': ad_username,
             'user_obj': user_obj,
             'opts': self.model._meta,
         }
         return render(request, 'admin/change_ad_password.html', context)
 
-    def _process_password_change(self, request, form, creds, ad_username, object_id):
-        new_password = form.cleaned_data['new_password']
-
-        ad = _connect_ad(creds)
-        if not ad:
-            messages.error(request, "Failed to connect to Active Directory.")
-            return redirect('admin:change_ad_password', object_id=object_id)
-
-        success, msg = ad.change_password(ad_username, new_password)
-
-        if success:
-            messages.success(request, f"✓ {msg}")
-            logger.info(
-                f"Admin {request.user.username} changed AD password for: {ad_username}"
-            )
-            return redirect('admin:core_user_change', object_id)
-        else:
-            messages.error(request, f"Failed to change password: {msg}")
-            return redirect('admin:change_ad_password', object_id=object_id)
+    def _process_password_change(self, request, form, ad_username, object_id):
+        op, created = enqueue(
+            'change_password', ad_username,
+            payload={'object_id': object_id},
+            secret={'password': form.cleaned_data['new_password']},
+            requested_by=request.user,
+            idempotency_key=request.POST.get('idempotency_key'),
+        )
+        message_operation_queued(request, op, created, f"Password change for '{ad_username}'")
+        logger.info(
+            f"Admin {request.user.username} queued AD password change for: {ad_username}"
+        )
+        return redirect('admin:core_user_change', object_id)
         
     # ------------------------------------------------------------------
     # Delete AD User View
@@ -181,6 +565,9 @@ class UserAdmin(BaseUserAdmin):
 
     def delete_ad_user(self, request, object_id):
         """Delete a user from Active Directory and the local database."""
+        if not request.user.has_perm('core.delete_user'):
+            raise PermissionDenied
+
         try:
             user_obj = User.objects.get(pk=object_id)
         except User.DoesNotExist:
@@ -195,7 +582,7 @@ class UserAdmin(BaseUserAdmin):
             return redirect('admin:core_user_change', object_id)
 
         if request.method == 'POST':
-            return self._process_ad_user_deletion(request, creds, user_obj, ad_username)
+            return self._process_ad_user_deletion(request, user_obj, ad_username)
 
         # GET — show confirmation page
         context = {
@@ -203,36 +590,191 @@ class UserAdmin(BaseUserAdmin):
             'title': f'Delete AD User — {ad_username}',
             'ad_username': ad_username,
             'user_obj': user_obj,
+            'idempotency_key': new_idempotency_key(request),
             'opts': self.model._meta,
         }
         return render(request, 'admin/delete_ad_user.html', context)
 
-    def _process_ad_user_deletion(self, request, creds, user_obj, ad_username):
-        """Delete user from AD, then remove Employee + User from DB."""
-        ad = _connect_ad(creds)
-        if not ad:
-            messages.error(request, "Failed to connect to Active Directory.")
-            return redirect('admin:core_user_change', user_obj.pk)
+    def _process_ad_user_deletion(self, request, user_obj, ad_username):
+        """
+        Queue the AD deletion. The Employee profile and User row are removed
+        by the outbox worker once AD has deleted the account.
+        """
+        op, created = enqueue(
+            'delete_user', ad_username,
+            payload={'object_id': user_obj.pk},
+            requested_by=request.user,
+            idempotency_key=request.POST.get('idempotency_key'),
+        )
+        message_operation_queued(request, op, created, f"Deletion of AD user '{ad_username}'")
+        logger.info(
+            f"Admin {request.user.username} queued AD user deletion: {ad_username} ({user_obj.username})"
+        )
+        return redirect('admin:core_user_changelist')
 
-        # 1. Delete from Active Directory
-        success, msg = ad.delete_user(ad_username)
-        if not success:
-            messages.error(request, f"Failed to delete from AD: {msg}")
-            return redirect('admin:core_user_change', user_obj.pk)
 
-        # 2. Delete Employee profile from DB (if exists)
-        if hasattr(user_obj, 'employee_profile'):
-            user_obj.employee_profile.delete()
+@admin.register(DirectoryOperation)
+class DirectoryOperationAdmin(admin.ModelAdmin):
+    """Read-only view of the directory outbox, with a retry action for failed rows."""
+    list_display = (
+        'created_at', 'operation', 'target', 'status', 'attempts',
+        'next_attempt_at', 'requested_by', 'last_error',
+    )
+    list_filter = ('status', 'operation')
+    search_fields = ('target', 'idempotency_key')
+    list_select_related = ('requested_by',)
+    date_hierarchy = 'created_at'
+    exclude = ('secret',)
+    actions = ['retry_operations']
 
-        # 3. Delete the Django User from DB
-        username_display = user_obj.username
-        user_obj.delete()
+    def has_add_permission(self, request):
+        return False
 
-        messages.success(
-            request,
-            f"✓ User '{ad_username}' deleted from Active Directory and database.",
-        )
-        logger.info(
-            f"Admin {request.user.username} deleted AD user: {ad_username} ({username_display})"
+    def has_change_permission(self, request, obj=None):
+        # Rows are never edited; the model's change permission only gates the retry action
+        return obj is None and super().has_change_permission(request)
+
+    def get_urls(self):
+        custom_urls = [
+            path(
+                '<path:object_id>/status/',
+                self.admin_site.admin_view(self.status_view),
+                name='core_directoryoperation_status',
+            ),
+        ]
+        return custom_urls + super().get_urls()
+
+    def status_view(self, request, object_id):
+        """Current state of one operation (JSON), for polling from the admin UI."""
+        op = get_object_or_404(DirectoryOperation, pk=object_id)
+        return JsonResponse({
+            'id': op.pk,
+            'operation': op.operation,
+            'target': op.target,
+            'status': op.status,
+            'attempts': op.attempts,
+            'next_attempt_at': op.next_attempt_at,
+            'last_error': op.last_error,
+            'result_message': op.result_message,
+            'applied_at': op.applied_at,
+        })
+
+    @admin.action(description='Retry selected failed operations', permissions=['change'])
+    def retry_operations(self, request, queryset):
+        # Secrets are wiped when an operation finishes, so those cannot be replayed.
+        retryable = queryset.filter(status='failed').exclude(
+            operation__in=('create_user', 'change_password'),
         )
-        return redirect('admin:core_user_changelist')
\ No newline at end of file
+        targets = list(retryable.values_list('target', flat=True).distinct())
+        retried = retryable.update(status='queued', attempts=0, next_attempt_at=timezone.now(), last_error=None)
+        if retried and settings.DIRECTORY_OUTBOX_INLINE:
+            process_in_background(targets)
+        self.message_user(request, f"{retried} operation(s) queued for retry.", messages.SUCCESS)
+
+
+@admin.register(BulkDirectoryJob)
+class BulkDirectoryJobAdmin(admin.ModelAdmin):
+    """Progress and per-account results of bulk lifecycle jobs."""
+    list_display = ('created_at', 'action', 'status', 'total', 'processed', 'succeeded', 'failed', 'requested_by')
+    list_filter = ('status', 'action')
+    list_select_related = ('requested_by',)
+    date_hierarchy = 'created_at'
+    fields = (
+        'action', 'status', 'total', 'processed', 'succeeded', 'failed',
+        'error', 'requested_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        custom_urls = [
+            path(
+                '<path:object_id>/status/',
+                self.admin_site.admin_view(self.status_view),
+                name='core_bulkdirectoryjob_status',
+            ),
+            path(
+                '<path:object_id>/passwords/',
+                self.admin_site.admin_view(self.passwords_view),
+                name='core_bulkdirectoryjob_passwords',
+            ),
+        ]
+        return custom_urls + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        fail_stale_jobs()
+        return super().changelist_view(request, extra_context)
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        fail_stale_jobs()
+        job = get_object_or_404(BulkDirectoryJob, pk=object_id)
+        extra_context = {
+            **(extra_context or {}),
+            'job': job,
+            # Passwords are saved as the job goes; offer them once it stopped
+            'can_download_passwords': (
+                bool(job.secret) and job.requested_by_id == request.user.pk
+                and job.status in ('finished', 'failed')
+            ),
+        }
+        return super().change_view(request, object_id, form_url, extra_context=extra_context)
+
+    def status_view(self, request, object_id):
+        """Progress of one job (JSON), polled by the job page while it runs."""
+        fail_stale_jobs()
+        job = get_object_or_404(BulkDirectoryJob, pk=object_id)
+        return JsonResponse({
+            'id': job.pk,
+            'action': job.action,
+            'status': job.status,
+            'total': job.total,
+            'processed': job.processed,
+            'succeeded': job.succeeded,
+            'failed': job.failed,
+            'error': job.error,
+        })
+
+    def passwords_view(self, request, object_id):
+        """One-time CSV download of the generated passwords, for the admin who ran the job."""
+        job = get_object_or_404(BulkDirectoryJob, pk=object_id)
+        if job.requested_by_id != request.user.pk:
+            raise PermissionDenied
+        if job.status not in ('finished', 'failed'):
+            messages.warning(request, "The job is still running; download the passwords once it stops.")
+            return redirect('admin:core_bulkdirectoryjob_change', job.pk)
+
+        content = take_passwords(job)
+        if content is None:
+            messages.warning(request, "The generated passwords were already downloaded.")
+            return redirect('admin:core_bulkdirectoryjob_change', job.pk)
+
+        logger.info(f"Admin {request.user.username} downloaded the passwords of bulk job {job.pk}")
+        response = HttpResponse(content, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="reset_passwords_job_{job.pk}.csv"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+@admin.register(ADGroupMapping)
+class ADGroupMappingAdmin(admin.ModelAdmin):
+    """AD group SID -> Django group / staff / superuser, applied at every AD login."""
+    list_display = ('ad_group_name', 'sid', 'group', 'grants_staff', 'grants_superuser')
+    list_filter = ('grants_staff', 'grants_superuser')
+    search_fields = ('ad_group_name', 'sid', 'group__name')
+    list_select_related = ('group',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_group_mapping()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_group_mapping()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_group_mapping()
@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete
+        from django.utils.module_loading import import_string
+        from ADIWA.ad_trace import tracer
+        from .metrics import install_query_counter
+        from .models import User
+        from .tokens import forget_deleted_user
+        from .vault import revoke_on_logout
+
+        user_logged_out.connect(revoke_on_logout, dispatch_uid='core.vault.revoke_on_logout')
+        connection_created.connect(install_query_counter, dispatch_uid='core.metrics.install_query_counter')
+        post_delete.connect(forget_deleted_user, sender=User, dispatch_uid='core.tokens.forget_deleted_user')
+
+        tracer.configure(
+            slow_ms=settings.AD_SLOW_OPERATION_MS,
+            hooks=[import_string(hook) for hook in settings.AD_TRACE_HOOKS],
+        )
@@ -0,0 +1,36 @@
+"""
+Admin log entries for the AD writes core applies outside the admin views
+(outbox, bulk jobs, provisioning, the login verifier).
+
+core does not decide where they are stored: an app registers a recorder with
+set_recorder() (the employee app registers its write-behind AuditWriter).
+Without one, record_action() writes the LogEntry synchronously.
+"""
+from django.contrib.admin.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+
+_recorder = None
+
+
+def set_recorder(recorder):
+    """Send record_action() calls to ``recorder.record_action()`` (same keyword arguments)."""
+    global _recorder
+    _recorder = recorder
+
+
+def record_action(*, user_id, model, object_id, object_repr, action_flag, change_message):
+    """Record a Django admin LogEntry for ``model``."""
+    if _recorder is not None:
+        _recorder.record_action(
+            user_id=user_id, model=model, object_id=object_id, object_repr=object_repr,
+            action_flag=action_flag, change_message=change_message,
+        )
+        return
+    LogEntry.objects.create(
+        user_id=user_id,
+        content_type_id=ContentType.objects.get_for_model(model).pk,
+        object_id=str(object_id) if object_id is not None else None,
+        object_repr=str(object_repr)[:200],
+        action_flag=action_flag,
+        change_message=change_message,
+    )
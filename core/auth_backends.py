@@ -1,3 +1,7 @@
+import hashlib
+import hmac
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.backends import BaseBackend 
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
@@ -5,11 +9,30 @@ from django.shortcuts import get_object_or_404
 from django.conf import settings 
 import logging 
 
+from ADIWA.ad_conn import BIND_INVALID
+from . import verifier
+from .groups import aread_token_groups, get_group_mapping, read_token_groups, sync_user_groups
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .utils import async_directory, new_directory
+from .vault import get_vault
+
 
 
 logger = logging.getLogger(__name__) 
 User = get_user_model() 
 
+# How long a rejected bind is answered from the cache without asking AD again
+LOGIN_FAILURE_CACHE_TIMEOUT = 30
+
+_logins = SingleFlight()
+_alogins = AsyncSingleFlight()
+
+
+def credential_fingerprint(username, password):
+    """Keyed hash of the credentials, so neither appears in cache keys."""
+    message = f"{username.lower()}\0{password}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
 
 
 class ActiveDirectoryBackend(BaseBackend): 
@@ -23,30 +46,140 @@ class ActiveDirectoryBackend(BaseBackend):
             username = f"{username}@{settings.DOMAIN}"
         if not username or not password: 
             return None 
-        ad = settings.ACTIVE_DIR 
-        # check against AD 
-        if not ad.connect_ad(username, password): 
-            logger.warning(f"AD authentication failed for {username}") 
-            return None 
-        # Capture credentials in session for later use in Sync/Transfer actions
-        
-        
-        user = get_object_or_404(User, username=username)
-        
-        if not user or not user.is_active: 
-            return None 
-        
-        cache_key = f'ad_creds_{user.id}'
-        cache.set(cache_key, {
-            'username' : username,
-            'password': password,
-        }, timeout=300)
-        
-        logger.info(f"AD credentials cached for user {user.id}")
-        
+
+        # Concurrent attempts with the same credentials share one bind, and a
+        # rejected password is remembered briefly, so a login storm costs the
+        # DC at most one bind per user.
+        fingerprint = credential_fingerprint(username, password)
+        failed_key = f'ad_login_failed_{fingerprint}'
+        if cache.get(failed_key):
+            logger.warning(f"AD authentication failed for {username} (recent failure)")
+            return None
+
+        user, shared = _logins.do(fingerprint, lambda: self._login(username, password, failed_key))
+        if user is not None and shared:
+            # Every caller gets its own instance; login() writes to it
+            user = self.get_user(user.pk)
+        return user
+
+    def _login(self, username, password, failed_key):
+        # While the DC is known to be down, don't wait for another bind timeout
+        if verifier.enabled() and verifier.is_degraded():
+            user = verifier.login_locally(username, password)
+            if user:
+                return user
+
+        # A connection of its own: concurrent logins must not share a bind
+        with new_directory() as ad:
+            # check against AD 
+            if not ad.connect_ad(username, password): 
+                logger.warning(f"AD authentication failed for {username}") 
+                if ad.bind_error == BIND_INVALID:
+                    cache.set(failed_key, True, LOGIN_FAILURE_CACHE_TIMEOUT)
+                    # The password may have been changed or reset in AD: stop accepting it locally
+                    verifier.forget(username)
+                elif verifier.enabled():
+                    verifier.mark_degraded()
+                    return verifier.login_locally(username, password)
+                return None 
+
+            if verifier.enabled():
+                verifier.clear_degraded()
+                # The slow hash is kept off the login path
+                verifier.remember_in_background(username, password)
+            # Capture credentials in session for later use in Sync/Transfer actions
+            
+            
+            user = get_object_or_404(User, username=username)
+            
+            if not user or not user.is_active: 
+                return None 
+            
+            get_vault().store(user.id, username, password)
+            
+            logger.info(f"AD credentials stored for user {user.id}")
+
+            if settings.AD_GROUP_SYNC:
+                self._sync_groups(ad, user)
+
         return user 
+
+    def _sync_groups(self, ad, user):
+        """Apply ADGroupMapping from the user's tokenGroups; a failure never blocks the login."""
+        try:
+            if not get_group_mapping():
+                return
+            sids = read_token_groups(ad, user.username)
+            if sids is not None:
+                sync_user_groups(user, sids)
+        except Exception as e:
+            logger.warning(f"AD group sync failed for {user.username}: {e}")
     
 
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """authenticate() for async views; the bind runs on an AsyncADConnection."""
+        if '@' not in username:
+            username = f"{username}@{settings.DOMAIN}"
+        if not username or not password:
+            return None
+
+        fingerprint = credential_fingerprint(username, password)
+        failed_key = f'ad_login_failed_{fingerprint}'
+        if await cache.aget(failed_key):
+            logger.warning(f"AD authentication failed for {username} (recent failure)")
+            return None
+
+        user, shared = await _alogins.do(fingerprint, lambda: self._alogin(username, password, failed_key))
+        if user is not None and shared:
+            user = await self.aget_user(user.pk)
+        return user
+
+    async def _alogin(self, username, password, failed_key):
+        if verifier.enabled() and await sync_to_async(verifier.is_degraded)():
+            user = await sync_to_async(verifier.login_locally)(username, password)
+            if user:
+                return user
+
+        async with async_directory() as ad:
+            if not await ad.connect_ad(username, password):
+                logger.warning(f"AD authentication failed for {username}")
+                if ad.bind_error == BIND_INVALID:
+                    await cache.aset(failed_key, True, LOGIN_FAILURE_CACHE_TIMEOUT)
+                    await sync_to_async(verifier.forget)(username)
+                elif verifier.enabled():
+                    await sync_to_async(verifier.mark_degraded)()
+                    return await sync_to_async(verifier.login_locally)(username, password)
+                return None
+
+            if verifier.enabled():
+                await sync_to_async(verifier.clear_degraded)()
+                verifier.remember_in_background(username, password)
+
+            user = await User.objects.filter(username=username).afirst()
+            if not user or not user.is_active:
+                return None
+
+            await sync_to_async(get_vault().store)(user.id, username, password)
+            logger.info(f"AD credentials stored for user {user.id}")
+
+            if settings.AD_GROUP_SYNC:
+                await self._async_sync_groups(ad, user)
+
+        return user
+
+    async def _async_sync_groups(self, ad, user):
+        try:
+            if not await sync_to_async(get_group_mapping)():
+                return
+            sids = await aread_token_groups(ad, user.username)
+            if sids is not None:
+                await sync_to_async(sync_user_groups)(user, sids)
+        except Exception as e:
+            logger.warning(f"AD group sync failed for {user.username}: {e}")
+
+    async def aget_user(self, user_id):
+        return await User.objects.filter(pk=user_id).afirst()
+
     def get_user(self, user_id): 
         try: 
             return User.objects.get(pk=user_id) 
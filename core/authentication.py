@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import (
+    INACTIVE_USER, MISSING_USER, TOKEN_VERSION_CLAIM, ClaimsUser, aget_token_version, get_token_version,
+)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token claims (see
+    core.tokens) instead of loading it. The token version and active flag are
+    checked against the cached current ones. Tokens issued without the claims
+    still load the user the usual way.
+    """
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        return self._claims_user(validated_token, get_token_version(validated_token[api_settings.USER_ID_CLAIM]))
+
+    @staticmethod
+    def _claims_user(validated_token, version):
+        if version == MISSING_USER:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if version == INACTIVE_USER or not validated_token.get('is_active', True):
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if version != validated_token[TOKEN_VERSION_CLAIM]:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+        return ClaimsUser(validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: (user, token) or None."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        version = await aget_token_version(validated_token[api_settings.USER_ID_CLAIM])
+        return self._claims_user(validated_token, version)
@@ -0,0 +1,130 @@
+"""
+Large-table mode for admin changelists.
+
+LargeTableAdminMixin keeps a changelist page at a fixed number of queries
+however big the table gets:
+
+  * every FK shown in list_display is joined (nullable ones included)
+  * the row count comes from table statistics instead of COUNT(*)
+  * pages are addressed by keyset cursor (?after= / ?before=) instead of
+    OFFSET; sorting by a column header falls back to numbered pages
+  * AutocompleteFilter replaces related-field filters that would load the
+    whole related table into a dropdown
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.urls import reverse
+
+from .pagination import EstimatedCountPaginator, KeysetPage
+
+KEYSET_PARAMS = ('after', 'before')
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Related-field filter backed by the admin autocomplete view.
+
+    Only the selected value is loaded; other choices are searched on demand,
+    so the related model's admin needs ``search_fields``.
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.autocomplete_url = '%s?app_label=%s&model_name=%s&field_name=%s' % (
+            reverse(f'{model_admin.admin_site.name}:autocomplete'),
+            model._meta.app_label, model._meta.model_name, field.name,
+        )
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages with KeysetPage when the default ordering is in use."""
+
+    keyset = None
+
+    def __init__(self, request, *args, **kwargs):
+        super().__init__(request, *args, **kwargs)
+        # Filter, search and sort links start again from the first page.
+        for param in KEYSET_PARAMS:
+            self.params.pop(param, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for param in KEYSET_PARAMS:
+            lookup_params.pop(param, None)
+        return lookup_params
+
+    def get_results(self, request):
+        ordering = self.model_admin.get_keyset_ordering(request)
+        if not ordering or ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset = KeysetPage(
+            self.queryset,
+            ordering=ordering,
+            per_page=self.list_per_page,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+
+        self.result_count = paginator.count
+        self.result_count_is_estimate = paginator.is_estimate
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = self.keyset.object_list
+        self.can_show_all = False
+        self.multi_page = self.keyset.has_other_pages()
+        self.paginator = paginator
+
+        self.keyset_first_url = self.get_query_string(remove=KEYSET_PARAMS)
+        if self.keyset.has_previous:
+            self.keyset_previous_url = self.get_query_string(
+                {'before': self.keyset.previous_cursor}, remove=['after'],
+            )
+        if self.keyset.has_next:
+            self.keyset_next_url = self.get_query_string(
+                {'after': self.keyset.next_cursor}, remove=['before'],
+            )
+
+
+class LargeTableAdminMixin:
+    """
+    Mix into a ModelAdmin whose table is expected to grow large.
+
+    ``keyset_ordering`` must be unique (end it with 'pk' / '-pk') and use
+    non-null columns, ideally covered by an index.
+    """
+    keyset_ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_keyset_ordering(self, request):
+        return self.keyset_ordering
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_list_select_related(self, request):
+        if self.list_select_related:
+            return self.list_select_related
+
+        related = []
+        for name in self.get_list_display(request):
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.many_to_one or field.one_to_one:
+                related.append(name)
+        return related
@@ -0,0 +1,52 @@
+"""
+Authenticated symmetric encryption for secrets kept at rest in the DB
+(the credential vault, passwords waiting in the directory outbox).
+
+Fernet from the ``cryptography`` package, keyed by CREDENTIAL_ENCRYPTION_KEYS:
+Fernet keys, newest first. Tokens are made with the first key and read with
+any of them (MultiFernet), so a key is rotated by putting a new one in front
+and dropping the old one once its tokens have expired.
+
+Without CREDENTIAL_ENCRYPTION_KEYS a key is derived from SECRET_KEY. That is
+meant for development only: rotating SECRET_KEY then makes stored secrets
+undecryptable.
+"""
+import base64
+import functools
+import hashlib
+import logging
+
+from cryptography import fernet
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidToken(ValueError):
+    """Raised when a token was tampered with or made with another key."""
+
+
+@functools.lru_cache(maxsize=4)
+def _fernet(keys, secret_key):
+    if not keys:
+        logger.warning("CREDENTIAL_ENCRYPTION_KEYS is not set; deriving the encryption key from SECRET_KEY")
+        derived = hashlib.sha256(b'adiwa.crypto:' + secret_key.encode('utf-8')).digest()
+        keys = (base64.urlsafe_b64encode(derived),)
+    return fernet.MultiFernet([fernet.Fernet(key) for key in keys])
+
+
+def _keys():
+    return _fernet(tuple(settings.CREDENTIAL_ENCRYPTION_KEYS), settings.SECRET_KEY)
+
+
+def encrypt(plaintext):
+    """Encrypt a string and return a URL-safe token."""
+    return _keys().encrypt(plaintext.encode('utf-8')).decode('ascii')
+
+
+def decrypt(token):
+    """Decrypt a token made by encrypt(), or raise InvalidToken."""
+    try:
+        return _keys().decrypt(token.encode('ascii')).decode('utf-8')
+    except (fernet.InvalidToken, UnicodeError):
+        raise InvalidToken("Token is malformed, was tampered with or was made with another key")
@@ -1,5 +1,6 @@
 from django import forms
 from employee import models as emp_models
+from .provisioning import parse_provisioning_csv
 
 class ADUserCreationForm(forms.Form):
     """
@@ -94,3 +95,63 @@ class ADPasswordChangeForm(forms.Form):
         if pwd and confirm and pwd != confirm:
             raise forms.ValidationError("Passwords do not match.")
         return cleaned
+
+
+class ADUserBulkCreationForm(forms.Form):
+    """
+    CSV upload for creating many AD users at once.
+    Passwords in the file are sent to AD only — they are NOT stored locally.
+    """
+    csv_file = forms.FileField(
+        label='CSV File',
+        help_text='Required columns: username, password, given_name, surname. '
+                  'Optional: email, telephone, ou, full_name_ar, nid, hire_date, job_title.',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+    )
+    create_employees = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Create the linked user and employee records',
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label='Validate only (do not create anything)',
+    )
+
+    def clean_csv_file(self):
+        upload = self.cleaned_data['csv_file']
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The file must be UTF-8 encoded CSV.")
+
+        try:
+            self.cleaned_data['rows'], self.cleaned_data['rejected'] = parse_provisioning_csv(text)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return upload
+
+
+AD_GROUP_MAX_NEW_MEMBERS = 2000
+
+
+class ADGroupMembersForm(forms.Form):
+    """Usernames to add to an AD group."""
+    usernames = forms.CharField(
+        label='Add Members',
+        help_text='sAMAccountNames, one per line or comma-separated.',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 4,
+            'placeholder': 'e.g. user.one\nuser.two',
+        }),
+    )
+
+    def clean_usernames(self):
+        raw = self.cleaned_data['usernames'].replace(',', '\n').split()
+        usernames = list(dict.fromkeys(name.split('@')[0].strip().lower() for name in raw if name.strip()))
+        if not usernames:
+            raise forms.ValidationError("Enter at least one username.")
+        if len(usernames) > AD_GROUP_MAX_NEW_MEMBERS:
+            raise forms.ValidationError(f"At most {AD_GROUP_MAX_NEW_MEMBERS} members can be added at once.")
+        return usernames
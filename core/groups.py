@@ -0,0 +1,194 @@
+"""
+AD group membership for the admin.
+
+A user's groups (direct and nested, one LDAP_MATCHING_RULE_IN_CHAIN search)
+and a group's member list (ranged retrieval) are cached, so opening a user or
+paging through a large group does not go back to the DC every time.
+Membership changes are queued on the outbox ('update_group'), which calls
+invalidate_memberships() once AD has applied them.
+
+At login, sync_user_groups() maps the user's tokenGroups SIDs to Django
+groups and the staff/superuser flags through ADGroupMapping.
+"""
+import hashlib
+import logging
+import re
+
+from django.core.cache import cache
+
+from .models import ADGroupMapping
+from .tokens import revoke_tokens
+
+logger = logging.getLogger(__name__)
+
+USER_GROUPS_CACHE_TIMEOUT = 5 * 60
+GROUP_MEMBERS_CACHE_TIMEOUT = 60
+
+# Bumped on every membership change; part of every per-user cache key, so one
+# write invalidates all cached memberships (a removed member's username is
+# not known, only its DN).
+VERSION_CACHE_KEY = 'ad_groups_version'
+
+
+def _version():
+    return cache.get_or_set(VERSION_CACHE_KEY, 1, None)
+
+
+def _user_key(username):
+    return f"ad_groups_{_version()}_{username.split('@')[0].lower()}"
+
+
+def _group_key(group_dn):
+    return f"ad_group_members_{hashlib.sha1(group_dn.lower().encode()).hexdigest()}"
+
+
+def cn_from_dn(dn):
+    match = re.match(r'CN=((?:\\.|[^,])+)', dn or '', re.IGNORECASE)
+    return match.group(1).replace('\\', '') if match else dn
+
+
+def get_user_groups(username, connect):
+    """
+    Groups of ``username`` (see ADConnection.get_user_groups), cached per user.
+
+    ``connect()`` is only called on a cache miss. Returns None if the user is
+    not in AD.
+    """
+    key = _user_key(username)
+    groups = cache.get(key)
+    if groups is None:
+        ad = connect()
+        if not ad:
+            return None
+        groups = ad.get_user_groups(username)
+        # [] is a valid answer; cache "not in AD" as False
+        cache.set(key, groups if groups is not None else False, USER_GROUPS_CACHE_TIMEOUT)
+    return None if groups is False else groups
+
+
+def get_group_members(group_dn, ad):
+    """Direct members of a group as [{'dn', 'name'}], sorted by name and cached briefly."""
+    key = _group_key(group_dn)
+    members = cache.get(key)
+    if members is None:
+        members = sorted(
+            ({'dn': dn, 'name': cn_from_dn(dn)} for dn in ad.get_group_members(group_dn)),
+            key=lambda member: member['name'].lower(),
+        )
+        cache.set(key, members, GROUP_MEMBERS_CACHE_TIMEOUT)
+    return members
+
+
+def invalidate_memberships(group_dn):
+    """Forget the cached member list of ``group_dn`` and every cached user membership."""
+    cache.delete(_group_key(group_dn))
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 2, None)
+
+
+# ---------------------------------------------------------------------------
+# AD group -> Django group mapping (applied at login)
+# ---------------------------------------------------------------------------
+
+MAPPING_CACHE_KEY = 'ad_group_mapping'
+MAPPING_CACHE_TIMEOUT = 60 * 60
+
+USER_DN_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_group_mapping():
+    """{SID: (group_id, grants_staff, grants_superuser)} for every ADGroupMapping, cached."""
+    mapping = cache.get(MAPPING_CACHE_KEY)
+    if mapping is None:
+        mapping = {
+            sid: (group_id, staff, superuser)
+            for sid, group_id, staff, superuser in ADGroupMapping.objects.values_list(
+                'sid', 'group_id', 'grants_staff', 'grants_superuser',
+            )
+        }
+        cache.set(MAPPING_CACHE_KEY, mapping, MAPPING_CACHE_TIMEOUT)
+    return mapping
+
+
+def invalidate_group_mapping():
+    cache.delete(MAPPING_CACHE_KEY)
+
+
+def read_token_groups(ad, username):
+    """
+    The user's group SIDs via one base-scope tokenGroups read.
+
+    The user's DN is cached, so only the first login (or the first after an
+    OU move) needs the extra DN lookup. Returns None if the user is not in AD.
+    """
+    key = f"ad_dn_{username.split('@')[0].lower()}"
+    dn = cache.get(key)
+    sids = ad.get_token_groups(dn) if dn else None
+    if sids is None:
+        dns = ad.search_user_dn(username.split('@')[0])
+        if not dns:
+            return None
+        cache.set(key, dns[0], USER_DN_CACHE_TIMEOUT)
+        sids = ad.get_token_groups(dns[0])
+    return sids
+
+
+async def aread_token_groups(ad, username):
+    """read_token_groups() over an AsyncADConnection."""
+    key = f"ad_dn_{username.split('@')[0].lower()}"
+    dn = await cache.aget(key)
+    sids = await ad.get_token_groups(dn) if dn else None
+    if sids is None:
+        dns = await ad.search_user_dn(username.split('@')[0])
+        if not dns:
+            return None
+        await cache.aset(key, dns[0], USER_DN_CACHE_TIMEOUT)
+        sids = await ad.get_token_groups(dns[0])
+    return sids
+
+
+def sync_user_groups(user, sids):
+    """
+    Bring ``user``'s mapped Django groups and staff/superuser flags in line
+    with the AD group ``sids``. Only groups that appear in the mapping are
+    touched; the flags only when some mapping grants them. Nothing is written
+    when the user is already up to date.
+    """
+    mapping = get_group_mapping()
+    if not mapping:
+        return False
+
+    matched = [mapping[sid] for sid in sids if sid in mapping]
+    managed_ids = {group_id for group_id, _, _ in mapping.values() if group_id}
+    wanted_ids = {group_id for group_id, _, _ in matched if group_id}
+
+    changed = False
+    current_ids = set(user.groups.filter(pk__in=managed_ids).values_list('pk', flat=True))
+    if wanted_ids - current_ids:
+        user.groups.add(*(wanted_ids - current_ids))
+        changed = True
+    if current_ids - wanted_ids:
+        user.groups.remove(*(current_ids - wanted_ids))
+        changed = True
+
+    flags = {}
+    if any(staff for _, staff, _ in mapping.values()):
+        flags['is_staff'] = any(staff for _, staff, _ in matched)
+    if any(superuser for _, _, superuser in mapping.values()):
+        flags['is_superuser'] = any(superuser for _, _, superuser in matched)
+    flags = {name: value for name, value in flags.items() if getattr(user, name) != value}
+    if flags:
+        for name, value in flags.items():
+            setattr(user, name, value)
+        user.save(update_fields=list(flags))
+        # The flags are JWT claims; make clients log in again to pick them up
+        revoke_tokens([user.pk])
+        # ...but the tokens this login is about to issue must carry the new version
+        user.refresh_from_db(fields=['token_version'])
+        changed = True
+
+    if changed:
+        logger.info(f"AD groups synced for {user.username}: groups={sorted(wanted_ids)} {flags}")
+    return changed
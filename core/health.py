@@ -0,0 +1,102 @@
+"""
+Liveness and readiness checks for the container probes.
+
+/healthz only proves the process answers HTTP: no database, cache or AD
+work. /readyz runs the checks below and caches the outcome for
+READINESS_CACHE_SECONDS in the process. A burst of probes is answered by a
+single run, so probes never add load on the database or the DC.
+
+  * database - a round trip on the default connection
+  * cache    - set and read back a short-lived key
+  * ad       - TCP connect to SERVER_HOST (no bind), and whether logins have
+               marked the DC degraded (core.verifier)
+
+The report only says whether each check passed and how long it took; why
+one failed (hosts, driver errors) goes to the log, not to the unauthenticated
+probe. The instance is ready when the database and the cache are ok. AD only
+counts when READINESS_REQUIRES_AD is set: an AD outage hits every instance
+alike, and taking them all out of rotation would also stop the logins the
+local verifier can still serve.
+"""
+import logging
+import socket
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from ldap3 import Server
+
+from . import verifier
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+READINESS_CACHE_SECONDS = 5
+# Seconds each check may take before it counts as failed
+CHECK_TIMEOUT = 2
+
+_runs = SingleFlight()
+_last = {'at': 0.0, 'report': None}
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache():
+    key, value = f'readyz_{uuid.uuid4().hex}', uuid.uuid4().hex
+    cache.set(key, value, 10)
+    try:
+        if cache.get(key) != value:
+            raise Exception("value written to the cache could not be read back")
+    finally:
+        cache.delete(key)
+
+
+def check_ad():
+    server = Server(settings.SERVER_HOST)
+    socket.create_connection((server.host, server.port), timeout=CHECK_TIMEOUT).close()
+    if verifier.is_degraded():
+        raise Exception("logins found the domain controller unavailable")
+
+
+CHECKS = {'database': check_database, 'cache': check_cache, 'ad': check_ad}
+
+
+def _run_checks():
+    checks = {}
+    for name, check in CHECKS.items():
+        started = time.perf_counter()
+        try:
+            check()
+            status = {'ok': True}
+        except Exception as e:
+            logger.warning(f"Readiness check '{name}' failed: {e}")
+            status = {'ok': False}
+        status['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        checks[name] = status
+
+    required = ['database', 'cache'] + (['ad'] if settings.READINESS_REQUIRES_AD else [])
+    return {
+        'ready': all(checks[name]['ok'] for name in required),
+        'checks': checks,
+        'checked_at': time.time(),
+    }
+
+
+def readiness():
+    """The latest readiness report, re-checked at most every READINESS_CACHE_SECONDS."""
+    if _last['report'] is not None and time.monotonic() - _last['at'] < READINESS_CACHE_SECONDS:
+        return _last['report']
+
+    def run():
+        report = _run_checks()
+        _last['at'], _last['report'] = time.monotonic(), report
+        return report
+
+    report, _ = _runs.do('readiness', run)
+    return report
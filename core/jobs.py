@@ -0,0 +1,268 @@
+"""
+Background jobs for bulk lifecycle actions on AD accounts (password reset,
+disable, delete), started from the User changelist.
+
+A job binds one connection, resolves every DN (with userAccountControl) in
+batched OR-filter searches, applies the action in chunks of pipelined
+operations on that connection (ADConnection.run_pipelined), and then updates the DB with single queryset update()/delete()
+calls. Progress and per-account results are saved on the BulkDirectoryJob
+row; generated passwords are stored encrypted (after every chunk, so a job
+that dies half way keeps the ones already set) until the requester
+downloads them once. A job whose thread died with its process stops
+updating ``heartbeat_at`` and is marked failed by fail_stale_jobs().
+"""
+import csv
+import io
+import logging
+import secrets
+import string
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, DELETION
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ADIWA.ad_conn import ADConnection
+from . import audit
+from .crypto import decrypt, encrypt
+from .models import BulkDirectoryJob, User
+from .signals import users_deleted
+from .tokens import revoke_tokens
+from .utils import service_credentials
+
+logger = logging.getLogger(__name__)
+
+# Accounts per pipelined chunk; progress is written back after each one.
+PROGRESS_INTERVAL = 100
+
+# A queued or running job with no progress for this long has lost its thread.
+STALE_JOB_TIMEOUT = timedelta(minutes=15)
+
+# Permission the requester needs for the job to run as the service account.
+ACTION_PERMISSIONS = {
+    'reset_password': 'core.change_user',
+    'disable': 'core.change_user',
+    'delete': 'core.delete_user',
+}
+
+GENERATED_PASSWORD_LENGTH = 16
+PASSWORD_SYMBOLS = '!@#$%^&*-_=+?'
+
+
+def generate_password(length=GENERATED_PASSWORD_LENGTH):
+    """Random password with upper, lower, digit and symbol (AD complexity rules)."""
+    alphabet = string.ascii_letters + string.digits + PASSWORD_SYMBOLS
+    required = [
+        secrets.choice(string.ascii_uppercase),
+        secrets.choice(string.ascii_lowercase),
+        secrets.choice(string.digits),
+        secrets.choice(PASSWORD_SYMBOLS),
+    ]
+    chars = required + [secrets.choice(alphabet) for _ in range(length - len(required))]
+    secrets.SystemRandom().shuffle(chars)
+    return ''.join(chars)
+
+
+def start_job(action, users, requested_by, credentials):
+    """
+    Record a job for ``users`` and run it on a background thread once the
+    request commits. ``credentials`` is (username, password); the AD service
+    account is used instead when configured and the requester holds the
+    action's permission.
+    """
+    targets = [{'id': user.pk, 'username': user.username.split('@')[0].lower()} for user in users]
+    job = BulkDirectoryJob.objects.create(
+        action=action, targets=targets, total=len(targets), requested_by=requested_by,
+    )
+
+    credentials = service_credentials(requested_by, ACTION_PERMISSIONS[action]) or credentials
+    transaction.on_commit(lambda: _run_in_background(job.pk, credentials))
+    return job
+
+
+def _run_in_background(job_id, credentials):
+    def run():
+        try:
+            run_job(job_id, lambda: _connect(*credentials))
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'bulk-directory-job-{job_id}', daemon=True).start()
+
+
+def _connect(username, password):
+    ad = ADConnection(
+        server_host=settings.SERVER_HOST,
+        domain=settings.DOMAIN,
+        base_dn=settings.BASE_DN,
+        base_container=settings.CONTAINER_DN_BASE,
+        probe=False,
+    )
+    if not ad.connect_ad(username, password):
+        raise Exception(f"Failed to connect to AD as {username}")
+    return ad
+
+
+def run_job(job_id, connect):
+    """Apply the job's action to every target on the connection from ``connect()``."""
+    job = BulkDirectoryJob.objects.get(pk=job_id)
+    now = timezone.now()
+    BulkDirectoryJob.objects.filter(pk=job.pk).update(status='running', started_at=now, heartbeat_at=now)
+
+    try:
+        ad = connect()
+        accounts = ad.search_users_uac([target['username'] for target in job.targets])
+        results, passwords = _apply(job, ad, accounts)
+    except Exception as exc:
+        logger.error(f"Bulk directory job {job.pk} failed: {exc}", exc_info=True)
+        BulkDirectoryJob.objects.filter(pk=job.pk).update(
+            status='failed', error=str(exc), finished_at=timezone.now(),
+        )
+        return
+
+    done_ids = [target['id'] for target, result in zip(job.targets, results) if result['status'] == 'success']
+    _apply_local_changes(job, done_ids, results)
+
+    BulkDirectoryJob.objects.filter(pk=job.pk).update(
+        status='finished',
+        processed=len(results),
+        succeeded=sum(1 for result in results if result['status'] == 'success'),
+        failed=sum(1 for result in results if result['status'] == 'failed'),
+        results=results,
+        secret=encrypt(_passwords_csv(passwords)) if passwords else '',
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Bulk directory job {job.pk} ({job.action}) finished: {len(done_ids)}/{job.total} succeeded")
+
+
+def _apply(job, ad, accounts):
+    results, passwords = [], []
+    succeeded = failed = 0
+
+    for start in range(0, len(job.targets), PROGRESS_INTERVAL):
+        chunk = job.targets[start:start + PROGRESS_INTERVAL]
+        found = [(t['username'], accounts[t['username']]) for t in chunk if t['username'] in accounts]
+
+        try:
+            outcomes, chunk_passwords = _apply_chunk(job.action, ad, found)
+            passwords.extend(chunk_passwords)
+        except Exception as exc:
+            # Keep going so the passwords already reset are not lost
+            logger.error(f"Bulk directory job {job.pk}: {job.action} failed for {len(found)} accounts: {exc}")
+            outcomes, chunk_passwords = {username: (False, str(exc)) for username, _ in found}, []
+
+        for target in chunk:
+            username = target['username']
+            success, message = outcomes.get(
+                username, (False, f"User '{username}' not found in Active Directory."),
+            )
+            results.append({'username': username, 'status': 'success' if success else 'failed', 'message': message})
+            if success:
+                succeeded += 1
+            else:
+                failed += 1
+
+        progress = {'processed': len(results), 'succeeded': succeeded, 'failed': failed}
+        if chunk_passwords:
+            progress['secret'] = encrypt(_passwords_csv(passwords))
+        BulkDirectoryJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now(), **progress)
+
+    return results, passwords
+
+
+def _apply_chunk(action, ad, found):
+    """
+    Apply ``action`` to ``found`` ([(username, (dn, uac))]) in one pipelined
+    batch. Returns ({username: (success, message)}, [(username, new password)]).
+    """
+    usernames = [username for username, _ in found]
+    passwords = []
+
+    if action == 'reset_password':
+        new_passwords = [generate_password() for _ in found]
+        outcomes = ad.set_passwords_dn(
+            [(dn, password) for (_, (dn, _)), password in zip(found, new_passwords)], must_change=True,
+        )
+        passwords = [
+            (username, password)
+            for username, password, (success, _) in zip(usernames, new_passwords, outcomes) if success
+        ]
+        outcomes = [
+            (True, "Password reset; must be changed at next logon.") if success else (False, message)
+            for success, message in outcomes
+        ]
+    elif action == 'disable':
+        outcomes = ad.disable_dns([account for _, account in found])
+    else:
+        outcomes = ad.delete_dns([dn for _, (dn, _) in found])
+
+    return dict(zip(usernames, outcomes)), passwords
+
+
+def _apply_local_changes(job, done_ids, results):
+    """Mirror the AD change in the DB with one query per table, then audit it."""
+    # Tokens already issued to these accounts stop working
+    revoke_tokens(done_ids)
+    if job.action == 'disable' and done_ids:
+        User.objects.filter(pk__in=done_ids).update(is_active=False)
+    elif job.action == 'delete' and done_ids:
+        with transaction.atomic():
+            users_deleted.send(sender=User, user_ids=done_ids)
+            User.objects.filter(pk__in=done_ids).delete()
+
+    if not job.requested_by_id:
+        return
+
+    flag = DELETION if job.action == 'delete' else CHANGE
+    for target, result in zip(job.targets, results):
+        if result['status'] == 'success':
+            audit.record_action(
+                user_id=job.requested_by_id,
+                model=User,
+                object_id=target['id'],
+                object_repr=target['username'],
+                action_flag=flag,
+                change_message=f"{job.get_action_display()} (bulk job {job.pk}): {result['message']}",
+            )
+
+
+def _passwords_csv(passwords):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['username', 'password'])
+    writer.writerows(passwords)
+    return out.getvalue()
+
+
+def fail_stale_jobs():
+    """
+    Mark queued/running jobs that made no progress for STALE_JOB_TIMEOUT as
+    failed (their thread died with its process). Returns how many.
+    """
+    now = timezone.now()
+    cutoff = now - STALE_JOB_TIMEOUT
+    stale = BulkDirectoryJob.objects.filter(
+        Q(status='running', heartbeat_at__lt=cutoff) | Q(status='queued', created_at__lt=cutoff)
+    )
+    count = stale.update(
+        status='failed', finished_at=now,
+        error=f"No progress for {STALE_JOB_TIMEOUT}; the worker running the job stopped.",
+    )
+    if count:
+        logger.warning(f"Marked {count} stale bulk directory job(s) as failed")
+    return count
+
+
+def take_passwords(job):
+    """
+    Return the job's generated-passwords CSV and wipe it, or None if it was
+    already downloaded. The conditional update makes this one-shot even with
+    concurrent requests.
+    """
+    token = job.secret
+    if not token or not BulkDirectoryJob.objects.filter(pk=job.pk, secret=token).update(secret=''):
+        return None
+    return decrypt(token)
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Active Directory writes from the directory outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.DIRECTORY_OUTBOX_WORKERS,
+            help='Operations applied concurrently',
+        )
+        parser.add_argument('--limit', type=int, default=100, help='Operations picked up per pass')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_outbox(max_workers=options['workers'], limit=options['limit'])
+            if processed:
+                self.stdout.write(f'Processed {processed} directory operations.')
+            if not options['loop']:
+                break
+
+            close_old_connections()
+            # A full batch means more work is waiting; otherwise back off.
+            if processed < options['limit']:
+                time.sleep(options['interval'])
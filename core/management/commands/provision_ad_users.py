@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import connection_pool, parse_provisioning_csv, provision_users
+
+
+class Command(BaseCommand):
+    help = 'Create Active Directory users in bulk from a CSV file (runs as AD_SERVICE_USERNAME)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV with username, password, given_name, surname, ... columns')
+        parser.add_argument(
+            '--workers', type=int, default=settings.AD_PROVISION_WORKERS,
+            help='Parallel AD connections',
+        )
+        parser.add_argument(
+            '--create-employees', action='store_true',
+            help='Also create the linked local user and employee records',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating anything')
+
+    def handle(self, *args, **options):
+        styles = {
+            'created': self.style.SUCCESS,
+            'partial': self.style.WARNING,
+            'exists': self.style.WARNING,
+        }
+        try:
+            with open(options['csv_path'], encoding='utf-8-sig', newline='') as f:
+                rows, rejected = parse_provisioning_csv(f.read())
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            results = rejected
+            self.stdout.write(f'{len(rows)} valid rows, {len(rejected)} invalid.')
+        else:
+            if not (settings.AD_SERVICE_USERNAME and settings.AD_SERVICE_PASSWORD):
+                raise CommandError('AD_SERVICE_USERNAME and AD_SERVICE_PASSWORD must be set.')
+
+            pool = connection_pool(settings.AD_SERVICE_USERNAME, settings.AD_SERVICE_PASSWORD, options['workers'])
+            try:
+                results = rejected + provision_users(rows, pool, create_employees=options['create_employees'])
+            except Exception as e:
+                raise CommandError(f'Could not reach Active Directory: {e}')
+            finally:
+                pool.close()
+
+        for row in sorted(results, key=lambda row: row['line']):
+            line = f"line {row['line']:>5}  {row['username']:<20}  {row['status']:<8}  {row['message']}"
+            self.stdout.write(styles.get(row['status'], self.style.ERROR)(line))
+
+        if not options['dry_run']:
+            counts = {}
+            for row in results:
+                counts[row['status']] = counts.get(row['status'], 0) + 1
+            self.stdout.write(', '.join(f'{count} {status}' for status, count in sorted(counts.items())))
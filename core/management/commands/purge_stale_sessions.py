@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired (or long idle) Django sessions in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-days', type=int, default=None,
+            help='Also delete sessions not written for this many days, even if not expired yet',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the sessions that would be deleted')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE != 'django.contrib.sessions.backends.db':
+            raise CommandError(f'Only the database session engine is supported, not {settings.SESSION_ENGINE}.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        cutoff = timezone.now()
+        if options['idle_days'] is not None:
+            # expire_date is (last write + SESSION_COOKIE_AGE)
+            cutoff += timedelta(seconds=settings.SESSION_COOKIE_AGE) - timedelta(days=options['idle_days'])
+            cutoff = max(cutoff, timezone.now())
+        stale = Session.objects.filter(expire_date__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{stale.count()} stale sessions.')
+            return
+
+        # Batches keep each DELETE short on a large, busy table
+        deleted = 0
+        while True:
+            keys = list(stale.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} stale sessions.'))
@@ -0,0 +1,381 @@
+"""
+Application metrics in the Prometheus text format (GET /metrics).
+
+MetricsMiddleware times every request per URL name and counts the database
+queries it ran (and their time) through an execute wrapper installed on each
+new DB connection. The credential vault, the directory snapshot and the
+token-version cache count their hits and misses in CACHE_REQUESTS. LDAP
+latency comes from ADIWA.ad_trace. Worker gauges (requests in progress,
+memory, threads, and those other apps add with register_worker_gauge(),
+such as the audit queue) carry a ``pid`` label.
+
+Each worker process keeps its own numbers in memory; recording is a dict
+update under a lock. With METRICS_DIR set, every worker also writes a
+snapshot there (at most every FLUSH_INTERVAL seconds, and at exit), and
+/metrics adds up the snapshots of all workers, dropping the gauges of
+workers that have exited.
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from ADIWA.ad_trace import tracer
+
+# Seconds between the snapshots a worker writes to METRICS_DIR
+FLUSH_INTERVAL = 5
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+QUERY_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+PROCESS_STARTED = time.time()
+
+_registry = []
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def family(self):
+        with self._lock:
+            samples = {labels: list(value) if isinstance(value, list) else value
+                       for labels, value in self._values.items()}
+        return _family(self.name, self.type, self.documentation, self.labelnames, samples,
+                       getattr(self, 'buckets', None))
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Per-bucket counts (the last one is +Inf) followed by the sum."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+
+def _family(name, kind, documentation, labelnames, samples, buckets=None):
+    return {'name': name, 'type': kind, 'help': documentation, 'labels': list(labelnames),
+            'buckets': list(buckets) if buckets else None, 'samples': samples}
+
+
+REQUESTS = Counter('adiwa_http_requests_total', 'HTTP requests', ['view', 'method', 'status'])
+REQUEST_DURATION = Histogram('adiwa_http_request_duration_seconds', 'HTTP request latency', ['view'])
+REQUESTS_IN_PROGRESS = Gauge('adiwa_http_requests_in_progress', 'HTTP requests being served', ['pid'])
+DB_QUERIES = Histogram('adiwa_db_queries_per_request', 'Database queries per HTTP request', ['view'],
+                       buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram('adiwa_db_query_seconds_per_request', 'Database time per HTTP request', ['view'],
+                    buckets=QUERY_TIME_BUCKETS)
+CACHE_REQUESTS = Counter('adiwa_cache_requests_total', 'Cache lookups', ['cache', 'result'])
+
+
+def cache_lookup(cache, hit):
+    """Count one lookup in the named cache ('credential', 'profile', 'token_version')."""
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+
+# name -> (help, callable returning the current value), read at every collection
+_worker_gauges = {}
+
+
+def register_worker_gauge(name, documentation, value):
+    """Report ``value()`` as a per-worker gauge (labelled with the pid)."""
+    _worker_gauges[name] = (documentation, value)
+
+
+# ---------------------------------------------------------------------------
+# Database queries per request
+# ---------------------------------------------------------------------------
+
+# [query count, seconds] of the current request; copied into sync_to_async threads
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """DB execute wrapper (installed on every connection by CoreConfig.ready)."""
+    totals = _request_queries.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started, token = self._start()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started, token)
+
+    async def __acall__(self, request):
+        started, token = self._start()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, started, token)
+
+    @staticmethod
+    def _start():
+        REQUESTS_IN_PROGRESS.inc(str(os.getpid()))
+        return time.perf_counter(), _request_queries.set([0, 0.0])
+
+    @staticmethod
+    def _finish(request, response, started, token):
+        elapsed = time.perf_counter() - started
+        queries, query_time = _request_queries.get()
+        _request_queries.reset(token)
+        REQUESTS_IN_PROGRESS.dec(str(os.getpid()))
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or '<unnamed>') if match else '<unmatched>'
+        REQUESTS.inc(view, request.method, str(response.status_code) if response is not None else '500')
+        REQUEST_DURATION.observe(elapsed, view)
+        DB_QUERIES.observe(queries, view)
+        DB_TIME.observe(query_time, view)
+        _maybe_flush()
+
+
+# ---------------------------------------------------------------------------
+# Collection
+# ---------------------------------------------------------------------------
+
+def _worker_families():
+    pid = str(os.getpid())
+    families = [
+        _family('adiwa_process_start_time_seconds', 'gauge', 'Start time of the worker process', ['pid'],
+                {(pid,): PROCESS_STARTED}),
+        _family('adiwa_process_threads', 'gauge', 'Threads in the worker process', ['pid'],
+                {(pid,): threading.active_count()}),
+    ]
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        families.append(_family('adiwa_process_resident_memory_bytes', 'gauge', 'Resident memory of the worker',
+                                ['pid'], {(pid,): rss}))
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    for name, (documentation, value) in _worker_gauges.items():
+        families.append(_family(name, 'gauge', documentation, ['pid'], {(pid,): value()}))
+    return families
+
+
+def _ldap_families():
+    latency, errors = {}, {}
+    buckets = None
+    for row in tracer.stats():
+        labels = (row['operation'], row['caller'])
+        counts = list(row['buckets'].values())
+        buckets = [float(bound) / 1000 for bound in list(row['buckets'])[:-1]]
+        latency[labels] = counts + [row['total_ms'] / 1000]
+        errors[labels] = sum(row['errors'].values())
+    return [
+        _family('adiwa_ldap_operation_duration_seconds', 'histogram', 'LDAP operation latency',
+                ['operation', 'caller'], latency, buckets or [1]),
+        _family('adiwa_ldap_operation_errors_total', 'counter', 'LDAP operations that failed',
+                ['operation', 'caller'], errors),
+    ]
+
+
+def collect():
+    """Every metric family of this process."""
+    return [metric.family() for metric in _registry] + _ldap_families() + _worker_families()
+
+
+# ---------------------------------------------------------------------------
+# Multi-process snapshots (METRICS_DIR)
+# ---------------------------------------------------------------------------
+
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def _maybe_flush():
+    global _last_flush
+    if settings.METRICS_DIR and time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        _last_flush = time.monotonic()
+        flush()
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR."""
+    if not settings.METRICS_DIR:
+        return
+    families = [{**family, 'samples': [[list(labels), value] for labels, value in family['samples'].items()]}
+                for family in collect()]
+    with _flush_lock:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(families, f)
+            os.replace(tmp, os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json'))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+atexit.register(lambda: flush() if settings.configured else None)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _snapshots():
+    """[(live, families)] of the other workers' snapshots in METRICS_DIR."""
+    snapshots = []
+    for name in os.listdir(settings.METRICS_DIR) if os.path.isdir(settings.METRICS_DIR) else []:
+        pid, ext = os.path.splitext(name)
+        if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name), encoding='utf-8') as f:
+                families = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for family in families:
+            family['samples'] = {tuple(labels): value for labels, value in family['samples']}
+        snapshots.append((_alive(int(pid)), families))
+    return snapshots
+
+
+def merged_families():
+    """This process's families plus, with METRICS_DIR, every other worker's."""
+    merged = {family['name']: family for family in collect()}
+    if not settings.METRICS_DIR:
+        return list(merged.values())
+
+    for live, families in _snapshots():
+        for family in families:
+            if family['type'] == 'gauge' and not live:
+                continue
+            target = merged.setdefault(family['name'], {**family, 'samples': {}})
+            for labels, value in family['samples'].items():
+                current = target['samples'].get(labels)
+                if current is None:
+                    target['samples'][labels] = value
+                elif isinstance(value, list):
+                    target['samples'][labels] = [a + b for a, b in zip(current, value)]
+                elif family['type'] != 'gauge':
+                    target['samples'][labels] = current + value
+    return list(merged.values())
+
+
+# ---------------------------------------------------------------------------
+# Text format
+# ---------------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(families):
+    lines = []
+    for family in sorted(families, key=lambda family: family['name']):
+        name, names = family['name'], family['labels']
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for values, value in sorted(family['samples'].items()):
+            if family['type'] != 'histogram':
+                lines.append(f'{name}{_labels(names, values)} {_number(value)}')
+                continue
+            cumulative = 0
+            bounds = [_number(float(bound)) for bound in family['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(names, values, ("le", bound))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, values)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(names, values)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_user_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('operation', models.CharField(choices=[('create_user', 'Create User'), ('change_password', 'Change Password'), ('update_ou', 'Transfer OU'), ('delete_user', 'Delete User')], max_length=20)),
+                ('target', models.CharField(help_text='sAMAccountName the operation applies to (lower-case)', max_length=255)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('secret', models.TextField(blank=True, default='', help_text='Encrypted secret fields (passwords); cleared once the operation finishes')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('applied', 'Applied'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(auto_now_add=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('result_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='directory_operations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Directory Operation',
+                'verbose_name_plural': 'Directory Operations',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='idx_dirop_due'), models.Index(fields=['target', 'id'], name='idx_dirop_target')],
+            },
+        ),
+    ]
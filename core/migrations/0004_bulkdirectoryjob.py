@@ -0,0 +1,40 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_directoryoperation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkDirectoryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('reset_password', 'Reset Passwords'), ('disable', 'Disable Accounts'), ('delete', 'Delete Accounts')], max_length=20)),
+                ('targets', models.JSONField(default=list, help_text='[{"id": local user id, "username": sAMAccountName}, ...]')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('succeeded', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('secret', models.TextField(blank=True, default='', help_text='Encrypted CSV of generated passwords; cleared once downloaded')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_directory_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Bulk Directory Job',
+                'verbose_name_plural': 'Bulk Directory Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_bulkdirectoryjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='directoryoperation',
+            name='operation',
+            field=models.CharField(choices=[('create_user', 'Create User'), ('change_password', 'Change Password'), ('update_ou', 'Transfer OU'), ('delete_user', 'Delete User'), ('update_group', 'Update Group Members')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='directoryoperation',
+            name='target',
+            field=models.CharField(help_text='sAMAccountName (user or group) the operation applies to (lower-case)', max_length=255),
+        ),
+    ]
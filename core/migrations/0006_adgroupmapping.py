@@ -0,0 +1,32 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:29
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0005_directoryoperation_update_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ADGroupMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sid', models.CharField(max_length=184, unique=True, validators=[django.core.validators.RegexValidator('^S-1-\\d+(-\\d+)+$', 'Enter a SID such as S-1-5-21-...-1104')], verbose_name='AD group SID')),
+                ('ad_group_name', models.CharField(blank=True, help_text='Display name of the AD group (for reference only)', max_length=255)),
+                ('grants_staff', models.BooleanField(default=False, help_text='Members may log into the admin')),
+                ('grants_superuser', models.BooleanField(default=False, help_text='Members get every permission')),
+                ('group', models.ForeignKey(blank=True, help_text='Django group members of the AD group are placed in', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ad_mappings', to='auth.group')),
+            ],
+            options={
+                'verbose_name': 'AD Group Mapping',
+                'verbose_name_plural': 'AD Group Mappings',
+                'ordering': ['ad_group_name'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_adgroupmapping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredCredential',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('token', models.TextField(help_text='Encrypted username and password')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Credential',
+                'verbose_name_plural': 'Stored Credentials',
+            },
+        ),
+    ]
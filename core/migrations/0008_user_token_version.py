@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_storedcredential'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0, help_text='Embedded in issued JWTs; incremented to revoke them (core.tokens.revoke_tokens)'),
+        ),
+    ]
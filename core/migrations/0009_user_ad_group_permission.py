@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ['username'], 'permissions': [('change_ad_group_membership', 'Can change AD group membership')]},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_ad_group_permission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkdirectoryjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last progress update; a running job that stops updating it is marked failed', null=True),
+        ),
+    ]
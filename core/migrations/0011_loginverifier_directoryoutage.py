@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_bulkdirectoryjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryOutage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoginVerifier',
+            fields=[
+                ('username', models.CharField(help_text='sAMAccountName (lower-case)', max_length=255, primary_key=True, serialize=False)),
+                ('password_hash', models.CharField(max_length=255)),
+                ('uses', models.PositiveIntegerField(default=0, help_text='Local logins verified with this hash')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Login Verifier',
+                'verbose_name_plural': 'Login Verifiers',
+            },
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.auth.models import AbstractUser, BaseUserManager, Group
 from django.core.validators import RegexValidator
 
 
@@ -62,6 +62,11 @@ class User(AbstractUser):
         ]
     )
     
+    token_version = models.PositiveIntegerField(
+        default=0,
+        help_text='Embedded in issued JWTs; incremented to revoke them (core.tokens.revoke_tokens)',
+    )
+    
     objects = UserManager()
     
     USERNAME_FIELD = 'username'
@@ -74,4 +79,229 @@ class User(AbstractUser):
         indexes = [
             models.Index(fields=['username'], name='idx_user_username'),
         ]
-        ordering = ['username']
\ No newline at end of file
+        ordering = ['username']
+        permissions = [
+            ('change_ad_group_membership', 'Can change AD group membership'),
+        ]
+
+class DirectoryOperation(models.Model):
+    """
+    Outbox row for a pending Active Directory write.
+
+    Admin views record the write here (in the same transaction as any DB
+    change) and return immediately; core.outbox applies the rows to AD.
+    """
+
+    OPERATION_CHOICES = [
+        ('create_user', 'Create User'),
+        ('change_password', 'Change Password'),
+        ('update_ou', 'Transfer OU'),
+        ('delete_user', 'Delete User'),
+        ('update_group', 'Update Group Members'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('applied', 'Applied'),
+        ('failed', 'Failed'),
+    ]
+
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES)
+    target = models.CharField(
+        max_length=255,
+        help_text='sAMAccountName (user or group) the operation applies to (lower-case)',
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    secret = models.TextField(
+        blank=True,
+        default='',
+        help_text='Encrypted secret fields (passwords); cleared once the operation finishes',
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    result_message = models.TextField(blank=True, null=True)
+
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='directory_operations',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_operation_display()} {self.target} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Directory Operation'
+        verbose_name_plural = 'Directory Operations'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_dirop_due'),
+            models.Index(fields=['target', 'id'], name='idx_dirop_target'),
+        ]
+
+
+class BulkDirectoryJob(models.Model):
+    """
+    A bulk lifecycle action (password reset, disable, delete) on many AD
+    accounts, run in the background by core.jobs.
+
+    Generated passwords are kept encrypted in ``secret`` until the requester
+    downloads them, then wiped.
+    """
+
+    ACTION_CHOICES = [
+        ('reset_password', 'Reset Passwords'),
+        ('disable', 'Disable Accounts'),
+        ('delete', 'Delete Accounts'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('finished', 'Finished'),
+        ('failed', 'Failed'),
+    ]
+
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    targets = models.JSONField(
+        default=list,
+        help_text='[{"id": local user id, "username": sAMAccountName}, ...]',
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+    secret = models.TextField(
+        blank=True,
+        default='',
+        help_text='Encrypted CSV of generated passwords; cleared once downloaded',
+    )
+
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bulk_directory_jobs',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Last progress update; a running job that stops updating it is marked failed',
+    )
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} ({self.total} accounts, {self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Bulk Directory Job'
+        verbose_name_plural = 'Bulk Directory Jobs'
+
+
+class ADGroupMapping(models.Model):
+    """
+    Maps an AD security group (by SID) to a Django group and admin flags.
+
+    Applied at every AD login from the user's tokenGroups (core.groups).
+    """
+
+    sid = models.CharField(
+        max_length=184,
+        unique=True,
+        verbose_name='AD group SID',
+        validators=[RegexValidator(r'^S-1-\d+(-\d+)+$', 'Enter a SID such as S-1-5-21-...-1104')],
+    )
+    ad_group_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Display name of the AD group (for reference only)',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='ad_mappings',
+        help_text='Django group members of the AD group are placed in',
+    )
+    grants_staff = models.BooleanField(default=False, help_text='Members may log into the admin')
+    grants_superuser = models.BooleanField(default=False, help_text='Members get every permission')
+
+    def __str__(self):
+        return f"{self.ad_group_name or self.sid} -> {self.group or '-'}"
+
+    class Meta:
+        ordering = ['ad_group_name']
+        verbose_name = 'AD Group Mapping'
+        verbose_name_plural = 'AD Group Mappings'
+
+
+class StoredCredential(models.Model):
+    """AD login credentials of a signed-in user, encrypted (core.vault.DatabaseVault)."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    token = models.TextField(help_text='Encrypted username and password')
+    expires_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Credentials of user {self.user_id} (expires {self.expires_at})"
+
+    class Meta:
+        verbose_name = 'Stored Credential'
+        verbose_name_plural = 'Stored Credentials'
+
+
+class LoginVerifier(models.Model):
+    """
+    Slow hash of the password AD last accepted for a user, used to verify
+    repeat logins while the DC is unavailable (core.verifier).
+    """
+
+    username = models.CharField(
+        max_length=255,
+        primary_key=True,
+        help_text='sAMAccountName (lower-case)',
+    )
+    password_hash = models.CharField(max_length=255)
+    uses = models.PositiveIntegerField(default=0, help_text='Local logins verified with this hash')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Login verifier of {self.username} (expires {self.expires_at})"
+
+    class Meta:
+        verbose_name = 'Login Verifier'
+        verbose_name_plural = 'Login Verifiers'
+
+
+class DirectoryOutage(models.Model):
+    """The DC is treated as unavailable until ``until`` (core.verifier); at most one row."""
+
+    until = models.DateTimeField()
+
+    def __str__(self):
+        return f"Active Directory unavailable until {self.until}"
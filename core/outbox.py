@@ -0,0 +1,380 @@
+"""
+Transactional outbox for Active Directory writes.
+
+Admin views call ``enqueue()`` instead of writing to AD inline. The row is
+committed with the request, and ``process_outbox()`` applies it later from the
+``process_directory_outbox`` worker, or from a background thread started on
+commit when DIRECTORY_OUTBOX_INLINE is set. DB side effects (deleting the
+local user; the employee's department and transfer log, through
+core.signals) and audit records are written only once AD has accepted the
+change, so the DB never gets ahead of the directory.
+
+Delivery rules:
+  * one operation per idempotency key (a re-submitted form is a no-op)
+  * per target, operations are applied strictly in the order they were queued
+  * transient failures (AD unreachable or busy) are retried with exponential
+    backoff, up to DIRECTORY_OUTBOX_MAX_ATTEMPTS
+  * at most DIRECTORY_OUTBOX_WORKERS operations run concurrently
+"""
+import json
+import logging
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.models import ADDITION, CHANGE, DELETION
+from django.db import connections, transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from ADIWA.ad_conn import ADConnection
+from . import audit
+from .crypto import InvalidToken, decrypt, encrypt
+from .groups import invalidate_memberships
+from .models import DirectoryOperation, User
+from .signals import ou_transfer_finished, users_deleted
+from .utils import service_credentials
+from .vault import get_vault
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ('queued', 'running')
+
+# A 'running' row whose worker died is picked up again after this long.
+LEASE_TIMEOUT = timedelta(minutes=5)
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 15 * 60
+
+# LDAP result descriptions worth retrying; anything else fails permanently.
+TRANSIENT_RESULTS = ('busy', 'unavailable', 'timeLimitExceeded', 'adminLimitExceeded')
+
+# Permission the requester must still hold for the write to run as the service account.
+OPERATION_PERMISSIONS = {
+    'create_user': 'core.add_user',
+    'change_password': 'core.change_user',
+    'delete_user': 'core.delete_user',
+    'update_group': 'core.change_ad_group_membership',
+    'update_ou': 'employee.change_employee',
+}
+
+
+class TransientError(Exception):
+    """AD could not be reached or was busy; the operation will be retried."""
+
+
+# ---------------------------------------------------------------------------
+# Producer side
+# ---------------------------------------------------------------------------
+
+def enqueue(operation, target, *, payload=None, secret=None, requested_by=None,
+            idempotency_key=None):
+    """
+    Record a directory write and return ``(operation, created)``.
+
+    ``secret`` (e.g. {'password': ...}) is stored encrypted and wiped once the
+    operation finishes. A repeated ``idempotency_key`` returns the existing
+    row without queuing the write again.
+    """
+    op, created = DirectoryOperation.objects.get_or_create(
+        idempotency_key=idempotency_key or uuid.uuid4().hex,
+        defaults={
+            'operation': operation,
+            'target': target.split('@')[0].strip().lower(),
+            'payload': payload or {},
+            'secret': encrypt(json.dumps(secret)) if secret else '',
+            'requested_by': requested_by,
+        },
+    )
+    if created and settings.DIRECTORY_OUTBOX_INLINE:
+        transaction.on_commit(lambda: process_in_background([op.target]))
+    return op, created
+
+
+def process_in_background(targets):
+    """Apply the due operations of ``targets`` from a daemon thread."""
+    def run():
+        try:
+            process_outbox(targets=targets)
+        except Exception as exc:
+            logger.error(f"Inline outbox processing for {targets} failed: {exc}", exc_info=True)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, name='directory-outbox', daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def process_outbox(max_workers=None, limit=100, targets=None):
+    """
+    Apply due operations and return how many were attempted.
+
+    Only the oldest unfinished operation of each target is eligible, so
+    writes to one account never overtake each other.
+    """
+    now = timezone.now()
+    due = DirectoryOperation.objects.filter(
+        Q(status='queued', next_attempt_at__lte=now)
+        | Q(status='running', locked_at__lt=now - LEASE_TIMEOUT)
+    )
+    if targets:
+        due = due.filter(target__in=targets)
+
+    candidates = list(due.order_by('id')[:limit])
+    if not candidates:
+        return 0
+
+    heads = dict(
+        DirectoryOperation.objects
+        .filter(target__in={op.target for op in candidates}, status__in=PENDING_STATUSES)
+        .values('target')
+        .annotate(first_id=Min('id'))
+        .values_list('target', 'first_id')
+    )
+    claimed = [op for op in candidates if heads.get(op.target) == op.pk and _claim(op, now)]
+    if not claimed:
+        return 0
+
+    workers = min(max_workers or settings.DIRECTORY_OUTBOX_WORKERS, len(claimed))
+    if workers <= 1:
+        for op in claimed:
+            _run(op)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='directory-outbox') as pool:
+            list(pool.map(_run_in_thread, claimed))
+
+    return len(claimed)
+
+
+def _claim(op, now):
+    """Mark ``op`` running unless another worker got to it first."""
+    claimed = DirectoryOperation.objects.filter(
+        pk=op.pk, status=op.status, attempts=op.attempts,
+    ).update(status='running', locked_at=now, attempts=F('attempts') + 1)
+    if claimed:
+        op.status, op.locked_at, op.attempts = 'running', now, op.attempts + 1
+    return bool(claimed)
+
+
+def _run_in_thread(op):
+    try:
+        _run(op)
+    finally:
+        connections.close_all()
+
+
+def _run(op):
+    credentials = None
+    try:
+        secret = json.loads(decrypt(op.secret)) if op.secret else {}
+        credentials = _credentials(op)
+        if not credentials:
+            raise TransientError("No AD credentials available. Configure AD_SERVICE_USERNAME or re-login.")
+
+        ad = _connection(*credentials)
+        success, message, details = HANDLERS[op.operation](ad, op, secret)
+        if not success and message.startswith(TRANSIENT_RESULTS):
+            raise TransientError(message)
+    except InvalidToken:
+        _finish(op, False, "Stored secret could not be decrypted (SECRET_KEY changed?)", {})
+    except Exception as exc:
+        if credentials and not isinstance(exc, TransientError):
+            _drop_connection(credentials[0])
+        _retry_or_fail(op, str(exc))
+    else:
+        _finish(op, success, message, details)
+
+
+def _retry_or_fail(op, error):
+    if op.attempts >= settings.DIRECTORY_OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"Directory operation {op.pk} gave up after {op.attempts} attempts: {error}")
+        _finish(op, False, error, {})
+        return
+
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (op.attempts - 1), BACKOFF_MAX_SECONDS)
+    delay *= random.uniform(0.5, 1.0)
+    op.status = 'queued'
+    op.locked_at = None
+    op.last_error = error
+    op.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    op.save(update_fields=['status', 'locked_at', 'last_error', 'next_attempt_at'])
+    logger.warning(f"Directory operation {op.pk} failed (attempt {op.attempts}), retrying in {delay:.0f}s: {error}")
+
+
+def _finish(op, success, message, details):
+    with transaction.atomic():
+        op.status = 'applied' if success else 'failed'
+        op.result_message = message
+        op.last_error = None if success else message
+        op.applied_at = timezone.now() if success else None
+        op.locked_at = None
+        op.secret = ''
+        op.save(update_fields=['status', 'result_message', 'last_error', 'applied_at', 'locked_at', 'secret'])
+
+        if op.operation == 'update_ou':
+            # The employee app updates the department and writes the OUTransferLog
+            ou_transfer_finished.send(
+                sender=DirectoryOperation, operation=op, success=success, message=message, details=details,
+            )
+        elif op.operation == 'update_group':
+            # Even a failed batch may have changed some members
+            invalidate_memberships(op.payload['group_dn'])
+            if success:
+                _apply_local_changes(op)
+        elif success:
+            _apply_local_changes(op)
+
+    logger.info(f"Directory operation {op.pk} {op.operation} {op.target}: {op.status} ({message})")
+
+
+# ---------------------------------------------------------------------------
+# AD connections
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+
+def _credentials(op):
+    """
+    The service account if configured and the requester (still) holds the
+    operation's permission, else the requesting admin's stored login.
+    """
+    service = service_credentials(op.requested_by, OPERATION_PERMISSIONS[op.operation])
+    if service:
+        return service
+
+    creds = get_vault().get(op.requested_by_id, touch=False) if op.requested_by_id else None
+    if creds and creds.get('username') and creds.get('password'):
+        return creds['username'], creds['password']
+    return None
+
+
+def _connection(username, password):
+    """One bound connection per worker thread and account, reused across operations."""
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        pool = _local.connections = {}
+
+    ad = pool.get(username)
+    if ad is None or not ad.conn or not ad.conn.bound:
+        ad = ADConnection(
+            server_host=settings.SERVER_HOST,
+            domain=settings.DOMAIN,
+            base_dn=settings.BASE_DN,
+            base_container=settings.CONTAINER_DN_BASE,
+            probe=False,
+        )
+        if not ad.connect_ad(username, password):
+            raise TransientError(f"Failed to connect to AD as {username}.")
+        pool[username] = ad
+    return ad
+
+
+def _drop_connection(username):
+    getattr(_local, 'connections', {}).pop(username, None)
+
+
+# ---------------------------------------------------------------------------
+# Operation handlers: (ad, op, secret) -> (success, message, details)
+# ---------------------------------------------------------------------------
+
+def _create_user(ad, op, secret):
+    payload = op.payload
+    success, message = ad.create_user(
+        username=op.target,
+        password=secret.get('password'),
+        given_name=payload['given_name'],
+        surname=payload['surname'],
+        mail=payload.get('mail'),
+        telephone=payload.get('telephone'),
+        ou=payload.get('ou'),
+    )
+    # A retry after a lost response finds the account the first attempt made.
+    if not success and op.attempts > 1 and message.startswith('entryAlreadyExists'):
+        return True, f"User '{op.target}' already exists in AD.", {}
+    return success, message, {}
+
+
+def _change_password(ad, op, secret):
+    success, message = ad.change_password(op.target, secret.get('password'))
+    return success, message, {}
+
+
+def _update_ou(ad, op, secret):
+    old_dn = ad.search_users_dn([op.target]).get(op.target)
+    if not old_dn:
+        return False, f"User '{op.target}' not found in Active Directory.", {}
+
+    success, message, new_dn = ad.move_dn(old_dn, op.payload['new_ou'])
+    return success, message, {'old_dn': old_dn, 'new_dn': new_dn}
+
+
+def _delete_user(ad, op, secret):
+    success, message = ad.delete_user(op.target)
+    if not success and op.attempts > 1 and 'not found' in message:
+        return True, f"User '{op.target}' already deleted from AD.", {}
+    return success, message, {}
+
+
+def _update_group(ad, op, secret):
+    payload = op.payload
+    failures = {}
+    if payload.get('add'):
+        failures.update(ad.add_group_members(payload['group_dn'], payload['add']))
+    if payload.get('remove'):
+        failures.update(ad.remove_group_members(payload['group_dn'], payload['remove']))
+
+    # Re-running the whole change is safe (permissive modify), so retry if AD was just busy.
+    if failures and all(message.startswith(TRANSIENT_RESULTS) for message in failures.values()):
+        return False, next(iter(failures.values())), {}
+    if failures:
+        listed = '; '.join(f"{dn}: {message}" for dn, message in list(failures.items())[:5])
+        return False, f"{len(failures)} member change(s) failed: {listed}", {}
+
+    changed = len(payload.get('add', [])) + len(payload.get('remove', []))
+    return True, f"Updated {changed} member(s) of group '{payload['group_name']}'.", {}
+
+
+HANDLERS = {
+    'create_user': _create_user,
+    'change_password': _change_password,
+    'update_ou': _update_ou,
+    'delete_user': _delete_user,
+    'update_group': _update_group,
+}
+
+
+# ---------------------------------------------------------------------------
+# DB side effects once AD has the change
+# ---------------------------------------------------------------------------
+
+ACTION_FLAGS = {
+    'create_user': ADDITION,
+    'change_password': CHANGE,
+    'delete_user': DELETION,
+    'update_group': CHANGE,
+}
+
+
+def _apply_local_changes(op):
+    object_id = op.payload.get('object_id')
+
+    if op.operation == 'delete_user' and object_id:
+        users_deleted.send(sender=User, user_ids=[object_id])
+        User.objects.filter(pk=object_id).delete()
+
+    if op.requested_by_id:
+        audit.record_action(
+            user_id=op.requested_by_id,
+            model=User,
+            object_id=object_id,
+            object_repr=op.target,
+            action_flag=ACTION_FLAGS[op.operation],
+            change_message=op.result_message,
+        )
@@ -0,0 +1,185 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def _keyset_condition(ordering, values):
+    """
+    Build the Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    For ordering ('-timestamp', '-pk') and values (ts, 42) this is
+    ``timestamp < ts OR (timestamp = ts AND pk < 42)``.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def keyset_iterator(queryset, ordering=('-pk',), batch_size=1000):
+    """
+    Yield every row of ``queryset`` in ``ordering``, one batch at a time.
+
+    Each batch starts where the previous one ended (WHERE on the ordering
+    columns) instead of using OFFSET, so the walk stays on the index and
+    late pages cost the same as early ones. ``ordering`` must be unique,
+    so end it with 'pk' or '-pk'.
+    """
+    ordering = tuple(ordering)
+    names = [field.lstrip('-') for field in ordering]
+    queryset = queryset.order_by(*ordering)
+
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            batch = batch.filter(_keyset_condition(ordering, last))
+        rows = list(batch[:batch_size])
+        if not rows:
+            return
+
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        last = tuple(getattr(rows[-1], name) for name in names)
+
+
+def encode_cursor(values):
+    """Encode ordering values as an opaque, URL-safe cursor."""
+    data = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """Decode a cursor back into typed ordering values, or None if it is invalid."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if len(raw) != len(ordering):
+            return None
+        values = []
+        for field, value in zip(ordering, raw):
+            name = field.lstrip('-')
+            model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            values.append(model_field.to_python(value))
+        return tuple(values)
+    except (ValueError, TypeError, LookupError, ValidationError):
+        return None
+
+
+class KeysetPage:
+    """
+    One page of a queryset, addressed by cursor instead of page number.
+
+    Fetches ``per_page + 1`` rows to know whether another page follows, so no
+    COUNT(*) is ever issued. ``after`` moves forward from a cursor, ``before``
+    moves back; with neither, the first page is returned.
+    """
+
+    def __init__(self, queryset, ordering=('-pk',), per_page=20, after=None, before=None):
+        self.ordering = tuple(ordering)
+        self._names = [field.lstrip('-') for field in self.ordering]
+        model = queryset.model
+
+        after_values = decode_cursor(model, self.ordering, after) if after else None
+        before_values = decode_cursor(model, self.ordering, before) if before else None
+
+        if before_values is not None:
+            reverse = tuple(f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering)
+            rows = list(
+                queryset.filter(_keyset_condition(reverse, before_values))
+                .order_by(*reverse)[:per_page + 1]
+            )
+            self.has_previous = len(rows) > per_page
+            self.object_list = list(reversed(rows[:per_page]))
+            self.has_next = True
+        else:
+            if after_values is not None:
+                queryset = queryset.filter(_keyset_condition(self.ordering, after_values))
+            rows = list(queryset.order_by(*self.ordering)[:per_page + 1])
+            self.has_next = len(rows) > per_page
+            self.object_list = rows[:per_page]
+            self.has_previous = after_values is not None
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, name) for name in self._names])
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self.has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self.has_previous and self.object_list else None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+# Below this many rows an exact COUNT(*) is cheap and preferred.
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """
+    Approximate row count of an unfiltered queryset from table statistics.
+
+    Reads sys.dm_db_partition_stats on SQL Server (pg_class on PostgreSQL),
+    which is O(1) instead of a full scan. Returns None for filtered querysets
+    or backends without statistics.
+    """
+    if queryset.query.has_filters() or queryset.query.distinct or queryset.query.is_sliced:
+        return None
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'microsoft':
+            cursor.execute(
+                "SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                "WHERE object_id = OBJECT_ID(%s) AND index_id IN (0, 1)",
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count comes from table statistics for large unfiltered
+    querysets; filtered or small querysets still get an exact COUNT(*).
+    """
+
+    is_estimate = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        self.is_estimate = estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD
+        return estimate if self.is_estimate else super().count
@@ -0,0 +1,274 @@
+"""
+Bulk creation of AD accounts from a new-hire spreadsheet (CSV).
+
+``parse_provisioning_csv()`` validates every row before anything is written.
+``provision_users()`` checks all usernames against AD in one batched search,
+creates the missing accounts concurrently over an ADConnectionPool (add +
+password per account), and can create the linked User/Employee rows with a
+handful of bulk queries. Both the admin page and the ``provision_ad_users``
+command report one result per row.
+"""
+import csv
+import io
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.contrib.admin.models import ADDITION
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from ADIWA.ad_conn import ADConnectionPool
+from employee.models import Department, Employee, Job
+from . import audit
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+PROVISION_MAX_ROWS = 2000
+
+REQUIRED_COLUMNS = ('username', 'password', 'given_name', 'surname')
+OPTIONAL_COLUMNS = ('email', 'telephone', 'ou', 'full_name_ar', 'nid', 'hire_date', 'job_title')
+
+# sAMAccountName is limited to 20 characters
+USERNAME_RE = re.compile(r'^[a-z0-9][a-z0-9._-]{0,19}$')
+NID_RE = re.compile(r'^[0-9]{14}$')
+
+# Message ADConnection.create_user returns when the add worked but unicodePwd did not
+PASSWORD_NOT_SET = 'password set failed'
+
+
+def connection_pool(username, password, size=None):
+    return ADConnectionPool(
+        server_host=settings.SERVER_HOST,
+        domain=settings.DOMAIN,
+        base_dn=settings.BASE_DN,
+        base_container=settings.CONTAINER_DN_BASE,
+        username=username,
+        password=password,
+        size=size or settings.AD_PROVISION_WORKERS,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+def parse_provisioning_csv(text):
+    """
+    Return ``(rows, rejected)`` for the CSV ``text``.
+
+    ``rows`` are the valid rows (dicts keyed by column, plus ``line`` and the
+    resolved ``department``); ``rejected`` holds one 'invalid' result per bad
+    row. Raises ValueError when the file as a whole is unusable.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    headers = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers]
+    if missing:
+        raise ValueError(f"The CSV header is missing: {', '.join(missing)}.")
+
+    columns = [column for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if column in headers]
+    departments = {dept.name.lower(): dept for dept in Department.objects.all()}
+
+    rows, rejected, seen = [], [], set()
+    for line, raw in enumerate(reader, start=2):
+        row = {column: (raw.get(headers[column]) or '').strip() for column in columns}
+        if not any(row.values()):
+            continue
+        row['line'] = line
+        row['username'] = row['username'].split('@')[0].lower()
+
+        error = _validate_row(row, departments, seen)
+        seen.add(row['username'])
+        if error:
+            rejected.append(row_result(row, 'invalid', error))
+        else:
+            rows.append(row)
+
+    if len(rows) + len(rejected) > PROVISION_MAX_ROWS:
+        raise ValueError(f"At most {PROVISION_MAX_ROWS} users can be created at once.")
+    if not rows and not rejected:
+        raise ValueError("The CSV file contains no rows.")
+
+    # National IDs are unique; check the whole file against the DB in one query
+    nids = {row['nid'] for row in rows if row.get('nid')}
+    taken = set(Employee.objects.filter(nid__in=nids).values_list('nid', flat=True)) if nids else set()
+    if taken:
+        rejected += [row_result(row, 'invalid', f"National ID {row['nid']} already exists")
+                     for row in rows if row.get('nid') in taken]
+        rows = [row for row in rows if row.get('nid') not in taken]
+
+    rejected.sort(key=lambda result: result['line'])
+    return rows, rejected
+
+
+def _validate_row(row, departments, seen):
+    username = row['username']
+    if not USERNAME_RE.match(username):
+        return "Invalid username (letters, digits, '.', '_', '-'; at most 20 characters)"
+    if username in seen:
+        return "Duplicate username in file"
+    if len(row['password']) < 8:
+        return "Password must be at least 8 characters"
+    if not row['given_name'] or not row['surname']:
+        return "given_name and surname are required"
+
+    if row.get('email'):
+        try:
+            validate_email(row['email'])
+        except ValidationError:
+            return f"Invalid email '{row['email']}'"
+
+    if row.get('ou'):
+        department = departments.get(row['ou'].lower())
+        if not department:
+            return f"Unknown OU '{row['ou']}'"
+        row['ou'] = department.name
+        row['department'] = department
+
+    if row.get('nid') and not NID_RE.match(row['nid']):
+        return "National ID must be exactly 14 digits"
+
+    if row.get('hire_date'):
+        try:
+            row['hire_date'] = date.fromisoformat(row['hire_date'])
+        except ValueError:
+            return f"Invalid hire_date '{row['hire_date']}' (expected YYYY-MM-DD)"
+
+    return None
+
+
+def row_result(row, status, message):
+    return {
+        'line': row['line'],
+        'username': row['username'],
+        'display_name': f"{row.get('given_name', '')} {row.get('surname', '')}".strip(),
+        'ou': row.get('ou') or None,
+        'status': status,
+        'message': message,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Provisioning
+# ---------------------------------------------------------------------------
+
+def provision_users(rows, pool, *, create_employees=False, requested_by=None):
+    """
+    Create the AD accounts for validated ``rows`` and return one result per row.
+
+    Accounts that already exist are reported as 'exists' and left alone.
+    Statuses: created, partial (created without a password), exists, failed.
+    """
+    if not rows:
+        return []
+
+    with pool.connection() as ad:
+        existing = ad.search_users_dn([row['username'] for row in rows])
+
+    results = {}
+    to_create = []
+    for row in rows:
+        if row['username'] in existing:
+            results[row['line']] = row_result(row, 'exists', "Account already exists in AD")
+        else:
+            to_create.append(row)
+
+    if to_create:
+        workers = min(pool.size, len(to_create))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ad-provision') as executor:
+            outcomes = list(executor.map(lambda row: _create_account(pool, row), to_create))
+
+        for row, (success, message) in zip(to_create, outcomes):
+            if not success:
+                status = 'failed'
+            elif PASSWORD_NOT_SET in message:
+                status = 'partial'
+            else:
+                status = 'created'
+            results[row['line']] = row_result(row, status, message)
+
+    created = [row for row in to_create if results[row['line']]['status'] != 'failed']
+    users = _create_local_records(created, results) if create_employees and created else {}
+
+    if requested_by is not None:
+        for row in created:
+            user = users.get(row['username'])
+            audit.record_action(
+                user_id=requested_by.pk,
+                model=User,
+                object_id=user.pk if user else None,
+                object_repr=row['username'],
+                action_flag=ADDITION,
+                change_message=f"Bulk-created AD user '{row['username']}'",
+            )
+
+    logger.info(
+        f"Bulk provisioning: {len(rows)} rows, {len(created)} created, {len(existing)} already in AD"
+    )
+    return [results[row['line']] for row in rows]
+
+
+def _create_account(pool, row):
+    try:
+        with pool.connection() as ad:
+            return ad.create_user(
+                username=row['username'],
+                password=row['password'],
+                given_name=row['given_name'],
+                surname=row['surname'],
+                mail=row.get('email') or f"{row['username']}@{settings.DOMAIN}",
+                telephone=row.get('telephone') or None,
+                ou=row.get('ou') or None,
+            )
+    except Exception as exc:
+        logger.error(f"Failed to create AD user {row['username']}: {exc}")
+        return False, str(exc)
+
+
+def _create_local_records(rows, results):
+    """Bulk-create the local User and Employee rows for newly created accounts."""
+    usernames = {f"{row['username']}@{settings.DOMAIN}": row for row in rows}
+
+    with transaction.atomic():
+        new_users = [User(username=username, is_active=True, is_staff=False) for username in usernames]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        users = {
+            user.username.split('@')[0]: user
+            for user in User.objects.filter(username__in=usernames)
+        }
+
+        titles = {row['job_title'] for row in rows if row.get('job_title')}
+        jobs = {job.title: job for job in Job.objects.filter(title__in=titles)}
+        new_jobs = [Job(title=title) for title in titles if title not in jobs]
+        if new_jobs:
+            Job.objects.bulk_create(new_jobs)
+            jobs = {job.title: job for job in Job.objects.filter(title__in=titles)}
+
+        linked = set(Employee.objects.filter(user__in=users.values()).values_list('user_id', flat=True))
+        employees = []
+        for row in rows:
+            user = users[row['username']]
+            if user.pk in linked:
+                results[row['line']]['message'] += " Employee record already existed."
+                continue
+            employee = Employee(
+                user=user,
+                full_name_en=f"{row['given_name']} {row['surname']}",
+                full_name_ar=row.get('full_name_ar') or None,
+                nid=row.get('nid') or None,
+                department=row.get('department'),
+                job_title=jobs.get(row.get('job_title')),
+            )
+            if row.get('hire_date'):
+                employee.hire_date = row['hire_date']
+            employees.append(employee)
+        Employee.objects.bulk_create(employees, batch_size=500)
+
+    return users
@@ -0,0 +1,14 @@
+"""
+Signals for the data other apps keep next to core's users, sent once Active
+Directory has accepted a change (the employee app connects to them).
+"""
+from django.dispatch import Signal
+
+# user_ids: local users of deleted AD accounts; sent just before they are
+# deleted, in the same transaction.
+users_deleted = Signal()
+
+# operation (the 'update_ou' DirectoryOperation), success, message, details
+# (old_dn / new_dn from AD); sent in the outbox transaction that finishes the
+# operation, whether the move succeeded or not.
+ou_transfer_finished = Signal()
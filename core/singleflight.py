@@ -0,0 +1,74 @@
+"""
+Collapse concurrent calls for the same key into one.
+
+The first caller for a key (the leader) runs the function. Callers that arrive
+with the same key while it is running wait for it and get the same result or
+exception. Nothing is remembered once the call finishes.
+
+SingleFlight coalesces threads; AsyncSingleFlight coalesces coroutines on
+one event loop.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return ``(result, shared)``; ``shared`` is True for callers that only waited."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Await ``fn()`` once per key; return ``(result, shared)`` like SingleFlight.do."""
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # retrieved, even if nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
@@ -1,9 +1,59 @@
 
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from unittest import mock
+
 import pytest
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.db.utils import IntegrityError
-from .models import User
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from cryptography.fernet import Fernet
+from ldap3 import MOCK_ASYNC, MOCK_SYNC, Connection, Server
+from ldap3.operation.extended import extended_operation
+from ADIWA.ad_conn import BIND_INVALID, BIND_UNAVAILABLE, ADConnection, TracedConnection, sid_to_str
+from ADIWA.ad_trace import tracer
+from ADIWA.ad_conn_async import AsyncADConnection
+from benchmarks.slow_dc import SlowDirectoryServer
+from employee.audit import audit_writer
+from employee.models import Department, Employee, OUTransferLog
+from employee.snapshot import DirectorySnapshot, write_snapshot
+from .ad_status import datetime_to_filetime, get_account_statuses, status_ldap_filter
+from .crypto import InvalidToken, decrypt, encrypt
+from .auth_backends import ActiveDirectoryBackend, credential_fingerprint
+from .authentication import ClaimsJWTAuthentication
+from .groups import get_user_groups, sync_user_groups
+from .jobs import STALE_JOB_TIMEOUT, run_job, start_job
+from .models import ADGroupMapping, BulkDirectoryJob, DirectoryOperation, LoginVerifier, StoredCredential, User
+from .outbox import enqueue, process_outbox
+from .pagination import KeysetPage, keyset_iterator
+from .provisioning import parse_provisioning_csv, provision_users
+from . import audit, health, metrics, verifier
+from .singleflight import SingleFlight
+from .tokens import ClaimsUser, revoke_tokens, tokens_for_user
+from .views import AsyncLoginView
+from .vault import FileVault, get_vault
 
 @pytest.mark.django_db
 class UserManagerTests(TestCase):
@@ -93,3 +143,1381 @@ class UserModeTests(TestCase):
         self.assertFalse(hasattr(User, 'last_name'))
         self.assertFalse(hasattr(User, 'email'))
 
+
+@pytest.mark.django_db
+class KeysetIteratorTests(TestCase):
+    def test_walks_every_row_once_in_order(self):
+        for i in range(7):
+            User.objects.create_user(username=f'user{i}', is_staff=i % 2 == 0)
+
+        expected = list(User.objects.order_by('-is_staff', 'pk').values_list('pk', flat=True))
+        with self.assertNumQueries(3):
+            walked = [u.pk for u in keyset_iterator(User.objects.all(), ordering=('-is_staff', 'pk'), batch_size=3)]
+        self.assertEqual(walked, expected)
+
+    def test_empty_queryset(self):
+        self.assertEqual(list(keyset_iterator(User.objects.none())), [])
+
+@pytest.mark.django_db
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(5)]
+
+    def test_forward_and_back(self):
+        with self.assertNumQueries(1):
+            first = KeysetPage(User.objects.all(), ordering=('-pk',), per_page=2)
+            self.assertEqual([u.username for u in first], ['user4', 'user3'])
+        self.assertTrue(first.has_next)
+        self.assertFalse(first.has_previous)
+
+        second = KeysetPage(User.objects.all(), ordering=('-pk',), per_page=2, after=first.next_cursor)
+        self.assertEqual([u.username for u in second], ['user2', 'user1'])
+        self.assertTrue(second.has_previous)
+
+        back = KeysetPage(User.objects.all(), ordering=('-pk',), per_page=2, before=second.previous_cursor)
+        self.assertEqual([u.username for u in back], ['user4', 'user3'])
+        self.assertFalse(back.has_previous)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = KeysetPage(User.objects.all(), ordering=('-pk',), per_page=2, after='not-a-cursor')
+        self.assertEqual([u.username for u in page], ['user4', 'user3'])
+
+
+@pytest.mark.django_db
+class CryptoTests(TestCase):
+    def test_round_trip(self):
+        token = encrypt('P@ssw0rd!')
+        self.assertNotIn('P@ssw0rd', token)
+        self.assertEqual(decrypt(token), 'P@ssw0rd!')
+
+    def test_tampered_token_is_rejected(self):
+        token = bytearray(encrypt('secret').encode('ascii'))
+        token[30] = ord('A') if token[30] != ord('A') else ord('B')
+        with self.assertRaises(InvalidToken):
+            decrypt(token.decode('ascii'))
+
+    def test_rotated_keys_still_decrypt_old_tokens(self):
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        with override_settings(CREDENTIAL_ENCRYPTION_KEYS=[old_key]):
+            token = encrypt('secret')
+        with override_settings(CREDENTIAL_ENCRYPTION_KEYS=[new_key, old_key]):
+            self.assertEqual(decrypt(token), 'secret')
+        with override_settings(CREDENTIAL_ENCRYPTION_KEYS=[new_key]), self.assertRaises(InvalidToken):
+            decrypt(token)
+
+
+class FakeAD:
+    """Stands in for ADConnection; records calls and returns scripted results."""
+
+    base_container = 'OU=New,DC=eissa,DC=local'
+
+    def __init__(self, results=None):
+        self.calls = []
+        self.results = results or {}
+
+    def _result(self, name, default):
+        self.calls.append(name)
+        return self.results.get(name, default)
+
+    def change_password(self, username, new_password):
+        return self._result('change_password', (True, f"Password for '{username}' changed successfully."))
+
+    def delete_user(self, username):
+        return self._result('delete_user', (True, f"User '{username}' deleted successfully from AD."))
+
+    def search_users_dn(self, usernames):
+        return {u: f'CN={u},OU=HR,{self.base_container}' for u in usernames}
+
+    def move_dn(self, dn, new_ou):
+        self.calls.append('move_dn')
+        return True, f"Moved to OU={new_ou}", dn.replace('OU=HR', f'OU={new_ou}')
+
+
+@pytest.mark.django_db
+@override_settings(DIRECTORY_OUTBOX_INLINE=False, AD_SERVICE_USERNAME='svc', AD_SERVICE_PASSWORD='svc-pass')
+class DirectoryOutboxTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.target = User.objects.create_user(username='jsmith')
+
+    def _process(self, ad):
+        with mock.patch('core.outbox._connection', return_value=ad):
+            return process_outbox(max_workers=1)
+
+    def test_idempotency_key_queues_once(self):
+        first, created = enqueue('change_password', 'jsmith', secret={'password': 'N3w!'},
+                                 requested_by=self.admin, idempotency_key='form-1')
+        again, created_again = enqueue('change_password', 'jsmith', secret={'password': 'N3w!'},
+                                       requested_by=self.admin, idempotency_key='form-1')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, again.pk)
+        self.assertNotIn('N3w!', first.secret)
+
+    def test_applied_operation_wipes_secret(self):
+        op, _ = enqueue('change_password', 'JSmith@eissa.local', secret={'password': 'N3w!'}, requested_by=self.admin)
+        self.assertEqual(self._process(FakeAD()), 1)
+
+        op.refresh_from_db()
+        self.assertEqual(op.target, 'jsmith')
+        self.assertEqual(op.status, 'applied')
+        self.assertEqual(op.secret, '')
+
+    def test_transient_failure_backs_off_and_blocks_later_writes(self):
+        first, _ = enqueue('change_password', 'jsmith', secret={'password': 'a'}, requested_by=self.admin)
+        second, _ = enqueue('delete_user', 'jsmith', payload={'object_id': self.target.pk}, requested_by=self.admin)
+        ad = FakeAD({'change_password': (False, 'busy: server busy')})
+
+        self._process(ad)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'queued')
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        self.assertEqual(second.status, 'queued')
+        self.assertEqual(ad.calls, ['change_password'])
+
+    def test_permanent_failure_is_not_retried(self):
+        op, _ = enqueue('change_password', 'jsmith', secret={'password': 'a'}, requested_by=self.admin)
+        self._process(FakeAD({'change_password': (False, 'constraintViolation: password policy')}))
+
+        op.refresh_from_db()
+        self.assertEqual(op.status, 'failed')
+        self.assertEqual(op.attempts, 1)
+        self.assertIn('constraintViolation', op.last_error)
+
+    def test_delete_removes_local_user_after_ad(self):
+        enqueue('delete_user', 'jsmith', payload={'object_id': self.target.pk}, requested_by=self.admin)
+        self.assertTrue(User.objects.filter(pk=self.target.pk).exists())
+
+        self._process(FakeAD())
+        self.assertFalse(User.objects.filter(pk=self.target.pk).exists())
+
+    def test_transfer_updates_department_and_writes_audit_log(self):
+        hr = Department.objects.create(name='HR Test')
+        it = Department.objects.create(name='IT Test')
+        employee = Employee.objects.create(user=self.target, department=hr)
+        enqueue('update_ou', 'jsmith', requested_by=self.admin, payload={
+            'new_ou': 'IT Test',
+            'transfer': {'update_db': True, 'employee_id': employee.pk, 'old_department_id': hr.pk, 'old_ou': 'HR'},
+        })
+
+        self._process(FakeAD())
+        employee.refresh_from_db()
+        self.assertEqual(employee.department, it)
+        log = OUTransferLog.objects.get()
+        self.assertEqual(log.status, 'success')
+        self.assertTrue(log.database_updated)
+        self.assertEqual(log.new_dn, 'CN=jsmith,OU=IT Test,OU=New,DC=eissa,DC=local')
+
+    def test_profile_shows_the_new_ou_right_after_a_transfer(self):
+        Employee.objects.create(user=self.target)
+        token = tokens_for_user(self.target).access_token
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                override_settings(DIRECTORY_SNAPSHOT_PATH=os.path.join(tmpdir, 'directory.snap')):
+            write_snapshot([
+                {'sam': 'jsmith', 'display_name': 'J Smith', 'dn': 'CN=jsmith,OU=HR,OU=New,DC=eissa,DC=local', 'ou': 'HR'},
+                {'sam': 'other', 'dn': 'CN=other,OU=HR,OU=New,DC=eissa,DC=local', 'ou': 'HR'},
+            ])
+            built_at = DirectorySnapshot(settings.DIRECTORY_SNAPSHOT_PATH).built_at
+            self.assertEqual(self.client.get(reverse('employee_profile'), HTTP_AUTHORIZATION=f'JWT {token}').json()['ou'], 'HR')
+
+            enqueue('update_ou', 'jsmith', requested_by=self.admin, payload={'new_ou': 'IT', 'transfer': {}})
+            self._process(FakeAD())
+
+            profile = self.client.get(reverse('employee_profile'), HTTP_AUTHORIZATION=f'JWT {token}').json()
+            self.assertEqual(profile['ou'], 'IT')
+            self.assertEqual(profile['distinguished_name'], 'CN=jsmith,OU=IT,OU=New,DC=eissa,DC=local')
+            snapshot = DirectorySnapshot(settings.DIRECTORY_SNAPSHOT_PATH)
+            self.assertEqual(snapshot.get_by_sam('other')['ou'], 'HR')
+            self.assertEqual(snapshot.built_at, built_at)
+
+    def test_service_account_is_only_used_for_requesters_with_the_permission(self):
+        staff = User.objects.create_user(username='helpdesk', is_staff=True)
+        op, _ = enqueue('delete_user', 'jsmith', payload={'object_id': self.target.pk}, requested_by=staff)
+        ad = FakeAD()
+        with mock.patch('core.outbox._connection', return_value=ad) as connection:
+            process_outbox(max_workers=1)
+        connection.assert_not_called()
+        op.refresh_from_db()
+        self.assertEqual(op.status, 'queued')
+        self.assertIn('No AD credentials', op.last_error)
+
+        staff.user_permissions.add(Permission.objects.get(codename='delete_user'))
+        DirectoryOperation.objects.filter(pk=op.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('core.outbox._connection', return_value=ad) as connection:
+            process_outbox(max_workers=1)
+        connection.assert_called_once_with('svc', 'svc-pass')
+
+    def test_transfer_log_is_written_with_the_operation_under_write_behind(self):
+        enqueue('update_ou', 'jsmith', requested_by=self.admin, payload={'new_ou': 'IT', 'transfer': {}})
+
+        with mock.patch.multiple(audit_writer, write_behind=True, _ensure_thread=lambda: None):
+            self._process(FakeAD())
+            self.assertEqual(audit_writer.metrics()['queue_depth'], 0)
+
+        self.assertEqual(OUTransferLog.objects.get().status, 'success')
+
+
+@pytest.mark.django_db
+class UserChangelistTests(TestCase):
+    def test_query_count_is_constant_across_pages(self):
+        admin_user = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(admin_user)
+        url = reverse('admin:core_user_changelist')
+
+        User.objects.bulk_create([User(username=f'user{i:03d}') for i in range(5)])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        User.objects.bulk_create([User(username=f'user{i:03d}') for i in range(5, 250)])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+        cl = response.context['cl']
+        self.assertEqual(cl.result_list[0].username, 'admin')
+        response = self.client.get(url + cl.keyset_next_url)
+        self.assertEqual(response.context['cl'].result_list[0].username, 'user099')
+        self.assertContains(response, '&lsaquo; Previous')
+
+
+class FakeStatusAD:
+    def __init__(self, raw):
+        self.raw = raw
+        self.searches = []
+
+    def get_users_status(self, usernames):
+        self.searches.append(sorted(usernames))
+        return {name: self.raw[name] for name in usernames if name in self.raw}
+
+    def get_password_policy(self):
+        # 42 days, 30 minutes (negative 100ns intervals, as stored in AD)
+        return {'maxPwdAge': -42 * 864000000000, 'lockoutDuration': -30 * 600000000}
+
+
+@pytest.mark.django_db
+class ADStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        recent = datetime_to_filetime(self.now - timedelta(days=1))
+        self.ad = FakeStatusAD({
+            'active': {'userAccountControl': 512, 'lockoutTime': 0, 'pwdLastSet': recent, 'lastLogonTimestamp': recent},
+            'disabled': {'userAccountControl': 514, 'lockoutTime': 0, 'pwdLastSet': recent, 'lastLogonTimestamp': 0},
+            'locked': {'userAccountControl': 512, 'lockoutTime': datetime_to_filetime(self.now - timedelta(minutes=5)),
+                       'pwdLastSet': datetime_to_filetime(self.now - timedelta(days=60)), 'lastLogonTimestamp': 0},
+        })
+
+    def test_decode_flags(self):
+        statuses = get_account_statuses(['active', 'Disabled@eissa.local', 'locked', 'ghost'], lambda: self.ad)
+        self.assertTrue(statuses['active']['enabled'])
+        self.assertFalse(statuses['active']['password_expired'])
+        self.assertFalse(statuses['disabled']['enabled'])
+        self.assertTrue(statuses['locked']['locked'])
+        self.assertTrue(statuses['locked']['password_expired'])
+        self.assertFalse(statuses['ghost']['found'])
+
+    def test_page_is_fetched_in_one_search_then_cached(self):
+        get_account_statuses(['active', 'disabled'], lambda: self.ad)
+        get_account_statuses(['active', 'disabled', 'locked'], lambda: self.ad)
+        self.assertEqual(self.ad.searches, [['active', 'disabled'], ['locked']])
+
+    def test_status_ldap_filters(self):
+        policy = {'max_password_age': None, 'lockout_duration': None}
+        self.assertEqual(status_ldap_filter('disabled', policy), '(userAccountControl:1.2.840.113556.1.4.803:=2)')
+        self.assertEqual(status_ldap_filter('locked', policy), '(lockoutTime>=1)')
+
+    def test_changelist_shows_status_columns(self):
+        admin_user = User.objects.create_superuser(username='admin', password='password123')
+        User.objects.create_user(username='disabled@eissa.local')
+        self.client.force_login(admin_user)
+        get_vault().store(admin_user.pk, 'admin', 'x')
+
+        with mock.patch('core.admin._connect_ad', return_value=self.ad):
+            response = self.client.get(reverse('admin:core_user_changelist'))
+
+        self.assertEqual(len(self.ad.searches), 1)
+        users = {u.username: u for u in response.context['cl'].result_list}
+        self.assertFalse(users['disabled@eissa.local'].ad_status['enabled'])
+        self.assertContains(response, 'AD Enabled')
+
+
+class FakeProvisionAD:
+    def __init__(self, existing=(), password_fails=()):
+        self.existing = set(existing)
+        self.password_fails = set(password_fails)
+        self.searches = []
+        self.created = []
+
+    def search_users_dn(self, usernames):
+        self.searches.append(sorted(usernames))
+        return {u: f'CN={u},OU=New,DC=eissa,DC=local' for u in usernames if u in self.existing}
+
+    def create_user(self, username, password, given_name, surname, mail=None, telephone=None, ou=None):
+        self.created.append((username, ou))
+        if username in self.password_fails:
+            return True, "User created but password set failed: constraintViolation. Set password manually."
+        return True, f"User '{username}' created successfully in AD."
+
+
+class FakePool:
+    size = 4
+
+    def __init__(self, ad):
+        self.ad = ad
+
+    @contextmanager
+    def connection(self):
+        yield self.ad
+
+
+@pytest.mark.django_db
+class ProvisioningTests(TestCase):
+    HEADER = 'username,password,given_name,surname,ou,nid,job_title\n'
+
+    def setUp(self):
+        self.hr = Department.objects.create(name='HR')
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+
+    def test_invalid_rows_are_rejected_per_line(self):
+        rows, rejected = parse_provisioning_csv(
+            self.HEADER
+            + 'new.one,Passw0rd!,New,One,hr,12345678901234,Clerk\n'
+            + 'Bad Name,Passw0rd!,Bad,Name,,,\n'
+            + 'short.pw,abc,Short,Pw,,,\n'
+            + 'no.ou,Passw0rd!,No,Ou,Finance,,\n'
+            + 'new.one,Passw0rd!,Dup,Row,,,\n'
+        )
+        self.assertEqual([row['username'] for row in rows], ['new.one'])
+        self.assertEqual(rows[0]['department'], self.hr)
+        self.assertEqual([(r['line'], r['status']) for r in rejected],
+                         [(3, 'invalid'), (4, 'invalid'), (5, 'invalid'), (6, 'invalid')])
+
+    def test_missing_required_column(self):
+        with self.assertRaises(ValueError):
+            parse_provisioning_csv('username,given_name,surname\nx,y,z\n')
+
+    def test_existing_accounts_skipped_and_employees_created(self):
+        rows, _ = parse_provisioning_csv(
+            self.HEADER
+            + 'new.one,Passw0rd!,New,One,HR,12345678901234,Clerk\n'
+            + 'new.two,Passw0rd!,New,Two,,,Clerk\n'
+            + 'old.hand,Passw0rd!,Old,Hand,,,\n'
+        )
+        ad = FakeProvisionAD(existing={'old.hand'}, password_fails={'new.two'})
+
+        results = provision_users(rows, FakePool(ad), create_employees=True, requested_by=self.admin)
+
+        self.assertEqual(ad.searches, [['new.one', 'new.two', 'old.hand']])
+        self.assertEqual(sorted(name for name, _ in ad.created), ['new.one', 'new.two'])
+        self.assertEqual([r['status'] for r in results], ['created', 'partial', 'exists'])
+
+        employee = Employee.objects.select_related('user', 'job_title').get(nid='12345678901234')
+        self.assertEqual(employee.user.username, 'new.one@eissa.local')
+        self.assertEqual(employee.department, self.hr)
+        self.assertEqual(employee.job_title.title, 'Clerk')
+        self.assertEqual(Employee.objects.filter(job_title=employee.job_title).count(), 2)
+        self.assertFalse(User.objects.filter(username='old.hand@eissa.local').exists())
+
+
+class FakeLifecycleAD:
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.searches = []
+        self.calls = []
+
+    def search_users_uac(self, usernames):
+        self.searches.append(sorted(usernames))
+        return {u: (f'CN={u},OU=New,DC=eissa,DC=local', self.accounts[u]) for u in usernames if u in self.accounts}
+
+    def set_passwords_dn(self, items, must_change=False):
+        self.calls.extend(('password', dn, must_change) for dn, _ in items)
+        return [(True, "Password set.")] * len(items)
+
+    def disable_dns(self, items):
+        self.calls.extend(('disable', dn, uac) for dn, uac in items)
+        return [(True, "Account disabled.")] * len(items)
+
+    def delete_dns(self, dns):
+        self.calls.extend(('delete', dn) for dn in dns)
+        return [(True, "Account deleted.")] * len(dns)
+
+
+class PipelinedWriteTests(TestCase):
+    """ADConnection's pipelined batch writes against ldap3's MOCK_ASYNC strategy."""
+
+    def setUp(self):
+        self.ad = ADConnection('fake', 'eissa.local', 'DC=eissa,DC=local', 'OU=New,DC=eissa,DC=local', probe=False)
+        self.ad.conn = mock.Mock(bound=True)
+        pipeline = Connection(Server('fake'), user='CN=admin,DC=eissa,DC=local', password='x', client_strategy=MOCK_ASYNC)
+        pipeline.strategy.add_entry('CN=admin,DC=eissa,DC=local', {'userPassword': 'x', 'sn': 'admin'})
+        for name in ('ann', 'bob', 'cat'):
+            pipeline.strategy.add_entry(f'CN={name},OU=HR,OU=New,DC=eissa,DC=local', {
+                'sn': name, 'userAccountControl': '512', 'unicodePwd': 'old',
+            })
+        pipeline.bind()
+        self.ad._pipeline = pipeline
+
+    def dns(self, *names, ou='HR'):
+        return [f'CN={name},OU={ou},OU=New,DC=eissa,DC=local' for name in names]
+
+    def test_moves_keep_order_and_map_errors(self):
+        moves = [(dn, 'IT') for dn in self.dns('ann', 'ghost', 'bob')] + [(self.dns('cat', ou='IT')[0], 'IT')]
+        results = self.ad.move_dns(moves, window=2)
+
+        self.assertEqual(results[0], (True, 'Moved to OU=IT', self.dns('ann', ou='IT')[0]))
+        self.assertFalse(results[1][0])
+        self.assertIn('noSuchObject', results[1][1])
+        self.assertEqual(results[2], (True, 'Moved to OU=IT', self.dns('bob', ou='IT')[0]))
+        self.assertEqual(results[3], (True, 'Already in OU=IT', self.dns('cat', ou='IT')[0]))
+        self.assertIn(self.dns('bob', ou='IT')[0], self.ad._pipeline.strategy.entries)
+
+    def test_operations_are_traced(self):
+        tracer.reset()
+        self.ad.delete_dns(self.dns('cat', 'ghost'))
+        stats = {row['caller']: row for row in tracer.stats() if row['operation'] == 'delete'}
+        row = stats['core.tests.test_operations_are_traced']
+        self.assertEqual(row['count'], 2)
+        self.assertEqual(row['errors'], {'32 noSuchObject': 1})
+
+    def test_passwords_disable_and_delete(self):
+        self.assertEqual(
+            self.ad.set_passwords_dn([(dn, 'N3w!pass') for dn in self.dns('ann', 'bob')], must_change=True),
+            [(True, 'Password set.')] * 2,
+        )
+        self.assertEqual(
+            self.ad.disable_dns([(self.dns('ann')[0], 512), (self.dns('bob')[0], 514)]),
+            [(True, 'Account disabled.'), (True, 'Account already disabled.')],
+        )
+        results = self.ad.delete_dns(self.dns('cat', 'ghost'))
+        self.assertEqual(results[0], (True, 'Account deleted.'))
+        self.assertFalse(results[1][0])
+
+    def test_requires_a_bound_connection(self):
+        self.ad.conn = None
+        with self.assertRaises(Exception):
+            self.ad.delete_dns(self.dns('ann'))
+
+    def test_pipeline_binds_with_the_bound_connections_credentials(self):
+        self.ad._pipeline = None
+        self.ad.conn = mock.Mock(bound=True, user='admin@eissa.local', password='x')
+        with mock.patch('ADIWA.ad_conn.TracedConnection') as connection_class:
+            self.ad._pipeline_connection()
+        self.assertEqual(connection_class.call_args.kwargs['user'], 'admin@eissa.local')
+        self.assertEqual(connection_class.call_args.kwargs['password'], 'x')
+        self.assertFalse(hasattr(self.ad, '_password'))
+
+    def test_del_unbinds_without_logging(self):
+        conn = self.ad.conn
+        with self.assertNoLogs('ADIWA.ad_conn'):
+            self.ad.__del__()
+        conn.unbind.assert_called_once()
+        self.assertFalse(self.ad._pipeline.bound)
+
+
+class ADTracingTests(TestCase):
+    def setUp(self):
+        tracer.reset()
+        self.addCleanup(tracer.reset)
+        self.conn = TracedConnection(Server('fake'), user='CN=admin,DC=eissa,DC=local', password='x',
+                                     client_strategy=MOCK_SYNC)
+        self.conn.strategy.add_entry('CN=admin,DC=eissa,DC=local', {'userPassword': 'x', 'sn': 'admin'})
+        self.conn.strategy.add_entry('CN=ann,OU=New,DC=eissa,DC=local', {'sn': 'ann', 'sAMAccountName': 'ann'})
+        self.conn.bind()
+
+    def test_operations_are_timed_per_caller_with_sizes_and_errors(self):
+        self.conn.search('DC=eissa,DC=local', '(sAMAccountName=ann)')
+        self.conn.delete('CN=ghost,OU=New,DC=eissa,DC=local')
+
+        rows = {row['operation']: row for row in tracer.stats()}
+        self.assertEqual(set(rows), {'bind', 'search', 'delete'})
+        self.assertEqual(rows['search']['caller'], 'core.tests.test_operations_are_timed_per_caller_with_sizes_and_errors')
+        self.assertEqual(rows['search']['results'], 1)
+        self.assertEqual(rows['delete']['errors'], {'32 noSuchObject': 1})
+        self.assertEqual(sum(rows['search']['buckets'].values()), 1)
+
+    def test_hooks_get_spans_and_slow_ones_are_kept(self):
+        spans = []
+        failing = mock.Mock(side_effect=RuntimeError('collector down'))
+        tracer.add_hook(spans.append)
+        tracer.add_hook(failing)
+        self.addCleanup(tracer.remove_hook, spans.append)
+        self.addCleanup(tracer.remove_hook, failing)
+
+        with mock.patch.object(tracer, 'slow_ms', 0):
+            self.conn.search('DC=eissa,DC=local', '(sAMAccountName=ann)')
+
+        self.assertEqual([(span.operation, span.size) for span in spans], [('search', 1)])
+        self.assertTrue(failing.called)
+        self.assertEqual(tracer.slow_operations(), spans)
+
+    def test_admin_page_is_staff_only(self):
+        self.conn.search('DC=eissa,DC=local', '(sAMAccountName=ann)')
+        url = reverse('admin:ad_operations')
+
+        self.client.force_login(User.objects.create_user(username='plain', password='x'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user(username='staff', password='x', is_staff=True))
+        self.assertContains(self.client.get(url), 'core.tests.test_admin_page_is_staff_only')
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertIn('search', [row['operation'] for row in data['operations']])
+
+
+@pytest.mark.django_db
+@override_settings(AD_SERVICE_USERNAME=None, AD_SERVICE_PASSWORD=None)
+class BulkLifecycleJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.users = [User.objects.create_user(username=f'{name}@eissa.local') for name in ('ann', 'bob', 'ghost')]
+        Employee.objects.create(user=self.users[0], full_name_en='Ann')
+        self.ad = FakeLifecycleAD({'ann': 512, 'bob': 512})
+
+    def _run(self, action):
+        job = start_job(action, self.users, self.admin, ('admin', 'x'))
+        run_job(job.pk, lambda: self.ad)
+        job.refresh_from_db()
+        return job
+
+    def test_delete_resolves_once_and_cleans_up_db(self):
+        job = self._run('delete')
+
+        self.assertEqual(self.ad.searches, [['ann', 'bob', 'ghost']])
+        self.assertEqual((job.status, job.succeeded, job.failed), ('finished', 2, 1))
+        self.assertEqual(list(User.objects.filter(username__endswith='@eissa.local').values_list('username', flat=True)),
+                         ['ghost@eissa.local'])
+        self.assertFalse(Employee.objects.exists())
+
+    @override_settings(AD_SERVICE_USERNAME='svc', AD_SERVICE_PASSWORD='svc-pass')
+    def test_service_account_needs_the_action_permission(self):
+        helpdesk = User.objects.create_user(username='helpdesk', is_staff=True)
+        helpdesk.user_permissions.add(Permission.objects.get(codename='change_user'))
+        with mock.patch('core.jobs._run_in_background') as run, self.captureOnCommitCallbacks(execute=True):
+            start_job('disable', self.users, helpdesk, ('helpdesk', 'x'))
+            start_job('delete', self.users, helpdesk, ('helpdesk', 'x'))
+        self.assertEqual([c.args[1] for c in run.call_args_list], [('svc', 'svc-pass'), ('helpdesk', 'x')])
+
+    def test_disable_marks_local_users_inactive(self):
+        self._run('disable')
+        self.assertEqual([call[0] for call in self.ad.calls], ['disable', 'disable'])
+        self.assertFalse(User.objects.get(username='bob@eissa.local').is_active)
+        self.assertTrue(User.objects.get(username='ghost@eissa.local').is_active)
+
+    def test_reset_passwords_download_once(self):
+        job = self._run('reset_password')
+        self.assertTrue(all(call[2] for call in self.ad.calls))
+
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_bulkdirectoryjob_passwords', args=[job.pk])
+        response = self.client.get(url)
+        rows = response.content.decode().splitlines()
+        self.assertEqual(rows[0], 'username,password')
+        self.assertEqual([row.split(',')[0] for row in rows[1:]], ['ann', 'bob'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_job_that_dies_keeps_its_passwords_and_is_marked_failed(self):
+        class WorkerKilled(BaseException):
+            pass
+
+        set_passwords, calls = self.ad.set_passwords_dn, []
+
+        def die_on_second_chunk(items, must_change=False):
+            calls.append(items)
+            if len(calls) > 1:
+                raise WorkerKilled
+            return set_passwords(items, must_change)
+
+        self.ad.set_passwords_dn = die_on_second_chunk
+        job = start_job('reset_password', self.users, self.admin, ('admin', 'x'))
+        with mock.patch('core.jobs.PROGRESS_INTERVAL', 1), self.assertRaises(WorkerKilled):
+            run_job(job.pk, lambda: self.ad)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ('running', 1))
+
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_bulkdirectoryjob_passwords', args=[job.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.get(reverse('admin:core_bulkdirectoryjob_changelist'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+        BulkDirectoryJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - STALE_JOB_TIMEOUT * 2)
+        self.client.get(reverse('admin:core_bulkdirectoryjob_changelist'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        rows = self.client.get(url).content.decode().splitlines()
+        self.assertEqual([row.split(',')[0] for row in rows[1:]], ['ann'])
+
+    def test_action_confirms_then_starts_job(self):
+        self.client.force_login(self.admin)
+        get_vault().store(self.admin.pk, 'admin', 'x')
+        url = reverse('admin:core_user_changelist')
+        selected = [self.admin.pk] + [user.pk for user in self.users]
+        data = {'action': 'disable_ad_accounts', '_selected_action': selected}
+
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Your own account was removed')
+        self.assertFalse(BulkDirectoryJob.objects.exists())
+
+        response = self.client.post(url, {**data, 'apply': '1'})
+        job = BulkDirectoryJob.objects.get()
+        self.assertRedirects(response, reverse('admin:core_bulkdirectoryjob_change', args=[job.pk]),
+                             fetch_redirect_response=False)
+        self.assertEqual([t['username'] for t in job.targets], ['ann', 'bob', 'ghost'])
+
+
+class FakeLDAPConnection:
+    """Minimal ldap3 Connection: serves a 'member' attribute in ranges and scripted modify results."""
+    bound = True
+
+    def __init__(self, members=(), page=1500, failing_dns=()):
+        self.members = list(members)
+        self.page = page
+        self.failing_dns = set(failing_dns)
+        self.searches = []
+        self.modifies = []
+        self.response = []
+        self.result = {}
+
+    def search(self, search_base, search_filter, search_scope=None, attributes=None, **kwargs):
+        self.searches.append(attributes)
+        start = int(attributes[0].split('=')[1].split('-')[0])
+        chunk = self.members[start:start + self.page]
+        end = '*' if start + self.page >= len(self.members) else start + self.page - 1
+        self.response = [{'type': 'searchResEntry', 'raw_attributes': {
+            f'member;range={start}-{end}': [dn.encode() for dn in chunk],
+        }}]
+        return True
+
+    def modify(self, dn, changes, controls=None):
+        values = changes['member'][0][1]
+        self.modifies.append(len(values))
+        ok = not self.failing_dns.intersection(values)
+        self.result = {} if ok else {'description': 'unwillingToPerform', 'message': ''}
+        return ok
+
+
+class GroupConnectionTests(TestCase):
+    def _ad(self, conn):
+        ad = ADConnection('dc', 'eissa.local', 'DC=eissa,DC=local', 'OU=New,DC=eissa,DC=local', probe=False)
+        ad.conn = conn
+        return ad
+
+    def test_ranged_retrieval_reads_every_member(self):
+        members = [f'CN=user{i},OU=New,DC=eissa,DC=local' for i in range(3200)]
+        conn = FakeLDAPConnection(members)
+
+        self.assertEqual(self._ad(conn).get_group_members('CN=Big,DC=eissa,DC=local'), members)
+        self.assertEqual(conn.searches, [['member;range=0-*'], ['member;range=1500-*'], ['member;range=3000-*']])
+
+    def test_failed_batch_is_replayed_per_member(self):
+        dns = [f'CN=user{i},DC=eissa,DC=local' for i in range(5)]
+        conn = FakeLDAPConnection(failing_dns={dns[3]})
+
+        failures = self._ad(conn).add_group_members('CN=G,DC=eissa,DC=local', dns, batch_size=3)
+
+        self.assertEqual(list(failures), [dns[3]])
+        self.assertEqual(conn.modifies, [3, 2, 1, 1])
+
+
+class FakeGroupAD(FakeAD):
+    def __init__(self, results=None):
+        super().__init__(results)
+        self.group_reads = 0
+
+    def get_user_groups(self, username):
+        self.group_reads += 1
+        return [{'dn': 'CN=Staff,DC=eissa,DC=local', 'name': 'Staff', 'sam': 'staff', 'description': '', 'direct': True}]
+
+    def add_group_members(self, group_dn, member_dns):
+        self.calls.append(('add', group_dn, tuple(member_dns)))
+        return {}
+
+    def remove_group_members(self, group_dn, member_dns):
+        self.calls.append(('remove', group_dn, tuple(member_dns)))
+        return {}
+
+
+@pytest.mark.django_db
+@override_settings(DIRECTORY_OUTBOX_INLINE=False, AD_SERVICE_USERNAME='svc', AD_SERVICE_PASSWORD='svc-pass')
+class GroupMembershipTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+
+    def test_user_groups_cached_until_membership_change_applied(self):
+        ad = FakeGroupAD()
+        get_user_groups('jsmith@eissa.local', lambda: ad)
+        get_user_groups('jsmith', lambda: ad)
+        self.assertEqual(ad.group_reads, 1)
+
+        enqueue('update_group', 'staff', payload={
+            'group_dn': 'CN=Staff,DC=eissa,DC=local', 'group_name': 'Staff',
+            'add': ['CN=jsmith,OU=HR,OU=New,DC=eissa,DC=local'], 'remove': [],
+        }, requested_by=self.admin)
+        with mock.patch('core.outbox._connection', return_value=ad):
+            process_outbox(max_workers=1)
+
+        self.assertEqual(DirectoryOperation.objects.get().status, 'applied')
+        get_user_groups('jsmith', lambda: ad)
+        self.assertEqual(ad.group_reads, 2)
+
+    def test_add_members_resolves_usernames_and_queues_one_operation(self):
+        ad = FakeGroupAD()
+        ad.get_group = lambda dn: {'dn': dn, 'name': 'Staff', 'sam': 'Staff', 'description': ''}
+        self.client.force_login(self.admin)
+        get_vault().store(self.admin.pk, 'admin', 'x')
+
+        url = reverse('admin:ad_groups') + '?group=CN%3DStaff%2CDC%3Deissa%2CDC%3Dlocal'
+        with mock.patch('core.admin._connect_ad', return_value=ad):
+            response = self.client.post(url, {'add': '1', 'usernames': 'Ann\nbob@eissa.local, ann'})
+
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        op = DirectoryOperation.objects.get()
+        self.assertEqual((op.operation, op.target), ('update_group', 'staff'))
+        self.assertEqual(op.payload['add'], ['CN=ann,OU=HR,OU=New,DC=eissa,DC=local', 'CN=bob,OU=HR,OU=New,DC=eissa,DC=local'])
+
+
+def login_directory(ad):
+    """Hand ``ad`` to every login instead of a new ADConnection."""
+    return mock.patch('core.auth_backends.new_directory', return_value=contextlib.nullcontext(ad))
+
+
+class FakeTokenGroupsAD:
+    def __init__(self, sids):
+        self.sids = sids
+        self.dn_lookups = 0
+        self.token_reads = 0
+
+    def connect_ad(self, username, password):
+        return password == 'secret'
+
+    def search_user_dn(self, username):
+        self.dn_lookups += 1
+        return [f'CN={username},OU=HR,OU=New,DC=eissa,DC=local']
+
+    def get_token_groups(self, user_dn):
+        self.token_reads += 1
+        return self.sids
+
+
+@pytest.mark.django_db
+class ADGroupMappingTests(TestCase):
+    STAFF_SID = 'S-1-5-21-1004336348-1177238915-682003330-1104'
+    HR_SID = 'S-1-5-21-1004336348-1177238915-682003330-1105'
+
+    def setUp(self):
+        cache.clear()
+        self.admins = Group.objects.create(name='Directory Admins')
+        self.hr = Group.objects.create(name='HR Viewers')
+        self.manual = Group.objects.create(name='Manual')
+        ADGroupMapping.objects.create(sid=self.STAFF_SID, ad_group_name='IT Staff', group=self.admins, grants_staff=True)
+        ADGroupMapping.objects.create(sid=self.HR_SID, ad_group_name='HR', group=self.hr)
+        self.user = User.objects.create_user(username='jsmith@eissa.local')
+        self.user.groups.add(self.hr, self.manual)
+
+    def test_sid_to_str(self):
+        raw = bytes([1, 5, 0, 0, 0, 0, 0, 5, 21, 0, 0, 0]) + b''.join(
+            n.to_bytes(4, 'little') for n in (1004336348, 1177238915, 682003330, 1104)
+        )
+        self.assertEqual(sid_to_str(raw), self.STAFF_SID)
+
+    def test_sync_adds_and_removes_only_mapped_groups(self):
+        self.assertTrue(sync_user_groups(self.user, [self.STAFF_SID, 'S-1-5-32-545']))
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_staff)
+        self.assertEqual(set(self.user.groups.values_list('name', flat=True)), {'Directory Admins', 'Manual'})
+
+        with self.assertNumQueries(1):
+            self.assertFalse(sync_user_groups(self.user, [self.STAFF_SID]))
+
+    @override_settings(AD_GROUP_SYNC=True)
+    def test_login_reads_token_groups_once_per_login(self):
+        ad = FakeTokenGroupsAD([self.STAFF_SID])
+        backend = ActiveDirectoryBackend()
+        with login_directory(ad):
+            self.assertEqual(backend.authenticate(None, username='jsmith', password='secret'), self.user)
+            backend.authenticate(None, username='jsmith', password='secret')
+
+        self.assertEqual((ad.dn_lookups, ad.token_reads), (1, 2))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_staff)
+
+    @override_settings(AD_GROUP_SYNC=True)
+    def test_token_from_a_login_that_changed_flags_is_not_revoked(self):
+        Employee.objects.create(user=self.user, full_name_en='John Smith')
+        with login_directory(FakeTokenGroupsAD([self.STAFF_SID])):
+            login = self.client.post(
+                reverse('login'), {'username': 'jsmith', 'password': 'secret'}, content_type='application/json',
+            )
+        self.assertEqual(login.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_staff)
+
+        response = self.client.get(reverse('employee_profile'), HTTP_AUTHORIZATION=f"JWT {login.json()['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['full_name_en'], 'John Smith')
+
+
+@pytest.mark.django_db
+@override_settings(CREDENTIAL_VAULT_BACKEND='core.vault.DatabaseVault', CREDENTIAL_VAULT_TTL=600)
+class CredentialVaultTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin@eissa.local', password='x', is_staff=True)
+        self.vault = get_vault()
+
+    def test_round_trip_is_encrypted_at_rest(self):
+        self.vault.store(self.user.pk, 'admin', 'S3cret!pass')
+
+        token = StoredCredential.objects.get(user=self.user).token
+        self.assertNotIn('S3cret!pass', token)
+        self.assertEqual(self.vault.get(self.user.pk), {'username': 'admin', 'password': 'S3cret!pass'})
+
+    def test_expiry_slides_on_use_and_expired_entries_are_dropped(self):
+        self.vault.store(self.user.pk, 'admin', 'x')
+        StoredCredential.objects.filter(user=self.user).update(expires_at=timezone.now() + timedelta(seconds=30))
+
+        self.assertIsNotNone(self.vault.get(self.user.pk))
+        self.assertGreater(StoredCredential.objects.get(user=self.user).expires_at, timezone.now() + timedelta(seconds=500))
+
+        StoredCredential.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(self.vault.get(self.user.pk))
+        self.assertFalse(StoredCredential.objects.filter(user=self.user).exists())
+
+    def test_logout_revokes_credentials(self):
+        self.client.force_login(self.user)
+        self.vault.store(self.user.pk, 'admin', 'x')
+
+        self.client.logout()
+
+        self.assertIsNone(self.vault.get(self.user.pk))
+
+    def test_file_vault_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as path:
+            FileVault(ttl=600, path=path).store(self.user.pk, 'admin', 'x')
+            other = FileVault(ttl=600, path=path)
+
+            self.assertEqual(other.get(self.user.pk)['username'], 'admin')
+            other.revoke(self.user.pk)
+            self.assertIsNone(FileVault(ttl=600, path=path).get(self.user.pk))
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight, release, started = SingleFlight(), threading.Event(), threading.Event()
+        runs, results = [], []
+
+        def bind():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return 'bound'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('jsmith', bind))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(sorted(results), [('bound', False)] + [('bound', True)] * 4)
+        self.assertEqual(flight.do('jsmith', lambda: 'again'), ('again', False))
+
+    def test_waiters_get_the_leaders_exception(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('jsmith', mock.Mock(side_effect=ValueError('DC down')))
+        self.assertEqual(flight._calls, {})
+
+
+@pytest.mark.django_db
+class LoginFailureCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_failed_bind_is_not_retried_within_the_timeout(self):
+        ad = mock.Mock(bind_error=BIND_INVALID)
+        ad.connect_ad.return_value = False
+        backend = ActiveDirectoryBackend()
+        with login_directory(ad):
+            self.assertIsNone(backend.authenticate(None, username='jsmith', password='wrong'))
+            self.assertIsNone(backend.authenticate(None, username='jsmith', password='wrong'))
+            ad.connect_ad.return_value = True
+            with self.assertRaises(Http404):
+                # A different password is a different attempt
+                backend.authenticate(None, username='jsmith', password='other')
+
+        self.assertEqual(ad.connect_ad.call_count, 2)
+
+    @override_settings(ACTIVE_DIR=mock.Mock(timeout=5, start_tls=False), AD_GROUP_SYNC=False)
+    def test_each_login_binds_its_own_connection(self):
+        User.objects.create_user(username='jsmith@eissa.local')
+        backend = ActiveDirectoryBackend()
+        with mock.patch('core.utils.ADConnection') as connection_class:
+            connection_class.return_value.__enter__.side_effect = lambda: connection_class.return_value
+            backend.authenticate(None, username='jsmith', password='one')
+            backend.authenticate(None, username='jsmith', password='two')
+
+        self.assertEqual(connection_class.call_count, 2)
+        self.assertEqual(connection_class.return_value.__exit__.call_count, 2)
+        settings.ACTIVE_DIR.connect_ad.assert_not_called()
+
+
+@pytest.mark.django_db
+class StatelessLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='jsmith@eissa.local')
+        self.ad = mock.Mock()
+        self.ad.connect_ad.return_value = True
+
+    def login(self):
+        with login_directory(self.ad), override_settings(AD_GROUP_SYNC=False):
+            return self.client.post(
+                reverse('login'), {'username': 'jsmith', 'password': 'secret'}, content_type='application/json',
+            )
+
+    def test_api_login_issues_tokens_without_a_session(self):
+        response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertIsNotNone(User.objects.get(username='jsmith@eissa.local').last_login)
+
+    @override_settings(API_LOGIN_SESSIONS=True)
+    def test_session_login_can_be_enabled(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_purge_stale_sessions(self):
+        now = timezone.now()
+        Session.objects.create(session_key='expired', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='idle', session_data='', expire_date=now + timedelta(days=1))
+        Session.objects.create(session_key='fresh', session_data='', expire_date=now + timedelta(days=13, hours=23))
+
+        call_command('purge_stale_sessions', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(Session.objects.count(), 2)
+
+        call_command('purge_stale_sessions', idle_days=7, stdout=io.StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['fresh'])
+
+
+@pytest.mark.django_db
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jsmith@eissa.local', is_staff=True)
+        self.department = Department.objects.create(name='HR')
+        self.employee = Employee.objects.create(user=self.user, full_name_en='John Smith', department=self.department)
+        self.auth = ClaimsJWTAuthentication()
+
+    def authenticate(self, token):
+        request = mock.Mock(META={'HTTP_AUTHORIZATION': f'JWT {token}'})
+        return self.auth.authenticate(request)[0]
+
+    def test_claims_user_needs_no_query_once_the_version_is_cached(self):
+        token = tokens_for_user(self.user).access_token
+        self.authenticate(token)
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'jsmith@eissa.local', True))
+        self.assertEqual((user.employee_id, user.department_id), (self.employee.pk, self.department.pk))
+
+    def test_revoked_and_deleted_users_are_rejected(self):
+        token = tokens_for_user(self.user).access_token
+        self.authenticate(token)
+
+        revoke_tokens([self.user.pk])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.user.refresh_from_db()
+        fresh = tokens_for_user(self.user).access_token
+        self.assertEqual(self.authenticate(fresh).pk, self.user.pk)
+
+        self.employee.delete()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(fresh)
+
+    def test_deactivated_users_are_rejected_without_a_revoke(self):
+        token = tokens_for_user(self.user).access_token
+        self.assertTrue(self.authenticate(token).is_active)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate(token)
+
+        self.user.is_active = False
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate(tokens_for_user(self.user).access_token)
+
+    @override_settings(TOKEN_VERSION_CACHE_TIMEOUT=5)
+    def test_version_is_only_cached_briefly(self):
+        token = tokens_for_user(self.user).access_token
+        with mock.patch('core.tokens.cache') as version_cache:
+            version_cache.get.return_value = None
+            self.authenticate(token)
+        self.assertEqual(version_cache.set.call_args.args[2], 5)
+
+    def test_tokens_without_claims_load_the_user(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertIsInstance(self.authenticate(token), User)
+
+
+@pytest.mark.django_db
+@override_settings(AD_LOGIN_VERIFIER_TTL=300, AD_LOGIN_VERIFIER_MAX_USES=2, AD_GROUP_SYNC=False)
+class LoginVerifierTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='jsmith@eissa.local')
+        self.ad = mock.Mock(bind_error=BIND_UNAVAILABLE)
+        self.ad.connect_ad.return_value = False
+        verifier.remember('jsmith@eissa.local', 'secret')
+
+    def authenticate(self, password='secret'):
+        with login_directory(self.ad), mock.patch('core.verifier._confirm_in_background') as confirm:
+            user = ActiveDirectoryBackend().authenticate(None, username='jsmith', password=password)
+        return user, confirm
+
+    def test_repeat_login_is_verified_locally_while_ad_is_down(self):
+        user, confirm = self.authenticate()
+
+        self.assertEqual(user, self.user)
+        self.assertTrue(verifier.is_degraded())
+        confirm.assert_called_once_with(self.user.pk, 'jsmith@eissa.local', 'secret')
+        self.assertEqual(get_vault().get(self.user.pk)['password'], 'secret')
+
+        # Degraded: the next login does not wait for another bind
+        self.assertEqual(self.authenticate()[0], self.user)
+        self.assertEqual(self.ad.connect_ad.call_count, 1)
+
+    def test_wrong_password_and_exhausted_uses_are_refused(self):
+        self.assertIsNone(self.authenticate('wrong')[0])
+        self.assertIsNotNone(self.authenticate()[0])
+        self.assertIsNotNone(self.authenticate()[0])
+        self.assertIsNone(self.authenticate()[0])
+
+    def test_password_rejected_by_ad_is_not_accepted_during_a_later_outage(self):
+        self.ad.bind_error = BIND_INVALID
+        self.assertIsNone(self.authenticate()[0])
+
+        # Later, after the failure cache expired, the DC goes down
+        cache.delete(f"ad_login_failed_{credential_fingerprint('jsmith@eissa.local', 'secret')}")
+        self.ad.bind_error = BIND_UNAVAILABLE
+        self.assertIsNone(self.authenticate()[0])
+        self.assertTrue(verifier.is_degraded())
+        self.assertEqual(self.ad.connect_ad.call_count, 2)
+
+    @override_settings(AD_LOGIN_VERIFIER_TTL=0)
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.authenticate()[0])
+        self.assertFalse(verifier.is_degraded())
+
+    def test_rejection_by_ad_revokes_everything(self):
+        get_vault().store(self.user.pk, 'jsmith@eissa.local', 'secret')
+        rejecting = mock.Mock(bind_error=BIND_INVALID)
+        rejecting.connect_ad.return_value = False
+
+        with mock.patch('employee.audit.audit_writer.record_action') as record:
+            confirmed = verifier.confirm(self.user.pk, 'jsmith@eissa.local', 'secret', new_connection=lambda: rejecting)
+
+        self.assertFalse(confirmed)
+        self.assertIsNone(get_vault().get(self.user.pk))
+        self.assertFalse(verifier.verify('jsmith@eissa.local', 'secret'))
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, 1)
+        self.assertIn('rejected', record.call_args.kwargs['change_message'])
+
+    def test_verifier_and_outage_are_shared_by_every_worker(self):
+        verifier.mark_degraded()
+        # Another worker's cache is empty; the database has both
+        cache.clear()
+        self.assertTrue(verifier.is_degraded())
+        self.assertTrue(verifier.verify('JSmith@eissa.local', 'secret'))
+        self.assertEqual(LoginVerifier.objects.get().uses, 1)
+
+    def test_hashing_runs_on_a_bounded_pool(self):
+        with mock.patch('core.verifier._hashers') as hashers, \
+                mock.patch('core.verifier._pending_hashes', threading.BoundedSemaphore(1)):
+            verifier.remember_in_background('jsmith@eissa.local', 'new')
+            verifier.remember_in_background('jsmith@eissa.local', 'newer')
+        self.assertEqual(hashers.submit.call_count, 1)
+
+
+SLOW_DC_USERS = {
+    'jsmith': {
+        'dn': 'CN=John Smith,OU=IT,OU=New,DC=eissa,DC=local',
+        'sAMAccountName': 'jsmith',
+        'mail': 'jsmith@eissa.local',
+        'tokenGroups': [bytes.fromhex('010200000000000520000000' + '20020000')],
+    },
+    'adoe': {'dn': 'CN=Ann Doe,OU=HR,OU=New,DC=eissa,DC=local', 'sAMAccountName': 'adoe'},
+}
+
+
+@asynccontextmanager
+async def slow_dc(delay=0.0):
+    """SlowDirectoryServer on the test's event loop; yields (server, 'host:port')."""
+    server = SlowDirectoryServer(SLOW_DC_USERS, delay=delay)
+    port = await server.start()
+    try:
+        yield server, f'127.0.0.1:{port}'
+    finally:
+        await server.stop()
+
+
+def async_connection(host):
+    return AsyncADConnection(
+        host, 'eissa.local', 'DC=eissa,DC=local', 'OU=New,DC=eissa,DC=local', timeout=5, start_tls=False,
+    )
+
+
+class AsyncDirectoryTests(TestCase):
+    async def test_bind_and_reads(self):
+        async with slow_dc() as (server, host), async_connection(host) as ad:
+            self.assertTrue(await ad.connect_ad('jsmith', 'secret'))
+            entry = (await ad.search_user_full_info('jsmith', attributes=['mail']))[0]
+            self.assertEqual(entry.mail, ['jsmith@eissa.local'])
+            self.assertEqual(
+                await ad.search_users_dn(['jsmith', 'ADOE@eissa.local', 'nobody']),
+                {'jsmith': SLOW_DC_USERS['jsmith']['dn'], 'adoe': SLOW_DC_USERS['adoe']['dn']},
+            )
+            self.assertEqual(await ad.get_token_groups(SLOW_DC_USERS['jsmith']['dn']), ['S-1-5-32-544'])
+
+    async def test_concurrent_searches_share_one_connection(self):
+        async with slow_dc(delay=0.05) as (server, host), async_connection(host) as ad:
+            await ad.connect_ad('jsmith', 'secret')
+            start = time.monotonic()
+            results = await asyncio.gather(*(ad.search_user_dn('adoe') for _ in range(10)))
+            self.assertLess(time.monotonic() - start, 0.05 * 5)
+        self.assertEqual(results, [[SLOW_DC_USERS['adoe']['dn']]] * 10)
+        self.assertEqual(server.max_in_flight, 10)
+
+    async def test_bind_errors(self):
+        async with slow_dc() as (server, host):
+            rejected = async_connection(host)
+            self.assertFalse(await rejected.connect_ad('jsmith', 'wrong'))
+            self.assertEqual(rejected.bind_error, BIND_INVALID)
+
+        unreachable = async_connection(host)
+        self.assertFalse(await unreachable.connect_ad('jsmith', 'secret'))
+        self.assertEqual(unreachable.bind_error, BIND_UNAVAILABLE)
+
+    async def test_requests_after_the_connection_drops_fail_fast(self):
+        async with slow_dc() as (server, host):
+            ad = async_connection(host)
+            ad.timeout = None
+            self.assertTrue(await ad.connect_ad('jsmith', 'secret'))
+        await asyncio.wait_for(ad._listener, 1)
+
+        self.assertFalse(ad.bound)
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(ad._request('extendedReq', extended_operation('1.3.6.1.4.1.4203.1.11.3')), 1)
+        await ad.close()
+
+    async def test_async_login_view(self):
+        await User.objects.acreate(username='jsmith@eissa.local')
+        view = AsyncLoginView.as_view()
+        factory = AsyncRequestFactory()
+
+        async with slow_dc() as (server, host):
+            with override_settings(
+                SERVER_HOST=host, ACTIVE_DIR=mock.Mock(timeout=5, start_tls=False), AD_GROUP_SYNC=False,
+            ):
+                ok = await view(factory.post(
+                    '/api/auth/login/', {'username': 'jsmith', 'password': 'secret'}, content_type='application/json',
+                ))
+                rejected = await view(factory.post(
+                    '/api/auth/login/', {'username': 'jsmith', 'password': 'wrong'}, content_type='application/json',
+                ))
+
+        self.assertEqual(ok.status_code, 200)
+        self.assertEqual(json.loads(ok.content)['user']['username'], 'jsmith@eissa.local')
+        self.assertIn('access', json.loads(ok.content))
+        self.assertEqual(rejected.status_code, 401)
+        self.assertIsNotNone((await User.objects.aget(username='jsmith@eissa.local')).last_login)
+
+
+class MetricsTests(TestCase):
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_queries_and_caches_are_exported(self):
+        user = User.objects.create_user(username='jsmith@eissa.local')
+        get_vault().store(user.pk, 'jsmith@eissa.local', 'secret')
+        get_vault().get(user.pk)
+        get_vault().get(user.pk + 1)
+        self.client.post(reverse('login'), {'username': 'x'}, content_type='application/json')
+
+        text = self.scrape()
+        self.assertIn('adiwa_http_request_duration_seconds_bucket{view="login",le="+Inf"}', text)
+        self.assertIn('adiwa_http_requests_total{view="login",method="POST",status="400"}', text)
+        self.assertIn('adiwa_db_queries_per_request_count{view="login"}', text)
+        self.assertRegex(text, r'adiwa_cache_requests_total\{cache="credential",result="hit"\} [1-9]')
+        self.assertRegex(text, r'adiwa_cache_requests_total\{cache="credential",result="miss"\} [1-9]')
+        self.assertIn(f'adiwa_http_requests_in_progress{{pid="{os.getpid()}"}} 1', text)
+
+    def test_db_queries_are_counted_per_request(self):
+        counted = metrics.Histogram('test_queries', 'test', ['view'], buckets=metrics.QUERY_COUNT_BUCKETS)
+        metrics._registry.remove(counted)
+        with mock.patch.object(metrics, 'DB_QUERIES', counted):
+            self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+            self.client.get(reverse('admin:core_user_changelist'))
+        queries = counted.family()['samples'][('admin:core_user_changelist',)]
+        self.assertGreater(queries[-1], 0)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+    def test_without_a_token_only_staff_and_allowed_addresses_may_scrape(self):
+        remote = {'REMOTE_ADDR': '203.0.113.7', 'HTTP_X_FORWARDED_FOR': '127.0.0.1'}
+        self.assertEqual(self.client.get('/metrics', **remote).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.0/24']):
+            self.scrape(**remote)
+
+        self.client.force_login(User.objects.create_user(username='staff', is_staff=True))
+        self.scrape(**remote)
+
+    def test_worker_snapshots_are_merged(self):
+        metrics.cache_lookup('profile', True)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.flush()
+            with open(os.path.join(directory, f'{os.getpid()}.json'), encoding='utf-8') as f:
+                own = f.read()
+            # A worker that has exited: its counters still count, its gauges are dropped
+            with open(os.path.join(directory, '999999999.json'), 'w', encoding='utf-8') as f:
+                f.write(own.replace(f'"{os.getpid()}"', '"999999999"'))
+
+            families = {family['name']: family for family in metrics.merged_families()}
+
+        self.assertNotIn(('999999999',), families['adiwa_process_threads']['samples'])
+        self.assertIn((str(os.getpid()),), families['adiwa_process_threads']['samples'])
+        for labels, value in metrics.CACHE_REQUESTS.family()['samples'].items():
+            self.assertEqual(families['adiwa_cache_requests_total']['samples'][labels], 2 * value)
+
+
+class AuditHookTests(TestCase):
+    def test_actions_go_to_the_registered_recorder(self):
+        user = User.objects.create_user(username='jsmith')
+        entry = dict(user_id=user.pk, model=User, object_id=user.pk, object_repr='jsmith',
+                     action_flag=CHANGE, change_message='Disabled')
+        with mock.patch.object(audit_writer, 'record_action') as record:
+            audit.record_action(**entry)
+        record.assert_called_once_with(**entry)
+
+        with mock.patch('core.audit._recorder', None):
+            audit.record_action(**entry)
+        self.assertEqual(LogEntry.objects.get().change_message, 'Disabled')
+
+
+class HealthEndpointTests(TestCase):
+    def setUp(self):
+        health._last['report'] = None
+        self.addCleanup(health._last.update, report=None)
+
+    def test_healthz_does_no_database_work(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/healthz')
+        self.assertEqual((response.status_code, response.content), (200, b'ok\n'))
+        self.assertEqual(len(queries), 0)
+
+    def test_readyz_reports_checks_and_caches_the_result(self):
+        check_ad = mock.Mock(side_effect=OSError('connection refused'))
+        with mock.patch.dict(health.CHECKS, ad=check_ad), self.assertLogs('core.health', 'WARNING') as logs:
+            first = self.client.get('/readyz')
+            second = self.client.get('/readyz')
+
+        self.assertEqual(first.status_code, 200)
+        report = first.json()
+        self.assertTrue(report['checks']['database']['ok'])
+        self.assertTrue(report['checks']['cache']['ok'])
+        self.assertEqual(report['checks']['ad'], {'ok': False, 'ms': mock.ANY})
+        self.assertNotIn('connection refused', first.content.decode())
+        self.assertIn('connection refused', logs.output[0])
+        self.assertEqual(second.json(), report)
+        self.assertEqual(check_ad.call_count, 1)
+
+    @override_settings(READINESS_REQUIRES_AD=True)
+    def test_not_ready_without_ad_when_required(self):
+        with mock.patch.dict(health.CHECKS, ad=mock.Mock(side_effect=OSError('timed out'))):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['ready'])
+
+
+class AdminActionPermissionTests(TestCase):
+    """AD write actions are only offered to staff with the matching model permission."""
+
+    def _staff(self, *codenames):
+        user = User.objects.create_user(username='viewer', password='x', is_staff=True)
+        user.user_permissions.set(Permission.objects.filter(codename__in=codenames))
+        self.client.force_login(user)
+        return user
+
+    def _actions(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        form = response.context['action_form']
+        return {name for name, _ in form.fields['action'].choices if name} if form else set()
+
+    def test_view_only_staff_cannot_retry_directory_operations(self):
+        url = reverse('admin:core_directoryoperation_changelist')
+        DirectoryOperation.objects.create(operation='update_ou', target='jsmith', idempotency_key='k', status='failed')
+        user = self._staff('view_directoryoperation')
+        self.assertNotIn('retry_operations', self._actions(url))
+
+        user.user_permissions.add(Permission.objects.get(codename='change_directoryoperation'))
+        self.assertIn('retry_operations', self._actions(url))
+
+    def test_bulk_ad_actions_need_change_or_delete_permission(self):
+        url = reverse('admin:core_user_changelist')
+        lifecycle = {'reset_ad_passwords', 'disable_ad_accounts', 'delete_ad_accounts'}
+        user = self._staff('view_user')
+        self.assertFalse(self._actions(url) & lifecycle)
+
+        user.user_permissions.add(Permission.objects.get(codename='change_user'))
+        self.assertEqual(self._actions(url) & lifecycle, {'reset_ad_passwords', 'disable_ad_accounts'})
+
+        user.user_permissions.add(Permission.objects.get(codename='delete_user'))
+        self.assertEqual(self._actions(url) & lifecycle, lifecycle)
+
+    def test_view_only_staff_cannot_post_a_bulk_ad_action(self):
+        target = User.objects.create_user(username='jsmith@eissa.local')
+        self._staff('view_user')
+        creds = {'username': 'viewer', 'password': 'x'}
+        with mock.patch('core.admin._get_ad_creds', return_value=creds), mock.patch('core.admin.start_job') as start:
+            self.client.post(reverse('admin:core_user_changelist'), {
+                'action': 'delete_ad_accounts', helpers.ACTION_CHECKBOX_NAME: [target.pk], 'apply': '1',
+            })
+        start.assert_not_called()
+
+    def test_view_only_staff_cannot_queue_ad_writes(self):
+        target = User.objects.create_user(username='jsmith@eissa.local')
+        self._staff('view_user', 'view_employee')
+        urls = [
+            reverse('admin:create_ad_user'),
+            reverse('admin:bulk_create_ad_users'),
+            reverse('admin:change_ad_password', args=[target.pk]),
+            reverse('admin:delete_ad_user', args=[target.pk]),
+            f"{reverse('admin:ad_groups')}?group=CN=Staff,DC=eissa,DC=local",
+            reverse('admin:transfer_ou_page'),
+        ]
+        creds = {'username': 'viewer', 'password': 'x'}
+        with mock.patch('core.admin._get_ad_creds', return_value=creds):
+            for url in urls:
+                self.assertEqual(self.client.post(url, {'username': 'jsmith', 'new_ou': 'IT'}).status_code, 403, url)
+        self.assertFalse(DirectoryOperation.objects.exists())
+
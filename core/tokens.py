@@ -0,0 +1,142 @@
+"""
+JWTs that carry enough claims for API requests to skip loading the user.
+
+tokens_for_user() adds the username, the active/staff/superuser flags, the
+linked employee and department ids and the user's token version.
+core.authentication.ClaimsJWTAuthentication builds a ClaimsUser from those
+claims and only checks the version against the cached current one, so a
+request normally runs no authentication query. revoke_tokens() bumps the
+version, which invalidates every token issued before.
+
+The version is cached for TOKEN_VERSION_CACHE_TIMEOUT seconds. With the
+default per-process LocMemCache, revoke_tokens() only clears the calling
+worker's copy, so other workers accept a revoked token for up to that long.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from employee.models import Employee
+from .metrics import cache_lookup
+from .models import User
+
+TOKEN_VERSION_CLAIM = 'ver'
+
+# Cached for users that no longer exist or were deactivated, so their tokens
+# fail without a query
+MISSING_USER = -1
+INACTIVE_USER = -2
+
+
+def _version_key(user_id):
+    return f'jwt_version_{user_id}'
+
+
+def tokens_for_user(user):
+    """RefreshToken for ``user`` with the profile claims; its access token copies them."""
+    employee_id, department_id = (
+        Employee.objects.filter(user=user).values_list('pk', 'department_id').first() or (None, None)
+    )
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh['is_active'] = user.is_active
+    refresh['is_staff'] = user.is_staff
+    refresh['is_superuser'] = user.is_superuser
+    refresh['employee_id'] = employee_id
+    refresh['department_id'] = department_id
+    refresh[TOKEN_VERSION_CLAIM] = user.token_version
+    return refresh
+
+
+def _cached_version(row):
+    if row is None:
+        return MISSING_USER
+    version, is_active = row
+    return version if is_active else INACTIVE_USER
+
+
+def get_token_version(user_id):
+    """
+    Current token version of the user (cached): the version, MISSING_USER if
+    the user is gone or INACTIVE_USER if it was deactivated.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    cache_lookup('token_version', version is not None)
+    if version is None:
+        version = _cached_version(
+            User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+        )
+        cache.set(key, version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+async def aget_token_version(user_id):
+    """See get_token_version()."""
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    cache_lookup('token_version', version is not None)
+    if version is None:
+        version = _cached_version(
+            await User.objects.filter(pk=user_id).values_list('token_version', 'is_active').afirst()
+        )
+        await cache.aset(key, version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def revoke_tokens(user_ids):
+    """Invalidate every JWT issued so far to ``user_ids``."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+    cache.delete_many([_version_key(user_id) for user_id in user_ids])
+
+
+def forget_deleted_user(sender, instance, **kwargs):
+    """post_delete receiver for User (connected in CoreConfig.ready)."""
+    cache.delete(_version_key(instance.pk))
+
+
+class ClaimsUser(TokenUser):
+    """
+    TokenUser that also exposes the employee and department ids from the token.
+
+    Permissions are not in the token: has_perm() loads the user (one query,
+    skipped for active superusers).
+    """
+
+    @cached_property
+    def id(self):
+        # simplejwt writes the user id claim as a string
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @property
+    def employee_id(self):
+        return self.token.get('employee_id')
+
+    @property
+    def department_id(self):
+        return self.token.get('department_id')
+
+    @cached_property
+    def _user(self):
+        return User.objects.filter(pk=self.id, is_active=True).first()
+
+    def has_perm(self, perm, obj=None):
+        if not self.is_active:
+            return False
+        if self.is_superuser:
+            return True
+        return self._user is not None and self._user.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
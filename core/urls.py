@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.urls import path
-from .views import LoginView
+from django.views.decorators.csrf import csrf_exempt
+from .views import AsyncLoginView, LoginView
+
+# The async view is for ASGI deployments; under WSGI it would run in a thread anyway
+login_view = csrf_exempt(AsyncLoginView.as_view()) if settings.ASYNC_API_VIEWS else LoginView.as_view()
 
 urlpatterns = [
-    path('login/', LoginView.as_view(), name='login'),
-]
\ No newline at end of file
+    path('login/', login_view, name='login'),
+]
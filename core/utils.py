@@ -1,17 +1,86 @@
-from django.core.cache import cache
+import uuid
+
+from django.contrib import messages
 from django.conf import settings
+from django.urls import reverse
+from django.utils.html import format_html
+
+from ADIWA.ad_conn import ADConnection
+from ADIWA.ad_conn_async import AsyncADConnection
+from .vault import get_vault
 
 def _get_ad_creds(request):
-    """Return cached AD creds or None."""
-    creds = cache.get(f'ad_creds_{request.user.id}')
+    """Return the user's AD creds from the credential vault, or None."""
+    creds = get_vault().get(request.user.id)
     if not creds or not creds.get('username') or not creds.get('password'):
         return None
     return creds
 
+def service_credentials(user, permission):
+    """
+    (username, password) of the AD service account if it is configured and
+    ``user`` holds ``permission``, else None. Everyone else binds with their
+    own login, so AD's ACLs still limit what they can change.
+    """
+    if not (settings.AD_SERVICE_USERNAME and settings.AD_SERVICE_PASSWORD):
+        return None
+    if user is None or not user.is_active or not user.has_perm(permission):
+        return None
+    return settings.AD_SERVICE_USERNAME, settings.AD_SERVICE_PASSWORD
+
 def _connect_ad(creds):
     """Return an authenticated AD connection, or None on failure."""
-    ad = settings.ACTIVE_DIR
+    ad = new_directory()
     if not ad.connect_ad(creds['username'], creds['password']):
         return None
     return ad
 
+
+def new_directory():
+    """
+    A new, unbound ADConnection set up like ACTIVE_DIR; use one per login or
+    request. ACTIVE_DIR itself is shared by every thread of the process, so
+    a bind on it would switch the account other requests are using.
+    """
+    return ADConnection(
+        server_host=settings.SERVER_HOST,
+        domain=settings.DOMAIN,
+        base_dn=settings.BASE_DN,
+        base_container=settings.CONTAINER_DN_BASE,
+        probe=False,
+        timeout=settings.ACTIVE_DIR.timeout,
+        start_tls=settings.ACTIVE_DIR.start_tls,
+    )
+
+
+def async_directory():
+    """A new AsyncADConnection set up like ACTIVE_DIR; use one per request."""
+    return AsyncADConnection(
+        server_host=settings.SERVER_HOST,
+        domain=settings.DOMAIN,
+        base_dn=settings.BASE_DN,
+        base_container=settings.CONTAINER_DN_BASE,
+        timeout=settings.ACTIVE_DIR.timeout,
+        start_tls=settings.ACTIVE_DIR.start_tls,
+    )
+
+
+def new_idempotency_key(request):
+    """Key for the hidden idempotency_key field; kept across form re-renders."""
+    return request.POST.get('idempotency_key') or uuid.uuid4().hex
+
+
+def message_operation_queued(request, op, created, description):
+    """Tell the admin a directory write was queued, with a link to its status."""
+    url = reverse('admin:core_directoryoperation_change', args=[op.pk])
+    if created:
+        messages.info(
+            request,
+            format_html('{} queued for Active Directory. <a href="{}">Track status</a>', description, url),
+        )
+    else:
+        messages.warning(
+            request,
+            format_html('{} was already submitted ({}). <a href="{}">Track status</a>',
+                        description, op.get_status_display(), url),
+        )
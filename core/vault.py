@@ -0,0 +1,174 @@
+"""
+Credential vault for the AD credentials captured at login.
+
+Admin actions bind to AD as the logged-in admin, so the password given at
+login has to be available to later requests. It is kept encrypted
+(core.crypto) in a store shared by every worker process, expires after
+CREDENTIAL_VAULT_TTL seconds without use (each read slides the expiry) and is
+revoked on logout.
+
+Backends (CREDENTIAL_VAULT_BACKEND):
+  * DatabaseVault - StoredCredential table (default; shared by all hosts)
+  * FileVault     - one file per user under CREDENTIAL_VAULT_DIR (one host)
+  * CacheVault    - the default Django cache; shared only if that cache is
+                    (e.g. Redis/Memcached, not the LocMemCache)
+"""
+import functools
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .crypto import InvalidToken, decrypt, encrypt
+from .metrics import cache_lookup
+from .models import StoredCredential
+
+logger = logging.getLogger(__name__)
+
+
+class BaseVault:
+    """
+    Subclasses store (token, expiry timestamp) per user with _read, _write
+    and _delete; encryption and sliding expiry live here.
+    """
+
+    def __init__(self, ttl, **options):
+        self.ttl = ttl
+        # Only extend the expiry once it has run down by this much, so that
+        # not every request becomes a write.
+        self.slide_after = min(60, ttl // 5)
+
+    def store(self, user_id, username, password):
+        token = encrypt(json.dumps({'username': username, 'password': password}))
+        self._write(user_id, token, time.time() + self.ttl)
+
+    def get(self, user_id, touch=True):
+        """Return {'username', 'password'} or None; ``touch`` slides the expiry."""
+        creds = self._get(user_id, touch)
+        cache_lookup('credential', creds is not None)
+        return creds
+
+    def _get(self, user_id, touch):
+        stored = self._read(user_id)
+        if not stored:
+            return None
+
+        token, expires_at = stored
+        now = time.time()
+        if expires_at <= now:
+            self._delete(user_id)
+            return None
+
+        try:
+            creds = json.loads(decrypt(token))
+        except InvalidToken:
+            logger.warning(f"Stored AD credentials of user {user_id} could not be decrypted; discarding")
+            self._delete(user_id)
+            return None
+
+        if touch and expires_at - now < self.ttl - self.slide_after:
+            self._write(user_id, token, now + self.ttl)
+        return creds
+
+    def revoke(self, user_id):
+        self._delete(user_id)
+
+    def _read(self, user_id):
+        raise NotImplementedError
+
+    def _write(self, user_id, token, expires_at):
+        raise NotImplementedError
+
+    def _delete(self, user_id):
+        raise NotImplementedError
+
+
+class DatabaseVault(BaseVault):
+    def _read(self, user_id):
+        row = StoredCredential.objects.filter(user_id=user_id).values_list('token', 'expires_at').first()
+        return (row[0], row[1].timestamp()) if row else None
+
+    def _write(self, user_id, token, expires_at):
+        StoredCredential.objects.update_or_create(
+            user_id=user_id,
+            defaults={'token': token, 'expires_at': datetime.fromtimestamp(expires_at, tz=dt_timezone.utc)},
+        )
+
+    def _delete(self, user_id):
+        StoredCredential.objects.filter(user_id=user_id).delete()
+
+    def store(self, user_id, username, password):
+        # Logins are rare enough to sweep abandoned rows here
+        StoredCredential.objects.filter(expires_at__lt=timezone.now()).delete()
+        super().store(user_id, username, password)
+
+
+class FileVault(BaseVault):
+    def __init__(self, ttl, path=None, **options):
+        super().__init__(ttl)
+        self.path = path
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+
+    def _file(self, user_id):
+        return os.path.join(self.path, f'{int(user_id)}.cred')
+
+    def _read(self, user_id):
+        try:
+            with open(self._file(user_id), encoding='utf-8') as f:
+                data = json.load(f)
+            return data['token'], data['expires_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, user_id, token, expires_at):
+        # Write-then-rename so other workers never read a half-written file
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'token': token, 'expires_at': expires_at}, f)
+            os.replace(tmp, self._file(user_id))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _delete(self, user_id):
+        try:
+            os.unlink(self._file(user_id))
+        except FileNotFoundError:
+            pass
+
+
+class CacheVault(BaseVault):
+    def _key(self, user_id):
+        return f'ad_vault_{user_id}'
+
+    def _read(self, user_id):
+        return cache.get(self._key(user_id))
+
+    def _write(self, user_id, token, expires_at):
+        cache.set(self._key(user_id), (token, expires_at), max(1, int(expires_at - time.time())))
+
+    def _delete(self, user_id):
+        cache.delete(self._key(user_id))
+
+
+def get_vault():
+    return _vault(settings.CREDENTIAL_VAULT_BACKEND, settings.CREDENTIAL_VAULT_TTL, settings.CREDENTIAL_VAULT_DIR)
+
+
+@functools.lru_cache(maxsize=None)
+def _vault(backend, ttl, path):
+    return import_string(backend)(ttl=ttl, path=path)
+
+
+def revoke_on_logout(sender, request, user, **kwargs):
+    """user_logged_out receiver (connected in CoreConfig.ready)."""
+    if user is not None:
+        get_vault().revoke(user.pk)
@@ -0,0 +1,191 @@
+"""
+Local verification of repeat logins while the DC is unavailable (opt-in via
+AD_LOGIN_VERIFIER_TTL).
+
+After a successful bind, remember() keeps a salted slow hash of the password
+(Django's password hasher) in the LoginVerifier table for
+AD_LOGIN_VERIFIER_TTL seconds, counted from that bind; the hash runs on a
+small thread pool (remember_in_background) so it does not slow the login.
+When a bind fails because the DC is unavailable, the DC is marked degraded
+for AD_DEGRADED_SECONDS (the DirectoryOutage row). Both live in the database
+so every worker sees them. Until then, login_locally()
+accepts a password that matches the verifier, at most
+AD_LOGIN_VERIFIER_MAX_USES times. A background bind then confirms the login
+once the DC answers. If AD rejects the password, the verifier, the stored
+credentials and the user's tokens are revoked. Every local login and its
+outcome goes to the admin log.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.models import CHANGE
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from ADIWA.ad_conn import BIND_INVALID
+from . import audit
+from .models import DirectoryOutage, LoginVerifier, User
+from .tokens import revoke_tokens
+from .utils import new_directory
+from .vault import get_vault
+
+logger = logging.getLogger(__name__)
+
+# The background confirmation keeps trying for about five minutes
+CONFIRM_ATTEMPTS = 10
+CONFIRM_RETRY_DELAY = 30
+
+# Slow hashes run on a few threads; while that many are already waiting,
+# a login's verifier is skipped rather than queued.
+HASH_WORKERS = 2
+MAX_PENDING_HASHES = 32
+
+_hashers = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='ad-verifier')
+_pending_hashes = threading.BoundedSemaphore(MAX_PENDING_HASHES)
+
+
+def enabled():
+    return settings.AD_LOGIN_VERIFIER_TTL > 0
+
+
+def _key(username):
+    return username.split('@')[0].lower()
+
+
+def remember(username, password):
+    """Store the verifier for a password AD just accepted."""
+    # Sweep expired verifiers here, like DatabaseVault.store()
+    LoginVerifier.objects.filter(expires_at__lt=timezone.now()).delete()
+    LoginVerifier.objects.update_or_create(
+        username=_key(username),
+        defaults={
+            'password_hash': make_password(password),
+            'uses': 0,
+            'expires_at': timezone.now() + timedelta(seconds=settings.AD_LOGIN_VERIFIER_TTL),
+        },
+    )
+
+
+def remember_in_background(username, password):
+    """remember() on the hashing pool; skipped (and logged) when the pool is backed up."""
+    if not _pending_hashes.acquire(blocking=False):
+        logger.warning(f"Login verifier hashing is backed up; not storing a verifier for {username}")
+        return
+
+    def run():
+        try:
+            remember(username, password)
+        except Exception as exc:
+            logger.error(f"Storing the login verifier of {username} failed: {exc}", exc_info=True)
+        finally:
+            _pending_hashes.release()
+            connections.close_all()
+
+    _hashers.submit(run)
+
+
+def forget(username):
+    LoginVerifier.objects.filter(username=_key(username)).delete()
+
+
+def mark_degraded():
+    until = timezone.now() + timedelta(seconds=settings.AD_DEGRADED_SECONDS)
+    DirectoryOutage.objects.update_or_create(pk=1, defaults={'until': until})
+
+
+def clear_degraded():
+    DirectoryOutage.objects.all().delete()
+
+
+def is_degraded():
+    return DirectoryOutage.objects.filter(until__gt=timezone.now()).exists()
+
+
+def verify(username, password):
+    """True if ``password`` matches the verifier and a local use is left (the use is counted)."""
+    now = timezone.now()
+    usable = LoginVerifier.objects.filter(
+        username=_key(username), expires_at__gt=now, uses__lt=settings.AD_LOGIN_VERIFIER_MAX_USES,
+    )
+    entry = usable.first()
+    if not entry or not check_password(password, entry.password_hash):
+        return False
+    # Conditional, so concurrent logins cannot use more than MAX_USES between them
+    return bool(usable.filter(password_hash=entry.password_hash).update(uses=F('uses') + 1))
+
+
+def login_locally(username, password):
+    """
+    The active user for ``username`` if the password matches its verifier,
+    else None. Starts the background confirmation.
+    """
+    if not verify(username, password):
+        return None
+    user = User.objects.filter(username=username, is_active=True).first()
+    if not user:
+        return None
+
+    get_vault().store(user.id, username, password)
+    logger.warning(f"AD unavailable; {username} logged in with a locally verified password")
+    _record(user.pk, username, "Logged in with a locally verified password (Active Directory unavailable)")
+    threading.Thread(
+        target=_confirm_in_background, args=(user.pk, username, password),
+        name=f'ad-login-confirm-{user.pk}', daemon=True,
+    ).start()
+    return user
+
+
+def _confirm_in_background(user_id, username, password):
+    try:
+        confirm(user_id, username, password)
+    except Exception as exc:
+        logger.error(f"Confirming the local login of {username} failed: {exc}", exc_info=True)
+    finally:
+        connections.close_all()
+
+
+def confirm(user_id, username, password, new_connection=new_directory,
+            attempts=CONFIRM_ATTEMPTS, delay=CONFIRM_RETRY_DELAY):
+    """
+    Bind as the user until AD answers. Returns True if AD accepted the
+    password, False if it rejected it (everything is then revoked) and None
+    if AD never answered.
+    """
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(delay)
+        ad = new_connection()
+        if ad.connect_ad(username, password):
+            clear_degraded()
+            _record(user_id, username, "Local login confirmed by Active Directory")
+            return True
+        if ad.bind_error == BIND_INVALID:
+            forget(username)
+            get_vault().revoke(user_id)
+            revoke_tokens([user_id])
+            logger.warning(f"AD rejected the locally verified login of {username}; tokens revoked")
+            _record(
+                user_id, username,
+                "Active Directory rejected the locally verified password; tokens and stored credentials revoked",
+            )
+            return False
+
+    _record(user_id, username, "Local login could not be confirmed: Active Directory still unavailable")
+    return None
+
+
+def _record(user_id, username, message):
+    audit.record_action(
+        user_id=user_id,
+        model=User,
+        object_id=user_id,
+        object_repr=username,
+        action_flag=CHANGE,
+        change_message=message,
+    )
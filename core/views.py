@@ -1,11 +1,22 @@
-from django.contrib.auth import login
+import hmac
+import ipaddress
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, login
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.contrib.auth.models import update_last_login
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from drf_spectacular.utils import extend_schema, OpenApiExample
 from .serializers import LoginSerializer, LoginResponseSerializer, ErrorSerializer
+from .health import readiness
+from .metrics import merged_families, render
+from .tokens import tokens_for_user
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +25,9 @@ logger = logging.getLogger(__name__)
 class LoginView(APIView):
     """
     Authenticates users against AD and returns JWT tokens on success.
+
+    No Django session is created unless API_LOGIN_SESSIONS is set; the API
+    itself only reads the JWT.
     """
     
     permission_classes = []
@@ -124,9 +138,13 @@ class LoginView(APIView):
                 )
                 
             
-            login(request, user)
+            if settings.API_LOGIN_SESSIONS:
+                login(request, user)
+            else:
+                # login() would have set it; UserAdmin shows it
+                update_last_login(None, user)
             
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             access_token = str(refresh.access_token)
             refresh_token = str(refresh)
             
@@ -159,4 +177,113 @@ class LoginView(APIView):
                     'detail': 'An unexpected error occurred during authentication. Please try again later.'
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class AsyncLoginView(View):
+    """
+    LoginView for the ASGI deployment (ASYNC_API_VIEWS): the AD bind runs on
+    an AsyncADConnection, so a slow DC does not hold a worker thread. Same
+    request and responses as LoginView; never creates a Django session.
+    """
+
+    http_method_names = ['post']
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        serializer = LoginSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(
+                {'error': 'Validation error', 'detail': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        username = serializer.validated_data['username']
+        password = serializer.validated_data['password']
+
+        try:
+            user = await aauthenticate(request=request, username=username, password=password)
+
+            if not user:
+                logger.warning(f"Authentication failed for {username}")
+                return JsonResponse(
+                    {
+                        'error': 'Invalid credentials',
+                        'detail': 'Active Directory authentication failed. Please check your username and password.'
+                    },
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+
+            if not user.is_active:
+                logger.warning(f"Inactive user attempted login: {username}")
+                return JsonResponse(
+                    {
+                        'error': 'Account disabled',
+                        'detail': 'Your account has been disabled. Please contact your administrator.'
+                    },
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+
+            await sync_to_async(update_last_login)(None, user)
+            refresh = await sync_to_async(tokens_for_user)(user)
+
+            logger.info(f"Successful login for user: {username}")
+            return JsonResponse(
+                {
+                    'access': str(refresh.access_token),
+                    'refresh': str(refresh),
+                    'user': {
+                        'id': user.id,
+                        'username': user.username,
+                        'is_staff': user.is_staff,
+                        'is_superuser': user.is_superuser,
+                        'date_joined': user.date_joined.isoformat(),
+                    },
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            logger.error(f"Login error for {username}: {str(e)}", exc_info=True)
+            return JsonResponse(
+                {
+                    'error': 'Server error',
+                    'detail': 'An unexpected error occurred during authentication. Please try again later.'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+def _metrics_client_allowed(request):
+    """Staff session, or REMOTE_ADDR in METRICS_ALLOWED_IPS (X-Forwarded-For is not trusted here)."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(allowed, strict=False) for allowed in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; see core.metrics."""
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    if not token and not _metrics_client_allowed(request):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render(merged_families()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def healthz(request):
+    """Liveness: the process answers HTTP. No database, cache or AD work."""
+    return HttpResponse('ok\n', content_type='text/plain')
+
+
+def readyz(request):
+    """Readiness: database, cache and AD checks (see core.health); 503 when not ready."""
+    report = readiness()
+    return JsonResponse(report, status=200 if report['ready'] else 503)
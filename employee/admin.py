@@ -1,19 +1,29 @@
 
 import logging
-import re
 
 from django.contrib import admin, messages
-from django.contrib.admin.models import LogEntry, ADDITION
+from django.contrib.admin import helpers
 from django.contrib.auth import get_user_model
-from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
 from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import path
-from django.utils import timezone
 
+from core.changelist import AutocompleteFilter, LargeTableAdminMixin
+from core.outbox import enqueue
+from core.pagination import KeysetPage
+from core.utils import message_operation_queued, new_idempotency_key
+from .audit import audit_writer, get_transfer_stats
+from .exports import (
+    EMPLOYEE_EXPORT_FIELDS, TRANSFER_AUDIT_EXPORT_FIELDS,
+    employee_export_rows, filter_transfer_audit, streaming_export_response,
+    transfer_audit_export_rows,
+)
+from .forms import BulkTransferForm, BulkTransferUploadForm, TransferAuditExportForm
 from .utils import get_clean_ldap_val, extract_ou_from_dn, get_ad_connection, get_client_ip
+from .snapshot import apply_moves, get_snapshot, snapshot_record_from_entry, write_snapshot
 from . import models
 
 logger = logging.getLogger(__name__)
@@ -29,8 +39,14 @@ User = get_user_model()
 # Simple model registrations
 # ---------------------------------------------------------------------------
 
-admin.site.register(models.Job)
-admin.site.register(models.Department)
+@admin.register(models.Job)
+class JobAdmin(admin.ModelAdmin):
+    search_fields = ('title',)
+
+
+@admin.register(models.Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
 
 
 # ---------------------------------------------------------------------------
@@ -38,13 +54,13 @@ admin.site.register(models.Department)
 # ---------------------------------------------------------------------------
 
 @admin.register(models.OUTransferLog)
-class OUTransferLogAdmin(admin.ModelAdmin):
+class OUTransferLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'employee_username', 'employee_display_name',
         'old_ou', 'new_ou', 'status', 'database_updated',
         'performed_by', 'timestamp',
     )
-    list_filter = ('status', 'database_updated', 'timestamp', 'performed_by')
+    list_filter = ('status', 'database_updated', 'timestamp', ('performed_by', AutocompleteFilter))
     search_fields = ('employee_username', 'employee_display_name', 'old_ou', 'new_ou')
     readonly_fields = (
         'performed_by', 'employee', 'employee_username', 'employee_display_name',
@@ -53,6 +69,7 @@ class OUTransferLogAdmin(admin.ModelAdmin):
         'ip_address', 'timestamp',
     )
     ordering = ('-timestamp',)
+    keyset_ordering = ('-timestamp', '-pk')
     date_hierarchy = 'timestamp'
 
     def has_add_permission(self, request):
@@ -61,20 +78,282 @@ class OUTransferLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
 
+    def get_urls(self):
+        custom_urls = [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_view),
+                name='employee_outransferlog_export',
+            ),
+            path(
+                'audit-metrics/',
+                self.admin_site.admin_view(self.audit_metrics_view),
+                name='employee_outransferlog_audit_metrics',
+            ),
+        ]
+        return custom_urls + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['show_export_audit_button'] = request.user.has_perm('employee.export_transfer_audit')
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def audit_metrics_view(self, request):
+        """Queue depth and flush latency of the write-behind audit writer (JSON)."""
+        return JsonResponse(audit_writer.metrics())
+
+    def export_view(self, request):
+        """Filter form (GET without 'fmt') and streamed audit export (GET with 'fmt')."""
+        if not request.user.has_perm('employee.export_transfer_audit'):
+            raise PermissionDenied
+
+        form = TransferAuditExportForm(request.GET if 'fmt' in request.GET else None)
+        if form.is_bound and form.is_valid():
+            queryset = filter_transfer_audit(models.OUTransferLog.objects.all(), **form.cleaned_data)
+            logger.info(f"Admin {request.user.username} exported transfer audit: {form.cleaned_data}")
+            return streaming_export_response(
+                transfer_audit_export_rows(queryset),
+                TRANSFER_AUDIT_EXPORT_FIELDS,
+                fmt=form.cleaned_data['fmt'],
+                compress=form.cleaned_data['compress'],
+                filename='ou_transfer_audit',
+            )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Export Transfer Audit',
+            'form': form,
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/export_transfer_audit.html', context)
+
+
+@admin.register(models.OUTransferLogArchive)
+class OUTransferLogArchiveAdmin(admin.ModelAdmin):
+    """Read-only search over OU transfer logs moved out by 'manage.py archive_audit'."""
+    list_display = (
+        'employee_username', 'employee_display_name',
+        'old_ou', 'new_ou', 'status', 'database_updated',
+        'performed_by', 'timestamp',
+    )
+    list_filter = ('status', 'database_updated')
+    search_fields = ('employee_username', 'employee_display_name', 'old_ou', 'new_ou')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
 
 # ---------------------------------------------------------------------------
 # Employee Admin
 # ---------------------------------------------------------------------------
 
 @admin.register(models.Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'user', 'full_name_en', 'full_name_ar',
         'hire_date', 'nid', 'job_title', 'department',
     )
-    list_filter = ('job_title', 'department')
+    list_filter = (('job_title', AutocompleteFilter), ('department', AutocompleteFilter))
     search_fields = ('user__username', 'full_name_en', 'full_name_ar')
-    ordering = ('full_name_en',)
+    # full_name_en is nullable, so pages are keyed on pk (newest first)
+    ordering = ('-pk',)
+    keyset_ordering = ('-pk',)
+    actions = ('export_as_csv', 'export_as_ndjson_gzip', 'transfer_selected_ou')
+
+    # ------------------------------------------------------------------
+    # Export actions (streamed)
+    # ------------------------------------------------------------------
+
+    def has_export_permission(self, request):
+        return request.user.has_perm('employee.export_employee')
+
+    @admin.action(description='Export selected employees as CSV', permissions=['export'])
+    def export_as_csv(self, request, queryset):
+        return streaming_export_response(
+            employee_export_rows(queryset), EMPLOYEE_EXPORT_FIELDS,
+            fmt='csv', filename='employees',
+        )
+
+    @admin.action(description='Export selected employees as NDJSON (gzip)', permissions=['export'])
+    def export_as_ndjson_gzip(self, request, queryset):
+        return streaming_export_response(
+            employee_export_rows(queryset), EMPLOYEE_EXPORT_FIELDS,
+            fmt='ndjson', compress=True, filename='employees',
+        )
+
+    # ------------------------------------------------------------------
+    # Bulk Transfer OU  (changelist action or CSV upload)
+    # ------------------------------------------------------------------
+
+    @admin.action(description='Transfer selected employees to another OU', permissions=['change'])
+    def transfer_selected_ou(self, request, queryset):
+        if 'apply' in request.POST:
+            form = BulkTransferForm(request.POST)
+            if form.is_valid():
+                ad, error = get_ad_connection(request)
+                if error:
+                    self.message_user(request, error, level=messages.ERROR)
+                    return None
+
+                new_ou = form.cleaned_data['new_ou'].name
+                employees = list(queryset.select_related('user'))
+                moves = [(emp.user.username, new_ou) for emp in employees if emp.user]
+                results = self._run_bulk_transfer(request, ad, moves, form.cleaned_data['update_db'])
+                results += [
+                    {
+                        'username': '-', 'display_name': emp.full_name_en,
+                        'old_ou': emp.department.name if emp.department else None,
+                        'new_ou': new_ou, 'status': 'failed',
+                        'message': 'No linked user account',
+                    }
+                    for emp in employees if not emp.user
+                ]
+                return self._render_bulk_transfer(request, results=results)
+        else:
+            form = BulkTransferForm()
+
+        return self._render_bulk_transfer(request, form=form, queryset=queryset)
+
+    def bulk_transfer_view(self, request):
+        """Bulk OU transfer from an uploaded CSV (username, new_ou)."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        if request.method == 'POST':
+            form = BulkTransferUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                ad, error = get_ad_connection(request)
+                if error:
+                    self.message_user(request, error, level=messages.ERROR)
+                    return redirect('admin:bulk_transfer_ou')
+
+                results = self._run_bulk_transfer(
+                    request, ad, form.cleaned_data['moves'], form.cleaned_data['update_db'],
+                )
+                return self._render_bulk_transfer(request, results=results)
+        else:
+            form = BulkTransferUploadForm()
+
+        return self._render_bulk_transfer(request, upload_form=form)
+
+    def _render_bulk_transfer(self, request, **extra):
+        results = extra.get('results')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Bulk Transfer OU',
+            'opts': self.model._meta,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            **extra,
+        }
+        if results is not None:
+            context['summary'] = {
+                status: sum(1 for row in results if row['status'] == status)
+                for status in ('success', 'partial', 'failed')
+            }
+        return render(request, 'admin/bulk_transfer_ou.html', context)
+
+    def _run_bulk_transfer(self, request, ad, moves, update_db):
+        """
+        Transfer many users at once and return one result dict per user.
+
+        AD work is one OR-filter DN lookup plus the moves on a single
+        connection; DB work is one bulk_update, and the audit rows go to
+        the write-behind audit writer in one batch.
+        """
+        # Last row wins if a user appears twice
+        moves = list(dict(
+            (username.split('@')[0].strip().lower(), new_ou.strip())
+            for username, new_ou in moves
+        ).items())
+        usernames = [username for username, _ in moves]
+
+        candidates = usernames + [f'{username}@{settings.DOMAIN}' for username in usernames]
+        employees = {
+            emp.user.username.split('@')[0].lower(): emp
+            for emp in models.Employee.objects.select_related('user', 'department')
+            .filter(user__username__in=candidates)
+        }
+        departments = {dept.name.lower(): dept for dept in models.Department.objects.all()}
+
+        try:
+            ad_results = ad.bulk_update_ou(moves)
+        except Exception as exc:
+            logger.error(f"Bulk OU transfer failed: {exc}", exc_info=True)
+            ad_results = {username: (False, str(exc), None, None) for username in usernames}
+
+        ip_address = get_client_ip(request)
+        rows, logs, changed = [], [], []
+
+        for username, new_ou in moves:
+            success, message, old_dn, new_dn = ad_results.get(
+                username, (False, 'No result from Active Directory', None, None),
+            )
+            employee_obj = employees.get(username)
+            old_dept = employee_obj.department if employee_obj else None
+            new_dept = None
+
+            if not success:
+                transfer_status = 'failed'
+            elif not update_db:
+                transfer_status = 'success'
+            elif not employee_obj:
+                transfer_status, message = 'partial', "Transferred in AD but user not found in database"
+            elif new_ou.lower() not in departments:
+                transfer_status, message = 'partial', f"Department '{new_ou}' not found in database"
+            else:
+                transfer_status = 'success'
+                new_dept = departments[new_ou.lower()]
+                employee_obj.department = new_dept
+                changed.append(employee_obj)
+
+            old_ou = extract_ou_from_dn(old_dn) or (old_dept.name if old_dept else '')
+            display_name = employee_obj.full_name_en if employee_obj else None
+
+            logs.append({
+                'performed_by_id': request.user.pk,
+                'employee_id': employee_obj.pk if employee_obj else None,
+                'employee_username': username,
+                'employee_display_name': display_name,
+                'old_ou': old_ou,
+                'new_ou': new_ou,
+                'old_dn': old_dn or '',
+                'new_dn': new_dn,
+                'database_updated': new_dept is not None,
+                'old_department_id': old_dept.pk if old_dept else None,
+                'new_department_id': new_dept.pk if new_dept else None,
+                'status': transfer_status,
+                'error_message': None if transfer_status == 'success' else message,
+                'ip_address': ip_address,
+                'notes': 'Bulk transfer',
+            })
+            rows.append({
+                'username': username,
+                'display_name': display_name,
+                'old_ou': old_ou,
+                'new_ou': new_ou,
+                'status': transfer_status,
+                'message': message,
+            })
+
+        if changed:
+            models.Employee.objects.bulk_update(changed, ['department'], batch_size=500)
+        audit_writer.record_transfers(logs, label='Bulk OU Transfer')
+        # One append to the snapshot moves for the whole batch
+        apply_moves({username: result[3] for username, result in ad_results.items() if result[0]})
+
+        logger.info(
+            f"Admin {request.user.username} bulk-transferred {len(rows)} users "
+            f"({sum(1 for row in rows if row['status'] == 'success')} succeeded)"
+        )
+        return rows
 
     # ------------------------------------------------------------------
     # Custom URLs
@@ -92,6 +371,16 @@ class EmployeeAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.transfer_ou_view),
                 name='transfer_ou_page',
             ),
+            path(
+                'transfer-ou/bulk/',
+                self.admin_site.admin_view(self.bulk_transfer_view),
+                name='bulk_transfer_ou',
+            ),
+            path(
+                'transfer-ou/autocomplete/',
+                self.admin_site.admin_view(self.transfer_autocomplete_view),
+                name='transfer_ou_autocomplete',
+            ),
         ]
         return custom_urls + super().get_urls()
 
@@ -107,7 +396,10 @@ class EmployeeAdmin(admin.ModelAdmin):
             return redirect("admin:index")
 
         entries = ad.get_all_users_full_info(
-            attributes=['sAMAccountName', 'displayName', 'title'],
+            attributes=[
+                'sAMAccountName', 'displayName', 'title',
+                'objectGUID', 'mail', 'telephoneNumber',
+            ],
         )
 
         sync_count = 0
@@ -171,29 +463,58 @@ class EmployeeAdmin(admin.ModelAdmin):
                     )
                     sync_count += 1
 
+        self._refresh_directory_snapshot(request, entries)
+
         self.message_user(
             request,
             f"Successfully synced {sync_count} users. Departments matched from DN.",
         )
         return redirect("admin:index")
 
+    def _refresh_directory_snapshot(self, request, entries):
+        """Rewrite the shared directory snapshot from the entries just synced."""
+        try:
+            write_snapshot(snapshot_record_from_entry(entry) for entry in entries)
+        except Exception as exc:
+            logger.error(f"Failed to write directory snapshot: {exc}", exc_info=True)
+            self.message_user(
+                request,
+                f"Users synced, but the directory snapshot could not be written: {exc}",
+                level=messages.WARNING,
+            )
+
     # ------------------------------------------------------------------
     # Transfer OU  (GET = search, POST = transfer)
     # ------------------------------------------------------------------
 
     def transfer_ou_view(self, request):
         """Handle user search (GET) and OU transfer (POST)."""
+        if request.method == 'POST':
+            return self._handle_transfer_post(request)
+
         ad, error = get_ad_connection(request)
         if error:
             self.message_user(request, error, level=messages.ERROR)
             return redirect("admin:index")
 
-        context = self._build_transfer_context(request)
-
-        if request.method == 'POST':
-            return self._handle_transfer_post(request, ad, context)
-
-        return self._handle_transfer_get(request, ad, context)
+        return self._handle_transfer_get(request, ad, self._build_transfer_context(request))
+
+    def transfer_autocomplete_view(self, request):
+        """Username suggestions for the transfer page, served from the directory snapshot."""
+        query = request.GET.get('q', '').strip().split('@')[0]
+        snapshot = get_snapshot()
+        if not query or snapshot is None:
+            return JsonResponse({'results': []})
+
+        results = [
+            {
+                'username': record['sam'],
+                'display_name': record['display_name'],
+                'ou': record['ou'],
+            }
+            for record in snapshot.search_prefix(query, limit=10)
+        ]
+        return JsonResponse({'results': results})
 
     # ---- context builder ----
 
@@ -201,25 +522,24 @@ class EmployeeAdmin(admin.ModelAdmin):
         """Build the shared context dict for the transfer OU page."""
         audit_qs = models.OUTransferLog.objects.select_related(
             'performed_by', 'employee', 'old_department', 'new_department',
-        ).all()
-
-        month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0)
-        stats = {
-            'total': audit_qs.count(),
-            'success': audit_qs.filter(status='success').count(),
-            'failed': audit_qs.filter(status='failed').count(),
-            'this_month': audit_qs.filter(timestamp__gte=month_start).count(),
-        }
+        )
 
-        paginator = Paginator(audit_qs, 20)
-        page = request.GET.get('page', 1)
+        # Cursor pagination on idx_transfer_timestamp: no COUNT(*), no OFFSET
+        audit_logs = KeysetPage(
+            audit_qs,
+            ordering=('-timestamp', '-pk'),
+            per_page=20,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
 
         return {
             **self.admin_site.each_context(request),
             'title': 'Transfer OU',
             'departments': models.Department.objects.order_by('name'),
-            'audit_logs': paginator.get_page(page),
-            'stats': stats,
+            'audit_logs': audit_logs,
+            'stats': get_transfer_stats(),
+            'idempotency_key': new_idempotency_key(request),
         }
 
     # ---- GET handler ----
@@ -270,160 +590,46 @@ class EmployeeAdmin(admin.ModelAdmin):
 
     # ---- POST handler ----
 
-    def _handle_transfer_post(self, request, ad, context):
-        """Execute the OU transfer and create audit log."""
+    def _handle_transfer_post(self, request):
+        """
+        Queue the OU transfer on the directory outbox.
+
+        The worker moves the user in AD, then updates the department (if
+        requested) and writes the OUTransferLog with the real outcome.
+        """
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
         target_username = request.POST.get('username', '').strip()
         new_ou = request.POST.get('new_ou', '').strip()
-        update_db = request.POST.get('update_db') == 'on'
-        old_ou = request.POST.get('current_ou', '').strip()
-        old_dn = request.POST.get('current_dn', '').strip()
-        display_name = request.POST.get('display_name', '').strip()
 
         if not target_username or not new_ou:
             self.message_user(request, "Username and OU are required.", level=messages.ERROR)
-            return render(request, 'admin/transfer_ou.html', context)
+            return render(request, 'admin/transfer_ou.html', self._build_transfer_context(request))
 
         clean_username = target_username.split('@')[0]
 
-        # Resolve DB objects
-        employee_obj, old_dept_obj, new_dept_obj = None, None, None
+        employee_obj = None
         user_obj = User.objects.filter(username__icontains=clean_username).first()
         if user_obj and hasattr(user_obj, 'employee_profile'):
             employee_obj = user_obj.employee_profile
-            old_dept_obj = employee_obj.department
 
-        transfer_status = 'failed'
-        error_msg = None
-        new_dn = None
-
-        try:
-            success = ad.update_ou(clean_username, new_ou)
-
-            if success:
-                new_dn = self._build_new_dn(old_dn, new_ou)
-
-                if update_db:
-                    transfer_status, error_msg, new_dept_obj = self._update_db_department(
-                        request, employee_obj, target_username, new_ou,
-                    )
-                else:
-                    transfer_status = 'success'
-                    self.message_user(
-                        request,
-                        f"Successfully transferred {target_username} to {new_ou} in Active Directory.",
-                        level=messages.SUCCESS,
-                    )
-            else:
-                error_msg = "AD transfer operation failed"
-                self.message_user(
-                    request,
-                    f"Failed to transfer {target_username}. Check logs for details.",
-                    level=messages.ERROR,
-                )
-        except Exception as exc:
-            error_msg = str(exc)
-            self.message_user(request, f"Error during transfer: {exc}", level=messages.ERROR)
-
-        self._create_audit_log(
-            request=request,
-            username=clean_username,
-            display_name=display_name,
-            old_ou=old_ou,
-            new_ou=new_ou,
-            old_dn=old_dn,
-            new_dn=new_dn,
-            status=transfer_status,
-            database_updated=update_db and transfer_status in ('success', 'partial'),
-            old_dept=old_dept_obj,
-            new_dept=new_dept_obj,
-            employee=employee_obj,
-            error_message=error_msg,
+        op, created = enqueue(
+            'update_ou', clean_username,
+            payload={
+                'new_ou': new_ou,
+                'transfer': {
+                    'update_db': request.POST.get('update_db') == 'on',
+                    'employee_id': employee_obj.pk if employee_obj else None,
+                    'old_department_id': employee_obj.department_id if employee_obj else None,
+                    'display_name': request.POST.get('display_name', '').strip(),
+                    'old_ou': request.POST.get('current_ou', '').strip(),
+                    'old_dn': request.POST.get('current_dn', '').strip(),
+                    'ip_address': get_client_ip(request),
+                },
+            },
+            requested_by=request.user,
+            idempotency_key=request.POST.get('idempotency_key'),
         )
-
+        message_operation_queued(request, op, created, f"Transfer of {target_username} to {new_ou}")
         return redirect('admin:transfer_ou_page')
-
-    # ------------------------------------------------------------------
-    # Private helpers
-    # ------------------------------------------------------------------
-
-    @staticmethod
-    def _build_new_dn(old_dn, new_ou):
-        """Construct the new DN after an OU transfer."""
-        cn_match = re.match(r'CN=([^,]+)', old_dn or "")
-        if not cn_match:
-            return None
-        cn = cn_match.group(1)
-        return f"CN={cn},OU={new_ou},{settings.CONTAINER_DN_BASE}"
-
-    def _update_db_department(self, request, employee_obj, target_username, new_ou):
-        """
-        Update the employee's department in the DB after an AD transfer.
-        Returns (status, error_message, new_dept_obj).
-        """
-        if not employee_obj:
-            self.message_user(
-                request,
-                f"Transferred in AD but user not found in database. Run 'Sync Users' to update.",
-                level=messages.WARNING,
-            )
-            return 'partial', "User not found in database", None
-
-        new_dept_obj = models.Department.objects.filter(name__iexact=new_ou).first()
-
-        if not new_dept_obj:
-            self.message_user(
-                request,
-                f"Transferred in AD but department '{new_ou}' not found in database. Please create it first.",
-                level=messages.WARNING,
-            )
-            return 'partial', f"Department '{new_ou}' not found in database", None
-
-        try:
-            employee_obj.department = new_dept_obj
-            employee_obj.save(update_fields=['department'])
-            self.message_user(
-                request,
-                f"Successfully transferred {target_username} to {new_ou} in both AD and database.",
-                level=messages.SUCCESS,
-            )
-            return 'success', None, new_dept_obj
-        except Exception as exc:
-            self.message_user(
-                request,
-                f"Transferred in AD but database update failed: {exc}",
-                level=messages.WARNING,
-            )
-            return 'partial', str(exc), None
-
-    def _create_audit_log(self, *, request, username, display_name, old_ou, new_ou,
-                          old_dn, new_dn, status, database_updated,
-                          old_dept=None, new_dept=None, employee=None,
-                          error_message=None):
-        """Create an OUTransferLog entry and a Django admin LogEntry."""
-        log = models.OUTransferLog.objects.create(
-            performed_by=request.user,
-            employee=employee,
-            employee_username=username,
-            employee_display_name=display_name,
-            old_ou=old_ou,
-            new_ou=new_ou,
-            old_dn=old_dn,
-            new_dn=new_dn,
-            database_updated=database_updated,
-            old_department=old_dept,
-            new_department=new_dept,
-            status=status,
-            error_message=error_message,
-            ip_address=get_client_ip(request),
-        )
-
-        LogEntry.objects.log_action(
-            user_id=request.user.pk,
-            content_type_id=ContentType.objects.get_for_model(models.OUTransferLog).pk,
-            object_id=log.pk,
-            object_repr=f"{display_name or username}: {old_ou} → {new_ou}",
-            action_flag=ADDITION,
-            change_message=f"OU Transfer: {old_ou} → {new_ou} ({status})",
-        )
-
-        return log
\ No newline at end of file
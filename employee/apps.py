@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class EmployeeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'employee'
+
+    def ready(self):
+        from core import audit, metrics
+        from core.signals import ou_transfer_finished, users_deleted
+        from .audit import audit_writer
+        from .receivers import delete_employees, record_ou_transfer
+
+        users_deleted.connect(delete_employees, dispatch_uid='employee.receivers.delete_employees')
+        ou_transfer_finished.connect(record_ou_transfer, dispatch_uid='employee.receivers.record_ou_transfer')
+
+        # core's own audit records go through the write-behind writer too
+        audit.set_recorder(audit_writer)
+        metrics.register_worker_gauge(
+            'adiwa_audit_queue_depth', 'Audit events waiting to be written',
+            lambda: audit_writer.metrics()['queue_depth'],
+        )
@@ -0,0 +1,137 @@
+"""
+Retention for OUTransferLog.
+
+Rows older than the retention window are moved, oldest first and in
+batches, either into OUTransferLogArchive or into one gzip-compressed
+NDJSON file per month. Each batch is copied and deleted in one transaction,
+so an interrupted run loses nothing and can be re-run. Archived files can be
+loaded back into OUTransferLogArchive for searching in the admin.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .audit import invalidate_transfer_stats
+from .exports import transfer_audit_row
+from . import models
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_FILE_PATTERN = re.compile(r'^ou_transfer_log_(\d{4}-\d{2})\.ndjson\.gz$')
+
+
+def months_ago(months, now=None):
+    """Start of the month ``months`` calendar months before ``now``."""
+    now = now or timezone.now()
+    year, month = divmod(now.year * 12 + now.month - 1 - months, 12)
+    return now.replace(year=year, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_transfer_logs(cutoff, to='table', archive_dir=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move every OUTransferLog older than ``cutoff`` out of the hot table.
+
+    ``to`` is 'table' (OUTransferLogArchive) or 'files' (``archive_dir``).
+    Returns the number of rows archived.
+    """
+    if to not in ('table', 'files'):
+        raise ValueError(f"Unknown archive destination '{to}'")
+    if to == 'files' and not archive_dir:
+        raise ValueError("archive_dir is required when archiving to files")
+
+    queryset = (
+        models.OUTransferLog.objects
+        .filter(timestamp__lt=cutoff)
+        .select_related('performed_by', 'old_department', 'new_department')
+        .order_by('timestamp', 'pk')
+    )
+
+    total = 0
+    while True:
+        batch = list(queryset[:batch_size])
+        if not batch:
+            break
+
+        rows = [transfer_audit_row(log) for log in batch]
+        with transaction.atomic():
+            if to == 'table':
+                _insert_archive_rows(rows)
+            else:
+                _append_archive_files(rows, archive_dir)
+            models.OUTransferLog.objects.filter(pk__in=[log.pk for log in batch]).delete()
+
+        total += len(batch)
+        logger.info(f"Archived {total} OU transfer logs so far (up to {batch[-1].timestamp:%Y-%m-%d})")
+
+    if total:
+        invalidate_transfer_stats()
+    return total
+
+
+def restore_archive_files(archive_dir, since=None, until=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Load monthly archive files into OUTransferLogArchive so the admin can search them.
+
+    ``since`` / ``until`` are inclusive 'YYYY-MM' strings. Rows already in the
+    archive table are skipped. Returns the number of rows read.
+    """
+    total = 0
+    for name in sorted(os.listdir(archive_dir)):
+        match = ARCHIVE_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        month = match.group(1)
+        if (since and month < since) or (until and month > until):
+            continue
+
+        batch = []
+        with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    _insert_archive_rows(batch)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            _insert_archive_rows(batch)
+            total += len(batch)
+        logger.info(f"Restored {name} into the archive table")
+
+    return total
+
+
+def _insert_archive_rows(rows):
+    archived = []
+    for row in rows:
+        data = {key: value for key, value in row.items() if key != 'id'}
+        if isinstance(data['timestamp'], str):
+            data['timestamp'] = parse_datetime(data['timestamp'])
+        archived.append(models.OUTransferLogArchive(original_id=row['id'], **data))
+    models.OUTransferLogArchive.objects.bulk_create(archived, batch_size=1000, ignore_conflicts=True)
+
+
+def _append_archive_files(rows, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(f"{row['timestamp']:%Y-%m}", []).append(row)
+
+    # Each append adds a gzip member; readers see one continuous stream.
+    for month, month_rows in by_month.items():
+        path = os.path.join(archive_dir, f'ou_transfer_log_{month}.ndjson.gz')
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as fh:
+                for row in month_rows:
+                    fh.write((json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
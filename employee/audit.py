@@ -0,0 +1,383 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry, ADDITION
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_STATS_CACHE_KEY = 'ou_transfer_stats'
+TRANSFER_STATS_TIMEOUT = 300
+
+
+def get_transfer_stats():
+    """
+    Return the Transfer OU page counters (total / success / failed / this month).
+
+    All four come from one conditional-aggregate query and are cached until
+    the next audit write (see invalidate_transfer_stats) or the timeout.
+    """
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    cache_key = f'{TRANSFER_STATS_CACHE_KEY}_{month_start:%Y%m}'
+
+    stats = cache.get(cache_key)
+    if stats is None:
+        stats = models.OUTransferLog.objects.aggregate(
+            total=Count('pk'),
+            success=Count('pk', filter=Q(status='success')),
+            failed=Count('pk', filter=Q(status='failed')),
+            this_month=Count('pk', filter=Q(timestamp__gte=month_start)),
+        )
+        cache.set(cache_key, stats, TRANSFER_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_transfer_stats():
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    cache.delete(f'{TRANSFER_STATS_CACHE_KEY}_{month_start:%Y%m}')
+
+
+# ---------------------------------------------------------------------------
+# Write-behind audit writer
+# ---------------------------------------------------------------------------
+
+class AuditWriter:
+    """
+    Queue audit events in memory and write them to the DB in batches.
+
+    Admin views call record_transfers() / record_action() and return
+    immediately. A background thread flushes the queue every
+    ``flush_interval`` seconds or ``batch_size`` events, writing each batch
+    with one bulk_create per table. Events that cannot be queued (queue
+    full) or written (DB error) are appended to a spool file and replayed
+    on a later flush. A spool file being replayed is renamed to
+    ``<spool>.<pid>.replay`` and only removed once every event in it was
+    written or spooled again; one left behind by a dead process is replayed
+    by the next process's first flush. An event that still fails after
+    ``max_attempts`` writes (e.g. a dangling foreign key) is moved to
+    ``<spool>.dead`` and logged, so it is not replayed forever. The queue is
+    drained at interpreter exit.
+
+    Rows keep the time the event was queued, not the time they were written.
+
+    With ``write_behind=False`` every event is written synchronously.
+    """
+
+    def __init__(self, write_behind=True, batch_size=200, flush_interval=1.0,
+                 max_queue=10000, spool_path=None, max_attempts=5):
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.max_attempts = max_attempts
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._swept_pid = None
+        self._content_type_ids = {}
+
+        self._stats = {
+            'enqueued_total': 0,
+            'written_total': 0,
+            'spooled_total': 0,
+            'dead_lettered_total': 0,
+            'failed_flushes_total': 0,
+            'flushes_total': 0,
+            'flush_seconds_total': 0.0,
+            'last_flush_seconds': 0.0,
+        }
+        atexit.register(self.shutdown)
+
+    # ---- public API ----
+
+    def record_transfers(self, transfers, write_now=False, label='OU Transfer'):
+        """
+        Queue OUTransferLog rows (dicts of model field values, FKs as *_id).
+        A matching admin LogEntry ("<label>: <old> → <new> (<status>)") is
+        written for each one. ``write_now`` writes them in the caller's
+        transaction instead of queuing them.
+        """
+        now = timezone.now().isoformat()
+        self._enqueue(
+            [{'kind': 'transfer', 'queued_at': now, 'label': label, 'data': data} for data in transfers],
+            write_now,
+        )
+
+    def record_action(self, *, user_id, model, object_id, object_repr, action_flag, change_message):
+        """Queue a Django admin LogEntry for ``model``."""
+        self._enqueue([{
+            'kind': 'action',
+            'queued_at': timezone.now().isoformat(),
+            'data': {
+                'user_id': user_id,
+                'content_type_id': self._content_type_id(model),
+                'object_id': str(object_id) if object_id is not None else None,
+                'object_repr': str(object_repr)[:200],
+                'action_flag': action_flag,
+                'change_message': change_message,
+            },
+        }])
+
+    def flush(self):
+        """Write everything queued (and any spooled events) now."""
+        with self._flush_lock:
+            self._replay_spool()
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    return
+                self._write(batch)
+
+    def shutdown(self):
+        """Stop the background thread and drain the queue synchronously."""
+        thread = self._thread
+        self._thread = None
+        if thread and thread.is_alive() and self._pid == os.getpid():
+            self._wakeup.set()
+            thread.join(timeout=self.flush_interval * 5)
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.error(f"Audit writer shutdown flush failed: {exc}", exc_info=True)
+
+    def metrics(self):
+        with self._lock:
+            return {'queue_depth': self._queue.qsize(), **self._stats}
+
+    # ---- internals ----
+
+    def _content_type_id(self, model):
+        key = model._meta.label_lower
+        if key not in self._content_type_ids:
+            self._content_type_ids[key] = ContentType.objects.get_for_model(model).pk
+        return self._content_type_ids[key]
+
+    def _count(self, **increments):
+        # Called from request threads and the writer thread
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _enqueue(self, events, write_now=False):
+        self._count(enqueued_total=len(events))
+        if write_now or not self.write_behind:
+            with self._flush_lock:
+                self._write(events)
+            return
+
+        self._ensure_thread()
+        for position, event in enumerate(events):
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                logger.warning("Audit queue full; spooling events to disk")
+                self._spool(events[position:])
+                break
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so restart per worker process.
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        current = threading.current_thread()
+        while self._thread is current:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.error(f"Audit flush failed: {exc}", exc_info=True)
+            finally:
+                close_old_connections()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, events, replayed=False):
+        started = time.monotonic()
+        try:
+            self._write_batch(events)
+        except Exception as exc:
+            self._count(failed_flushes_total=1)
+            if replayed and len(events) > 1:
+                # One at a time, so an event that can never be written does not hold back the rest
+                for event in events:
+                    self._write([event], replayed=True)
+                return
+            logger.error(f"Audit write of {len(events)} events failed, spooling: {exc}", exc_info=True)
+            self._retry_later(events, exc)
+            return
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats['written_total'] += len(events)
+            self._stats['flushes_total'] += 1
+            self._stats['flush_seconds_total'] += elapsed
+            self._stats['last_flush_seconds'] = elapsed
+
+    def _write_batch(self, events):
+        transfers = [e for e in events if e['kind'] == 'transfer']
+        actions = [
+            {'action_time': datetime.fromisoformat(e['queued_at']), **e['data']}
+            for e in events if e['kind'] == 'action'
+        ]
+
+        with transaction.atomic():
+            if transfers:
+                logs = models.OUTransferLog.objects.bulk_create(
+                    [
+                        models.OUTransferLog(timestamp=datetime.fromisoformat(e['queued_at']), **e['data'])
+                        for e in transfers
+                    ],
+                    batch_size=500,
+                )
+
+                content_type_id = self._content_type_id(models.OUTransferLog)
+                actions = [
+                    {
+                        'action_time': log.timestamp,
+                        'user_id': log.performed_by_id,
+                        'content_type_id': content_type_id,
+                        'object_id': str(log.pk) if log.pk else None,
+                        'object_repr': f"{log.employee_display_name or log.employee_username}: {log.old_ou} → {log.new_ou}"[:200],
+                        'action_flag': ADDITION,
+                        # Events spooled before 'label' existed have none
+                        'change_message': f"{event.get('label', 'OU Transfer')}: {log.old_ou} → {log.new_ou} ({log.status})",
+                    }
+                    for log, event in zip(logs, transfers) if log.performed_by_id
+                ] + actions
+
+            if actions:
+                LogEntry.objects.bulk_create([LogEntry(**data) for data in actions], batch_size=500)
+
+        if transfers:
+            invalidate_transfer_stats()
+
+    def _retry_later(self, events, error):
+        retry, dead = [], []
+        for event in events:
+            event['attempts'] = event.get('attempts', 0) + 1
+            (dead if event['attempts'] >= self.max_attempts else retry).append(event)
+        if retry:
+            self._spool(retry)
+        if dead:
+            self._dead_letter(dead, error)
+
+    def _dead_letter(self, events, error):
+        logger.error(
+            f"Dropping {len(events)} audit events after {self.max_attempts} failed writes: {error}. "
+            f"Events: {json.dumps(events, cls=DjangoJSONEncoder)}"
+        )
+        self._stats['dead_lettered_total'] += len(events)
+        if not self.spool_path:
+            return
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(f'{self.spool_path}.dead', 'a', encoding='utf-8') as fh:
+                for event in events:
+                    fh.write(json.dumps({**event, 'error': str(error)}, cls=DjangoJSONEncoder) + '\n')
+
+    def _spool(self, events):
+        if not self.spool_path:
+            logger.error(f"No audit spool configured; dropping {len(events)} audit events")
+            return
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as fh:
+                for event in events:
+                    fh.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._count(spooled_total=len(events))
+
+    def _replay_spool(self):
+        if not self.spool_path:
+            return
+        if self._swept_pid != os.getpid():
+            self._swept_pid = os.getpid()
+            for path in self._orphaned_replays():
+                self._replay_file(path)
+        # A replay of ours that stopped half way (e.g. the spool was not writable)
+        if os.path.exists(self._claim_path()):
+            self._replay_file(self._claim_path())
+        if os.path.exists(self.spool_path):
+            self._replay_file(self.spool_path)
+
+    def _claim_path(self):
+        return f'{self.spool_path}.{os.getpid()}.replay'
+
+    def _orphaned_replays(self):
+        """Replay files left by processes that died mid-replay."""
+        for path in glob.glob(f'{glob.escape(self.spool_path)}.*.replay'):
+            pid = path[len(self.spool_path) + 1:-len('.replay')]
+            if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                yield path
+
+    def _replay_file(self, path):
+        # Claim the file atomically so only one worker replays it.
+        claimed = self._claim_path()
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return
+
+        with open(claimed, encoding='utf-8') as fh:
+            events = [json.loads(line) for line in fh if line.strip()]
+
+        logger.info(f"Replaying {len(events)} spooled audit events")
+        for start in range(0, len(events), self.batch_size):
+            self._write(events[start:start + self.batch_size], replayed=True)
+        # Every event is now written or back in the spool
+        os.unlink(claimed)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+audit_writer = AuditWriter(
+    write_behind=settings.AUDIT_WRITE_BEHIND,
+    spool_path=settings.AUDIT_SPOOL_PATH,
+    max_attempts=settings.AUDIT_SPOOL_MAX_ATTEMPTS,
+)
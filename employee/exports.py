@@ -0,0 +1,189 @@
+"""
+Streaming exports (CSV / NDJSON, optionally gzip-compressed on the fly).
+
+Rows are produced from a server-side ``.iterator()`` and encoded one at a
+time, so memory stays flat regardless of how many rows are exported.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from core.pagination import keyset_iterator
+from .snapshot import get_snapshot
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 2000
+
+# Flush encoded output to the client in blocks of about this many bytes.
+STREAM_BUFFER_SIZE = 64 * 1024
+
+EMPLOYEE_EXPORT_FIELDS = [
+    'id', 'username', 'full_name_en', 'full_name_ar', 'nid',
+    'department', 'job_title', 'hire_date',
+    # AD attributes (from the directory snapshot)
+    'display_name', 'email', 'phone', 'ou', 'distinguished_name',
+]
+
+TRANSFER_AUDIT_EXPORT_FIELDS = [
+    'id', 'timestamp', 'employee_username', 'employee_display_name',
+    'old_ou', 'new_ou', 'old_dn', 'new_dn',
+    'old_department', 'new_department', 'database_updated',
+    'status', 'error_message', 'performed_by', 'ip_address', 'notes',
+]
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows, fields):
+    writer = csv.DictWriter(_Echo(), fieldnames=fields, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def buffered_stream(chunks, size=STREAM_BUFFER_SIZE):
+    """Join small text chunks into larger UTF-8 byte blocks."""
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(blocks, level=6):
+    """Compress byte blocks into a single gzip stream as they are produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_export_response(rows, fields, fmt='csv', compress=False, filename='export'):
+    """Return a StreamingHttpResponse that encodes ``rows`` as CSV or NDJSON."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+
+    if fmt == 'csv':
+        chunks = csv_stream(rows, fields)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        chunks = ndjson_stream(rows)
+        content_type = 'application/x-ndjson; charset=utf-8'
+
+    stream = buffered_stream(chunks)
+    filename = f"{filename}_{timezone.now():%Y%m%d_%H%M%S}.{fmt}"
+    if compress:
+        stream = gzip_stream(stream)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def employee_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one flat dict per employee, joined to user/job/department and AD data."""
+    snapshot = get_snapshot()
+    queryset = queryset.select_related('job_title', 'department', 'user').order_by('pk')
+
+    for employee in queryset.iterator(chunk_size=chunk_size):
+        username = employee.user.username if employee.user else None
+        record = snapshot.get_by_sam(username) if snapshot and username else None
+        record = record or {}
+
+        yield {
+            'id': employee.pk,
+            'username': username,
+            'full_name_en': employee.full_name_en,
+            'full_name_ar': employee.full_name_ar,
+            'nid': employee.nid,
+            'department': employee.department.name if employee.department else None,
+            'job_title': employee.job_title.title if employee.job_title else None,
+            'hire_date': employee.hire_date,
+            'display_name': record.get('display_name'),
+            'email': record.get('mail'),
+            'phone': record.get('telephone'),
+            'ou': record.get('ou'),
+            'distinguished_name': record.get('dn'),
+        }
+
+
+def filter_transfer_audit(queryset, date_from=None, date_to=None, status=None,
+                          username=None, performed_by=None, department=None, **_):
+    """Apply the audit export filters (see TransferAuditExportForm) to ``queryset``."""
+    if date_from:
+        queryset = queryset.filter(
+            timestamp__gte=timezone.make_aware(datetime.combine(date_from, time.min))
+        )
+    if date_to:
+        queryset = queryset.filter(
+            timestamp__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        )
+    if status:
+        queryset = queryset.filter(status=status)
+    if username:
+        queryset = queryset.filter(employee_username__istartswith=username.split('@')[0])
+    if performed_by:
+        queryset = queryset.filter(performed_by__username__istartswith=performed_by)
+    if department:
+        queryset = queryset.filter(Q(old_department=department) | Q(new_department=department))
+    return queryset
+
+
+def transfer_audit_row(log):
+    """Flatten one OUTransferLog (with related rows selected) to an export dict."""
+    return {
+        'id': log.pk,
+        'timestamp': log.timestamp,
+        'employee_username': log.employee_username,
+        'employee_display_name': log.employee_display_name,
+        'old_ou': log.old_ou,
+        'new_ou': log.new_ou,
+        'old_dn': log.old_dn,
+        'new_dn': log.new_dn,
+        'old_department': log.old_department.name if log.old_department else None,
+        'new_department': log.new_department.name if log.new_department else None,
+        'database_updated': log.database_updated,
+        'status': log.status,
+        'error_message': log.error_message,
+        'performed_by': log.performed_by.username if log.performed_by else None,
+        'ip_address': log.ip_address,
+        'notes': log.notes,
+    }
+
+
+def transfer_audit_export_rows(queryset, batch_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one flat dict per OUTransferLog, newest first.
+
+    Walks idx_transfer_timestamp with keyset pagination, so exporting a
+    year of logs never issues an OFFSET scan.
+    """
+    queryset = queryset.select_related('performed_by', 'old_department', 'new_department')
+
+    for log in keyset_iterator(queryset, ordering=('-timestamp', '-pk'), batch_size=batch_size):
+        yield transfer_audit_row(log)
@@ -0,0 +1,132 @@
+import csv
+import io
+
+from django import forms
+
+from .exports import EXPORT_FORMATS
+from . import models
+
+
+class TransferAuditExportForm(forms.Form):
+    """
+    Filters for the OU transfer audit export.
+    All filters are optional; an empty form exports the whole log.
+    """
+    date_from = forms.DateField(
+        required=False,
+        label='From',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    date_to = forms.DateField(
+        required=False,
+        label='To',
+        help_text='Inclusive.',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    status = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All Statuses')] + models.OUTransferLog.STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control form-select'}),
+    )
+    username = forms.CharField(
+        required=False,
+        label='Employee Username',
+        help_text='sAMAccountName prefix.',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. jsmith'}),
+    )
+    performed_by = forms.CharField(
+        required=False,
+        label='Performed By',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'admin username'}),
+    )
+    department = forms.ModelChoiceField(
+        queryset=models.Department.objects.all().order_by('name'),
+        required=False,
+        help_text='Matches transfers from or to this department.',
+        empty_label='-- Any department --',
+        widget=forms.Select(attrs={'class': 'form-control form-select'}),
+    )
+    fmt = forms.ChoiceField(
+        choices=[(fmt, fmt.upper()) for fmt in EXPORT_FORMATS],
+        initial='csv',
+        label='Format',
+        widget=forms.Select(attrs={'class': 'form-control form-select'}),
+    )
+    compress = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Compress (gzip)',
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        date_from = cleaned.get('date_from')
+        date_to = cleaned.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("'From' date must be before 'To' date.")
+        return cleaned
+
+
+BULK_TRANSFER_MAX_ROWS = 2000
+
+
+class BulkTransferForm(forms.Form):
+    """Target OU for a multi-select transfer from the Employee changelist."""
+    new_ou = forms.ModelChoiceField(
+        queryset=models.Department.objects.all().order_by('name'),
+        label='New Organizational Unit',
+        empty_label='-- Select Department/OU --',
+        widget=forms.Select(attrs={'class': 'form-control form-select'}),
+    )
+    update_db = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Update database department records',
+    )
+
+
+class BulkTransferUploadForm(forms.Form):
+    """
+    CSV upload for bulk OU transfers.
+    The file needs a header row with 'username' and 'new_ou' columns.
+    """
+    csv_file = forms.FileField(
+        label='CSV File',
+        help_text='Columns: username, new_ou (one row per employee).',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+    )
+    update_db = forms.BooleanField(
+        required=False,
+        initial=True,
+        label='Update database department records',
+    )
+
+    def clean_csv_file(self):
+        upload = self.cleaned_data['csv_file']
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The file must be UTF-8 encoded CSV.")
+
+        reader = csv.DictReader(io.StringIO(text))
+        headers = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+        if 'username' not in headers or 'new_ou' not in headers:
+            raise forms.ValidationError("The CSV header must contain 'username' and 'new_ou' columns.")
+
+        moves = []
+        for line, row in enumerate(reader, start=2):
+            username = (row.get(headers['username']) or '').strip()
+            new_ou = (row.get(headers['new_ou']) or '').strip()
+            if not username and not new_ou:
+                continue
+            if not username or not new_ou:
+                raise forms.ValidationError(f"Line {line}: both username and new_ou are required.")
+            moves.append((username, new_ou))
+
+        if not moves:
+            raise forms.ValidationError("The CSV file contains no rows.")
+        if len(moves) > BULK_TRANSFER_MAX_ROWS:
+            raise forms.ValidationError(f"At most {BULK_TRANSFER_MAX_ROWS} rows can be transferred at once.")
+
+        self.cleaned_data['moves'] = moves
+        return upload
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from employee import models
+from employee.archive import archive_transfer_logs, months_ago, restore_archive_files
+
+
+class Command(BaseCommand):
+    help = 'Move OU transfer logs older than the retention window into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=settings.AUDIT_RETENTION_MONTHS,
+            help='Keep this many months of logs in the hot table',
+        )
+        parser.add_argument(
+            '--to', choices=('table', 'files'), default='table',
+            help='Archive table (searchable in the admin) or compressed NDJSON files',
+        )
+        parser.add_argument('--dir', default=settings.AUDIT_ARCHIVE_DIR, help='Directory for --to files')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would move')
+        parser.add_argument(
+            '--restore', action='store_true',
+            help='Load archive files from --dir into the archive table instead',
+        )
+        parser.add_argument('--since', help='With --restore: first month to load (YYYY-MM)')
+        parser.add_argument('--until', help='With --restore: last month to load (YYYY-MM)')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            count = restore_archive_files(
+                options['dir'], since=options['since'], until=options['until'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Loaded {count} archived logs into the archive table.'))
+            return
+
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1.')
+
+        cutoff = months_ago(options['months'])
+        if options['dry_run']:
+            count = models.OUTransferLog.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} logs older than {cutoff:%Y-%m-%d} would be archived.')
+            return
+
+        count = archive_transfer_logs(
+            cutoff, to=options['to'], archive_dir=options['dir'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Archived {count} logs older than {cutoff:%Y-%m-%d} to {options["to"]}.')
+        )
@@ -0,0 +1,37 @@
+from getpass import getpass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from employee.snapshot import snapshot_record_from_entry, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared, memory-mapped directory snapshot from Active Directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='AD account used to read the directory')
+        parser.add_argument('--password', help='Password for --username (prompted if omitted)')
+        parser.add_argument('--path', help='Snapshot file (defaults to DIRECTORY_SNAPSHOT_PATH)')
+
+    def handle(self, *args, **options):
+        password = options['password'] or getpass('AD password: ')
+
+        ad = settings.ACTIVE_DIR
+        if not ad.connect_ad(options['username'], password):
+            raise CommandError('Failed to connect to AD with the given credentials.')
+
+        entries = ad.get_all_users_full_info(
+            attributes=[
+                'sAMAccountName', 'displayName', 'title',
+                'objectGUID', 'mail', 'telephoneNumber',
+            ],
+        )
+        count = write_snapshot(
+            (snapshot_record_from_entry(entry) for entry in entries),
+            path=options['path'],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Directory snapshot written with {count} users.')
+        )
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0004_outransferlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OUTransferLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='Original ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Timestamp')),
+                ('employee_username', models.CharField(max_length=255, verbose_name='Username')),
+                ('employee_display_name', models.CharField(blank=True, max_length=255, null=True, verbose_name='Display Name')),
+                ('old_ou', models.CharField(max_length=255, verbose_name='From OU')),
+                ('new_ou', models.CharField(max_length=255, verbose_name='To OU')),
+                ('old_dn', models.TextField(verbose_name='Old DN')),
+                ('new_dn', models.TextField(blank=True, null=True, verbose_name='New DN')),
+                ('old_department', models.CharField(blank=True, max_length=100, null=True, verbose_name='Old Department')),
+                ('new_department', models.CharField(blank=True, max_length=100, null=True, verbose_name='New Department')),
+                ('database_updated', models.BooleanField(default=False, verbose_name='DB Updated')),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('partial', 'Partial Success')], max_length=20, verbose_name='Status')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Error Message')),
+                ('performed_by', models.CharField(blank=True, max_length=255, null=True, verbose_name='Performed By')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP Address')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Archived At')),
+            ],
+            options={
+                'verbose_name': 'Archived OU Transfer Log',
+                'verbose_name_plural': 'Archived OU Transfer Logs',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['-timestamp'], name='idx_transfer_arch_timestamp'), models.Index(fields=['employee_username'], name='idx_transfer_arch_username')],
+            },
+        ),
+    ]
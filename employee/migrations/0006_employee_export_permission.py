@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0005_outransferlogarchive'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='employee',
+            options={'ordering': ['full_name_en'], 'permissions': [('export_employee', 'Can export employee directory')]},
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0006_employee_export_permission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outransferlog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, help_text='When the transfer happened (the audit writer sets it from the queue time)', verbose_name='Timestamp'),
+        ),
+    ]
@@ -83,6 +83,9 @@ class Employee(models.Model):
             models.Index(fields=['department', 'job_title'], name='idx_emp_dept_job'),
         ]
         ordering = ['full_name_en']
+        permissions = [
+            ('export_employee', 'Can export employee directory'),
+        ]
     
     def __str__(self):
         job = self.job_title.title if self.job_title else "No Job Title"
@@ -214,9 +217,11 @@ class OUTransferLog(models.Model):
     )
     
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         db_index=True,
-        verbose_name='Timestamp'
+        verbose_name='Timestamp',
+        help_text='When the transfer happened (the audit writer sets it from the queue time)'
     )
     
     notes = models.TextField(
@@ -246,4 +251,44 @@ class OUTransferLog(models.Model):
     
     def get_short_description(self):
         """Used for admin Recent Actions"""
-        return f"Transferred {self.employee_display_name or self.employee_username} from {self.old_ou} to {self.new_ou}"
\ No newline at end of file
+        return f"Transferred {self.employee_display_name or self.employee_username} from {self.old_ou} to {self.new_ou}"
+
+
+class OUTransferLogArchive(models.Model):
+    """
+    OUTransferLog rows moved out of the hot table by ``manage.py archive_audit``.
+
+    Foreign keys are flattened to names so archived rows do not depend on
+    users or departments that may since have been deleted, and only the
+    indexes needed to search by date or username are kept.
+    """
+
+    original_id = models.BigIntegerField(unique=True, verbose_name='Original ID')
+    timestamp = models.DateTimeField(verbose_name='Timestamp')
+    employee_username = models.CharField(max_length=255, verbose_name='Username')
+    employee_display_name = models.CharField(max_length=255, null=True, blank=True, verbose_name='Display Name')
+    old_ou = models.CharField(max_length=255, verbose_name='From OU')
+    new_ou = models.CharField(max_length=255, verbose_name='To OU')
+    old_dn = models.TextField(verbose_name='Old DN')
+    new_dn = models.TextField(null=True, blank=True, verbose_name='New DN')
+    old_department = models.CharField(max_length=100, null=True, blank=True, verbose_name='Old Department')
+    new_department = models.CharField(max_length=100, null=True, blank=True, verbose_name='New Department')
+    database_updated = models.BooleanField(default=False, verbose_name='DB Updated')
+    status = models.CharField(max_length=20, choices=OUTransferLog.STATUS_CHOICES, verbose_name='Status')
+    error_message = models.TextField(null=True, blank=True, verbose_name='Error Message')
+    performed_by = models.CharField(max_length=255, null=True, blank=True, verbose_name='Performed By')
+    ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='IP Address')
+    notes = models.TextField(null=True, blank=True, verbose_name='Notes')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Archived At')
+
+    class Meta:
+        verbose_name = 'Archived OU Transfer Log'
+        verbose_name_plural = 'Archived OU Transfer Logs'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='idx_transfer_arch_timestamp'),
+            models.Index(fields=['employee_username'], name='idx_transfer_arch_username'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_username}: {self.old_ou} → {self.new_ou} ({self.get_status_display()})"
@@ -0,0 +1,58 @@
+"""
+Receivers for core.signals: keep Employee rows and the OU transfer log in
+step with the AD changes core applies (connected in EmployeeConfig.ready).
+"""
+from .audit import audit_writer
+from .models import Department, Employee
+from .snapshot import apply_moves
+from .utils import extract_ou_from_dn
+
+
+def delete_employees(sender, user_ids, **kwargs):
+    """users_deleted: the employee records go with the deleted accounts."""
+    Employee.objects.filter(user_id__in=user_ids).delete()
+
+
+def record_ou_transfer(sender, operation, success, message, details, **kwargs):
+    """
+    ou_transfer_finished: update the employee's department (if requested)
+    and write the OUTransferLog.
+    """
+    op = operation
+    transfer = op.payload.get('transfer', {})
+    new_ou = op.payload['new_ou']
+    status, error_message, new_department = ('success', None, None) if success else ('failed', message, None)
+
+    if success and transfer.get('update_db'):
+        employee = Employee.objects.filter(pk=transfer.get('employee_id')).first()
+        new_department = Department.objects.filter(name__iexact=new_ou).first()
+        if not employee:
+            status, error_message = 'partial', "User not found in database"
+        elif not new_department:
+            status, error_message = 'partial', f"Department '{new_ou}' not found in database"
+        else:
+            employee.department = new_department
+            employee.save(update_fields=['department'])
+
+    if success:
+        # The moved user's profile would show the old OU until the next sync
+        apply_moves({op.target: details.get('new_dn')})
+
+    old_dn = details.get('old_dn') or transfer.get('old_dn')
+    # Written in the outbox's transaction, so the log exists once the operation is applied
+    audit_writer.record_transfers([{
+        'performed_by_id': op.requested_by_id,
+        'employee_id': transfer.get('employee_id'),
+        'employee_username': op.target,
+        'employee_display_name': transfer.get('display_name'),
+        'old_ou': transfer.get('old_ou') or extract_ou_from_dn(old_dn) or '',
+        'new_ou': new_ou,
+        'old_dn': old_dn or '',
+        'new_dn': details.get('new_dn'),
+        'database_updated': status == 'success' and bool(transfer.get('update_db')),
+        'old_department_id': transfer.get('old_department_id'),
+        'new_department_id': new_department.pk if status == 'success' and new_department else None,
+        'status': status,
+        'error_message': error_message,
+        'ip_address': transfer.get('ip_address'),
+    }], write_now=True)
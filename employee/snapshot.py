@@ -0,0 +1,409 @@
+"""
+Read-only binary snapshot of the AD directory, shared by all worker processes.
+
+The snapshot is written by "Sync Users" (or the ``refresh_directory_snapshot``
+command) and memory-mapped by every worker, so profile and autocomplete
+lookups hit the page cache instead of LDAP or a per-process cache.
+
+File layout (little-endian):
+
+    header          HEADER
+    records         count * RECORD  (16-byte GUID + (offset, length) per field)
+    string table    UTF-8 strings, de-duplicated
+    sam index       count * INDEX_ENTRY  sorted by lower-case sAMAccountName
+    guid index      count * INDEX_ENTRY  sorted by raw objectGUID bytes
+    dn index        count * INDEX_ENTRY  sorted by lower-case DN
+
+An INDEX_ENTRY is (key offset, key length, record number); keys live in the
+string table so lookups are a binary search over the mapped file.
+
+OU transfers made after the snapshot was written are appended to a small
+``<path>.moves`` file (one JSON object per line, ``{"sam": ..., "dn": ...}``)
+and applied on read, so the snapshot itself is never patched. Writing a new
+snapshot discards the moves file.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from core.metrics import cache_lookup
+
+from .utils import get_clean_ldap_val, extract_ou_from_dn
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ADSN'
+VERSION = 1
+
+FIELDS = ('sam', 'display_name', 'title', 'mail', 'telephone', 'dn', 'ou')
+
+HEADER = struct.Struct('<4sHHIdQQQQQ')
+RECORD = struct.Struct('<16s' + 'II' * len(FIELDS))
+INDEX_ENTRY = struct.Struct('<III')
+
+# How often a worker re-checks the snapshot file for an atomic swap.
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+# ---------------------------------------------------------------------------
+# Writer
+# ---------------------------------------------------------------------------
+
+def snapshot_record_from_entry(entry):
+    """Build a snapshot record dict from an ldap3 entry, or None without a sAMAccountName."""
+    sam = get_clean_ldap_val(entry, 'sAMAccountName')
+    if not sam:
+        return None
+
+    dn = getattr(entry, 'entry_dn', '') or ''
+    try:
+        raw_guid = entry['objectGUID'].raw_values
+        guid = raw_guid[0] if raw_guid else b''
+    except Exception:
+        guid = b''
+
+    return {
+        'guid': guid,
+        'sam': sam.lower(),
+        'display_name': get_clean_ldap_val(entry, 'displayName'),
+        'title': get_clean_ldap_val(entry, 'title'),
+        'mail': get_clean_ldap_val(entry, 'mail'),
+        'telephone': get_clean_ldap_val(entry, 'telephoneNumber'),
+        'dn': dn,
+        'ou': extract_ou_from_dn(dn),
+    }
+
+
+def write_snapshot(records, path=None):
+    """
+    Write ``records`` (dicts keyed by FIELDS plus 'guid') to ``path`` atomically.
+
+    The file is built next to the target and swapped in with ``os.replace``,
+    so readers either see the old snapshot or the complete new one.
+    Returns the number of records written.
+    """
+    path = path or settings.DIRECTORY_SNAPSHOT_PATH
+
+    # One record per sAMAccountName; last one wins.
+    unique = {}
+    for record in records:
+        if record and record.get('sam'):
+            sam = record['sam'].lower()
+            unique[sam] = {**record, 'sam': sam}
+    records = list(unique.values())
+
+    strings = bytearray()
+    interned = {}
+
+    def intern(value):
+        data = value if isinstance(value, bytes) else (value or '').encode('utf-8')
+        if not data:
+            return 0, 0
+        if data not in interned:
+            interned[data] = len(strings)
+            strings.extend(data)
+        return interned[data], len(data)
+
+    packed_records = bytearray()
+    sam_keys, guid_keys, dn_keys = [], [], []
+
+    for number, record in enumerate(records):
+        slots = []
+        for field in FIELDS:
+            slots.extend(intern(record.get(field)))
+        guid = (record.get('guid') or b'').ljust(16, b'\0')[:16]
+        packed_records.extend(RECORD.pack(guid, *slots))
+
+        sam_keys.append((record['sam'].encode('utf-8'), number))
+        if record.get('guid'):
+            guid_keys.append((guid, number))
+        if record.get('dn'):
+            dn_keys.append((record['dn'].lower().encode('utf-8'), number))
+
+    def pack_index(keys):
+        out = bytearray()
+        for key, number in sorted(keys):
+            offset, length = intern(key)
+            out.extend(INDEX_ENTRY.pack(offset, length, number))
+        return out
+
+    # Index keys are interned before the string table is laid out.
+    sam_index = pack_index(sam_keys)
+    guid_index = pack_index(guid_keys)
+    dn_index = pack_index(dn_keys)
+
+    records_off = HEADER.size
+    strings_off = records_off + len(packed_records)
+    sam_off = strings_off + len(strings)
+    guid_off = sam_off + len(sam_index)
+    dn_off = guid_off + len(guid_index)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, len(FIELDS), len(records), time.time(),
+        records_off, strings_off, sam_off, guid_off, dn_off,
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.directory-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in (header, packed_records, strings, sam_index, guid_index, dn_index):
+                fh.write(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # The new snapshot already has every move made before it was read from AD
+    try:
+        os.unlink(moves_path(path))
+    except FileNotFoundError:
+        pass
+
+    logger.info(f"Directory snapshot written: {len(records)} records to {path}")
+    return len(records)
+
+
+def moves_path(path):
+    return f'{path}.moves'
+
+
+def apply_moves(moves, path=None):
+    """
+    Record users moved in AD since the snapshot was written, so the profile
+    shows a transfer before the next full sync.
+
+    ``moves`` maps a sAMAccountName or UPN to its new DN. The moves are
+    appended to the moves file in one write; there is nothing to do without
+    a snapshot. Failures are logged, not raised: the move is already made in
+    AD. Returns the number of moves recorded.
+    """
+    global _checked_at
+
+    path = path or settings.DIRECTORY_SNAPSHOT_PATH
+    lines = ''.join(
+        json.dumps({'sam': username.split('@')[0].lower(), 'dn': dn}) + '\n'
+        for username, dn in moves.items() if dn
+    )
+    if not lines or not os.path.exists(path):
+        return 0
+
+    try:
+        # O_APPEND: concurrent writers never interleave within one write
+        fd = os.open(moves_path(path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, lines.encode('utf-8'))
+        finally:
+            os.close(fd)
+    except OSError as exc:
+        logger.error(f"Could not record moves in the directory snapshot {path}: {exc}")
+        return 0
+
+    # Picked up on the next lookup here; other workers see it within RELOAD_CHECK_INTERVAL
+    _checked_at = 0.0
+    return lines.count('\n')
+
+
+# ---------------------------------------------------------------------------
+# Reader
+# ---------------------------------------------------------------------------
+
+class DirectorySnapshot:
+    """A memory-mapped, read-only view over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            stat = os.fstat(fh.fileno())
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        (magic, version, field_count, self.count, self.built_at,
+         self._records_off, self._strings_off, self._sam_off,
+         self._guid_off, self._dn_off) = HEADER.unpack_from(self._mm, 0)
+
+        if magic != MAGIC or version != VERSION or field_count != len(FIELDS):
+            self._mm.close()
+            raise ValueError(f"Unsupported directory snapshot format: {path}")
+
+        self._guid_count = (self._dn_off - self._guid_off) // INDEX_ENTRY.size
+        self._dn_count = (len(self._mm) - self._dn_off) // INDEX_ENTRY.size
+
+        self.moves = {}
+        self._moves_identity = None
+        self.load_moves()
+
+    def __len__(self):
+        return self.count
+
+    def load_moves(self):
+        """Re-read the moves file if it changed since the last call."""
+        try:
+            stat = os.stat(moves_path(self.path))
+        except FileNotFoundError:
+            self.moves, self._moves_identity = {}, None
+            return
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._moves_identity:
+            return
+        moves = {}
+        with open(moves_path(self.path), encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    move = json.loads(line)
+                except ValueError:
+                    continue
+                moves[move['sam']] = move['dn']
+        # Swapped whole, so concurrent readers see the old or the new moves
+        self.moves, self._moves_identity = moves, identity
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+    # ---- low-level access ----
+
+    def _bytes(self, offset, length):
+        start = self._strings_off + offset
+        return self._mm[start:start + length]
+
+    def _record(self, number):
+        guid, *slots = RECORD.unpack_from(self._mm, self._records_off + number * RECORD.size)
+        record = {'guid': str(uuid.UUID(bytes_le=guid)) if guid.strip(b'\0') else None}
+        for index, field in enumerate(FIELDS):
+            offset, length = slots[index * 2], slots[index * 2 + 1]
+            record[field] = self._bytes(offset, length).decode('utf-8') if length else None
+        dn = self.moves.get(record['sam'])
+        if dn:
+            record['dn'], record['ou'] = dn, extract_ou_from_dn(dn)
+        return record
+
+    def _index_entry(self, index_off, position):
+        return INDEX_ENTRY.unpack_from(self._mm, index_off + position * INDEX_ENTRY.size)
+
+    def _lower_bound(self, index_off, size, key):
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, _ = self._index_entry(index_off, mid)
+            if self._bytes(offset, length) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, index_off, size, key):
+        position = self._lower_bound(index_off, size, key)
+        if position < size:
+            offset, length, number = self._index_entry(index_off, position)
+            if self._bytes(offset, length) == key:
+                return self._record(number)
+        return None
+
+    # ---- lookups ----
+
+    def get_by_sam(self, sam):
+        key = (sam or '').split('@')[0].lower().encode('utf-8')
+        return self._find(self._sam_off, self.count, key) if key else None
+
+    def get_by_guid(self, guid):
+        if isinstance(guid, str):
+            guid = uuid.UUID(guid.strip('{}')).bytes_le
+        return self._find(self._guid_off, self._guid_count, guid) if guid else None
+
+    def get_by_dn(self, dn):
+        key = (dn or '').lower()
+        if not key:
+            return None
+        record = self._find(self._dn_off, self._dn_count, key.encode('utf-8'))
+        if record and record['dn'].lower() != key:
+            # Moved away since the snapshot was written
+            record = None
+        if record is None:
+            sam = next((sam for sam, moved in self.moves.items() if moved.lower() == key), None)
+            record = self.get_by_sam(sam) if sam else None
+        return record
+
+    def search_prefix(self, prefix, limit=10):
+        """Return up to ``limit`` records whose sAMAccountName starts with ``prefix``."""
+        key = (prefix or '').lower().encode('utf-8')
+        if not key:
+            return []
+
+        results = []
+        position = self._lower_bound(self._sam_off, self.count, key)
+        while position < self.count and len(results) < limit:
+            offset, length, number = self._index_entry(self._sam_off, position)
+            if not self._bytes(offset, length).startswith(key):
+                break
+            results.append(self._record(number))
+            position += 1
+        return results
+
+
+_lock = threading.Lock()
+_current = None
+_checked_at = 0.0
+
+
+def get_snapshot():
+    """
+    Return this process's mapping of the current snapshot, or None.
+
+    The file is re-stat'ed at most every RELOAD_CHECK_INTERVAL seconds and
+    re-mapped when it was swapped. Old mappings are left to the garbage
+    collector so in-flight readers are never cut off. Snapshots older than
+    DIRECTORY_SNAPSHOT_MAX_AGE are ignored.
+    """
+    global _current, _checked_at
+
+    now = time.monotonic()
+    snapshot = _current
+    if snapshot is None or now - _checked_at >= RELOAD_CHECK_INTERVAL:
+        with _lock:
+            path = settings.DIRECTORY_SNAPSHOT_PATH
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                _current = None
+            else:
+                if _current is None or _current.identity != (stat.st_ino, stat.st_mtime_ns):
+                    try:
+                        _current = DirectorySnapshot(path)
+                    except (OSError, ValueError, struct.error) as exc:
+                        logger.warning(f"Could not map directory snapshot {path}: {exc}")
+                        _current = None
+                else:
+                    try:
+                        _current.load_moves()
+                    except OSError as exc:
+                        logger.warning(f"Could not read directory snapshot moves for {path}: {exc}")
+            _checked_at = now
+            snapshot = _current
+
+    if snapshot is None or snapshot.age > settings.DIRECTORY_SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
+
+
+def lookup_user(username):
+    """Return the snapshot record for a sAMAccountName or UPN, or None."""
+    snapshot = get_snapshot()
+    record = snapshot.get_by_sam(username) if snapshot else None
+    cache_lookup('profile', record is not None)
+    return record
@@ -1,10 +1,40 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
 import pytest
-from django.test import TestCase
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 from django.utils import timezone
-from .models import Job, Department, Employee
+from .archive import archive_transfer_logs, months_ago, restore_archive_files
+from .audit import AuditWriter, audit_writer, get_transfer_stats, invalidate_transfer_stats
+from .exports import (
+    EMPLOYEE_EXPORT_FIELDS, employee_export_rows, filter_transfer_audit,
+    streaming_export_response, transfer_audit_export_rows,
+)
+from .models import Job, Department, Employee, OUTransferLog, OUTransferLogArchive
+from .admin import EmployeeAdmin
+from .snapshot import DirectorySnapshot, apply_moves, write_snapshot
 from core.models import User
+from core.tokens import tokens_for_user
+from benchmarks.directory import ADMIN_USERNAME, PASSWORD, SyntheticDirectory
+from benchmarks.scale import run_size
 
 @pytest.mark.django_db
 class EmployeeModelTests(TestCase):
@@ -58,3 +88,471 @@ class EmployeeModelTests(TestCase):
             full_name_en='Test User'
         )
         self.assertEqual(str(employee), 'Test User - No Job Title - No Department')
+
+
+@pytest.mark.django_db
+class EmployeeProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ahmed.hassan@eissa.local')
+        self.employee = Employee.objects.create(
+            user=self.user, full_name_en='Ahmed Hassan', department=Department.objects.create(name='IT'),
+        )
+
+    def test_profile_is_loaded_by_the_employee_claim(self):
+        token = tokens_for_user(self.user).access_token
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('employee_profile'), HTTP_AUTHORIZATION=f'JWT {token}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['full_name_en'], 'Ahmed Hassan')
+        employee_queries = [q['sql'] for q in queries if 'FROM "employee_employee"' in q['sql']]
+        self.assertEqual(len(employee_queries), 1)
+        self.assertIn(f'"employee_employee"."id" = {self.employee.pk}', employee_queries[0])
+
+
+class DirectorySnapshotTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'directory.snap')
+        self.guid = uuid.uuid4()
+        write_snapshot([
+            {
+                'guid': self.guid.bytes_le, 'sam': 'Ahmed.Hassan',
+                'display_name': 'أحمد حسن', 'title': 'Engineer', 'mail': 'ahmed@eissa.local',
+                'telephone': '110031', 'dn': 'CN=Ahmed Hassan,OU=IT,OU=New,DC=eissa,DC=local', 'ou': 'IT',
+            },
+            {'sam': 'ahmad.ali', 'display_name': 'Ahmad Ali', 'dn': 'CN=Ahmad Ali,OU=HR,OU=New,DC=eissa,DC=local', 'ou': 'HR'},
+            {'sam': 'sara.adel', 'display_name': 'Sara Adel'},
+        ], path=self.path)
+        self.snapshot = DirectorySnapshot(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lookup_by_sam_and_upn(self):
+        record = self.snapshot.get_by_sam('ahmed.hassan@eissa.local')
+        self.assertEqual(record['sam'], 'ahmed.hassan')
+        self.assertEqual(record['display_name'], 'أحمد حسن')
+        self.assertEqual(record['ou'], 'IT')
+        self.assertIsNone(self.snapshot.get_by_sam('nobody'))
+
+    def test_lookup_by_guid_and_dn(self):
+        self.assertEqual(self.snapshot.get_by_guid(str(self.guid))['sam'], 'ahmed.hassan')
+        record = self.snapshot.get_by_dn('cn=ahmad ali,ou=hr,ou=new,dc=eissa,dc=local')
+        self.assertEqual(record['sam'], 'ahmad.ali')
+        self.assertIsNone(record['guid'])
+
+    def test_search_prefix(self):
+        results = self.snapshot.search_prefix('ahm')
+        self.assertEqual([r['sam'] for r in results], ['ahmad.ali', 'ahmed.hassan'])
+        self.assertEqual(self.snapshot.search_prefix('zzz'), [])
+
+    def test_atomic_swap(self):
+        write_snapshot([{'sam': 'new.user'}], path=self.path)
+        self.assertEqual(len(self.snapshot), 3)
+        self.assertIsNotNone(self.snapshot.get_by_sam('sara.adel'))
+        fresh = DirectorySnapshot(self.path)
+        self.assertEqual(len(fresh), 1)
+        self.assertNotEqual(fresh.identity, self.snapshot.identity)
+
+    def test_moves_are_applied_on_read_until_the_next_snapshot(self):
+        new_dn = 'CN=Ahmad Ali,OU=IT,OU=New,DC=eissa,DC=local'
+        self.assertEqual(apply_moves({'Ahmad.Ali@eissa.local': new_dn}, path=self.path), 1)
+        self.snapshot.load_moves()
+
+        record = self.snapshot.get_by_sam('ahmad.ali')
+        self.assertEqual((record['dn'], record['ou']), (new_dn, 'IT'))
+        self.assertEqual(self.snapshot.get_by_dn(new_dn)['sam'], 'ahmad.ali')
+        self.assertIsNone(self.snapshot.get_by_dn('CN=Ahmad Ali,OU=HR,OU=New,DC=eissa,DC=local'))
+        self.assertEqual(self.snapshot.get_by_sam('ahmed.hassan')['ou'], 'IT')
+
+        write_snapshot([{'sam': 'ahmad.ali', 'dn': 'CN=Ahmad Ali,OU=HR,OU=New,DC=eissa,DC=local', 'ou': 'HR'}], path=self.path)
+        self.assertEqual(DirectorySnapshot(self.path).get_by_sam('ahmad.ali')['ou'], 'HR')
+
+
+@pytest.mark.django_db
+class BulkTransferTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.user = User.objects.create_user(username='ahmed.hassan@eissa.local')
+        Employee.objects.create(user=self.user, department=Department.objects.create(name='HR'))
+        Department.objects.create(name='IT')
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile_shows_the_new_ou_right_after_a_bulk_transfer(self):
+        old_dn = 'CN=Ahmed Hassan,OU=HR,OU=New,DC=eissa,DC=local'
+        new_dn = 'CN=Ahmed Hassan,OU=IT,OU=New,DC=eissa,DC=local'
+        ad = mock.Mock()
+        ad.bulk_update_ou.return_value = {'ahmed.hassan': (True, 'Moved to OU=IT', old_dn, new_dn)}
+        request = RequestFactory().post('/')
+        request.user = self.admin
+        token = tokens_for_user(self.user).access_token
+
+        with override_settings(DIRECTORY_SNAPSHOT_PATH=os.path.join(self.tmpdir, 'directory.snap')):
+            write_snapshot([{'sam': 'ahmed.hassan', 'dn': old_dn, 'ou': 'HR'}])
+            rows = EmployeeAdmin(Employee, admin.site)._run_bulk_transfer(request, ad, [('ahmed.hassan', 'IT')], True)
+            self.assertEqual(rows[0]['status'], 'success')
+            self.assertEqual(LogEntry.objects.get().change_message, 'Bulk OU Transfer: HR → IT (success)')
+
+            profile = self.client.get(reverse('employee_profile'), HTTP_AUTHORIZATION=f'JWT {token}').json()
+        self.assertEqual(profile['ou'], 'IT')
+        self.assertEqual(profile['distinguished_name'], new_dn)
+
+    def test_view_only_staff_cannot_bulk_transfer(self):
+        viewer = User.objects.create_user(username='viewer', password='x', is_staff=True)
+        viewer.user_permissions.set(Permission.objects.filter(codename='view_employee'))
+        self.client.force_login(viewer)
+
+        self.assertEqual(self.client.get(reverse('admin:bulk_transfer_ou')).status_code, 403)
+        with mock.patch('employee.admin.get_ad_connection') as connect:
+            self.client.post(reverse('admin:employee_employee_changelist'), {
+                'action': 'transfer_selected_ou', 'apply': '1', 'new_ou': 'IT',
+                helpers.ACTION_CHECKBOX_NAME: list(Employee.objects.values_list('pk', flat=True)),
+            })
+        connect.assert_not_called()
+
+
+@pytest.mark.django_db
+class EmployeeExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='ahmed.hassan@eissa.local')
+        Employee.objects.create(
+            user=user, full_name_en='Ahmed Hassan', full_name_ar='أحمد حسن',
+            nid='12345678901234', job_title=Job.objects.create(title='Engineer'),
+            department=Department.objects.create(name='IT'),
+        )
+        Employee.objects.create(full_name_en='No User')
+
+    def test_csv_export(self):
+        response = streaming_export_response(
+            employee_export_rows(Employee.objects.all()), EMPLOYEE_EXPORT_FIELDS, fmt='csv',
+        )
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['username'], 'ahmed.hassan@eissa.local')
+        self.assertEqual(rows[0]['department'], 'IT')
+        self.assertEqual(rows[0]['full_name_ar'], 'أحمد حسن')
+        self.assertEqual(rows[1]['username'], '')
+
+    def test_gzip_ndjson_export(self):
+        response = streaming_export_response(
+            employee_export_rows(Employee.objects.all()), EMPLOYEE_EXPORT_FIELDS,
+            fmt='ndjson', compress=True,
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['job_title'] for line in lines], ['Engineer', None])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            streaming_export_response([], EMPLOYEE_EXPORT_FIELDS, fmt='xml')
+
+    def test_export_needs_the_export_permission(self):
+        staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        staff.user_permissions.set(Permission.objects.filter(codename__in=['view_employee', 'change_employee']))
+        token = tokens_for_user(staff).access_token
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('employee_export'), HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(response.status_code, 403)
+        actions = self.client.get(reverse('admin:employee_employee_changelist')).context['action_form'].fields['action'].choices
+        self.assertIn('transfer_selected_ou', dict(actions))
+        self.assertNotIn('export_as_csv', dict(actions))
+
+        staff.user_permissions.add(Permission.objects.get(codename='export_employee'))
+        response = self.client.get(reverse('employee_export') + '?fmt=csv', HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8').splitlines()), 3)
+
+
+@pytest.mark.django_db
+class TransferAuditExportTests(TestCase):
+    def setUp(self):
+        self.it = Department.objects.create(name='IT')
+        for i, status in enumerate(['success', 'failed', 'success', 'partial', 'success']):
+            OUTransferLog.objects.create(
+                employee_username=f'user{i}', old_ou='HR', new_ou='IT', old_dn='CN=x',
+                status=status, new_department=self.it if status == 'success' else None,
+            )
+
+    def test_rows_are_newest_first_and_filtered(self):
+        rows = list(transfer_audit_export_rows(OUTransferLog.objects.all(), batch_size=2))
+        self.assertEqual([r['employee_username'] for r in rows], [f'user{i}' for i in range(4, -1, -1)])
+
+        queryset = filter_transfer_audit(OUTransferLog.objects.all(), status='success', department=self.it)
+        rows = list(transfer_audit_export_rows(queryset))
+        self.assertEqual([r['employee_username'] for r in rows], ['user4', 'user2', 'user0'])
+        self.assertEqual(rows[0]['new_department'], 'IT')
+
+    def test_date_range_is_inclusive(self):
+        today = timezone.localdate()
+        queryset = filter_transfer_audit(OUTransferLog.objects.all(), date_from=today, date_to=today)
+        self.assertEqual(queryset.count(), 5)
+        queryset = filter_transfer_audit(OUTransferLog.objects.all(), date_to=today - timedelta(days=1))
+        self.assertEqual(queryset.count(), 0)
+
+
+@pytest.mark.django_db
+class TransferStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for status in ['success', 'success', 'failed', 'partial']:
+            OUTransferLog.objects.create(employee_username='u', old_ou='A', new_ou='B', old_dn='CN=u', status=status)
+
+    def test_single_query_then_cached(self):
+        with self.assertNumQueries(1):
+            stats = get_transfer_stats()
+        self.assertEqual(stats, {'total': 4, 'success': 2, 'failed': 1, 'this_month': 4})
+        with self.assertNumQueries(0):
+            get_transfer_stats()
+
+    def test_invalidation(self):
+        get_transfer_stats()
+        OUTransferLog.objects.create(employee_username='v', old_ou='A', new_ou='B', old_dn='CN=v', status='failed')
+        invalidate_transfer_stats()
+        self.assertEqual(get_transfer_stats()['failed'], 2)
+
+
+@pytest.mark.django_db
+class AuditWriterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.tmpdir = tempfile.mkdtemp()
+        self.writer = AuditWriter(write_behind=True, spool_path=os.path.join(self.tmpdir, 'spool.ndjson'))
+        # Flush explicitly instead of from the background thread
+        self.writer._ensure_thread = lambda: None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _transfer(self, username):
+        return {
+            'performed_by_id': self.admin.pk, 'employee_username': username,
+            'old_ou': 'HR', 'new_ou': 'IT', 'old_dn': f'CN={username}', 'status': 'success',
+        }
+
+    def test_events_are_queued_then_written_in_one_batch(self):
+        self.writer.record_transfers([self._transfer('a'), self._transfer('b')])
+        self.writer.record_action(
+            user_id=self.admin.pk, model=User, object_id=self.admin.pk,
+            object_repr='admin', action_flag=2, change_message='Changed AD password',
+        )
+        self.assertEqual(OUTransferLog.objects.count(), 0)
+        self.assertEqual(self.writer.metrics()['queue_depth'], 3)
+
+        self.writer.flush()
+        self.assertEqual(OUTransferLog.objects.count(), 2)
+        self.assertEqual(LogEntry.objects.count(), 3)
+        metrics = self.writer.metrics()
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['written_total'], 3)
+
+    def test_failed_write_is_spooled_and_replayed(self):
+        self.writer.record_transfers([{**self._transfer('a'), 'no_such_field': 1}])
+        self.writer.flush()
+        self.assertEqual(self.writer.metrics()['spooled_total'], 1)
+        self.assertTrue(os.path.exists(self.writer.spool_path))
+
+        with open(self.writer.spool_path, 'w') as fh:
+            fh.write(json.dumps({'kind': 'transfer', 'queued_at': '2025-01-01T00:00:00+00:00', 'data': self._transfer('a')}) + '\n')
+        self.writer.flush()
+        log = OUTransferLog.objects.get()
+        self.assertEqual(log.timestamp.year, 2025)
+        self.assertFalse(os.path.exists(self.writer.spool_path))
+
+    def test_event_that_keeps_failing_is_dead_lettered(self):
+        self.writer.max_attempts = 2
+        self.writer.record_transfers([{**self._transfer('bad'), 'no_such_field': 1}])
+        self.writer.flush()
+        self.assertEqual(self.writer.metrics()['spooled_total'], 1)
+
+        # Replayed next to a good event: the good one is written, the bad one dropped
+        with open(self.writer.spool_path, 'a') as fh:
+            fh.write(json.dumps({'kind': 'transfer', 'queued_at': '2025-01-01T00:00:00+00:00', 'data': self._transfer('good')}) + '\n')
+        self.writer.flush()
+        self.assertEqual(list(OUTransferLog.objects.values_list('employee_username', flat=True)), ['good'])
+        self.assertFalse(os.path.exists(self.writer.spool_path))
+        with open(f'{self.writer.spool_path}.dead') as fh:
+            dead = [json.loads(line) for line in fh]
+        self.assertEqual([(e['data']['employee_username'], e['attempts']) for e in dead], [('bad', 2)])
+        self.assertEqual(self.writer.metrics()['dead_lettered_total'], 1)
+
+        self.writer.flush()
+        self.assertEqual(OUTransferLog.objects.count(), 1)
+
+    def test_rows_keep_the_time_they_were_queued(self):
+        queued_at = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        with mock.patch('employee.audit.timezone.now', return_value=queued_at):
+            self.writer.record_transfers([self._transfer('a')])
+        self.writer.flush()
+        self.assertEqual(OUTransferLog.objects.get().timestamp, queued_at)
+        self.assertEqual(LogEntry.objects.get().action_time, queued_at)
+
+    def test_replay_file_is_kept_until_its_events_are_safe(self):
+        with open(self.writer.spool_path, 'w') as fh:
+            fh.write(json.dumps({'kind': 'transfer', 'queued_at': '2025-01-01T00:00:00+00:00', 'data': self._transfer('a')}) + '\n')
+        claimed = f'{self.writer.spool_path}.{os.getpid()}.replay'
+
+        with mock.patch.object(self.writer, '_write_batch', side_effect=Exception('db down')), \
+                mock.patch.object(self.writer, '_spool', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.writer.flush()
+        self.assertTrue(os.path.exists(claimed))
+
+        self.writer.flush()
+        self.assertEqual(OUTransferLog.objects.get().employee_username, 'a')
+        self.assertFalse(os.path.exists(claimed))
+
+    def test_replay_file_of_a_dead_process_is_replayed(self):
+        # Above the kernel's pid_max, so no process has it
+        orphan = f'{self.writer.spool_path}.{2 ** 23}.replay'
+        with open(orphan, 'w') as fh:
+            fh.write(json.dumps({'kind': 'transfer', 'queued_at': '2025-01-01T00:00:00+00:00', 'data': self._transfer('a')}) + '\n')
+
+        self.writer.flush()
+        self.assertEqual(OUTransferLog.objects.get().employee_username, 'a')
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+@pytest.mark.django_db
+class ArchiveAuditTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.tmpdir = tempfile.mkdtemp()
+        now = timezone.now()
+        for days, username in ((400, 'old1'), (500, 'old2'), (5, 'recent')):
+            log = OUTransferLog.objects.create(
+                performed_by=self.admin, employee_username=username,
+                old_ou='HR', new_ou='IT', old_dn=f'CN={username}', status='success',
+            )
+            OUTransferLog.objects.filter(pk=log.pk).update(timestamp=now - timedelta(days=days))
+        self.cutoff = months_ago(12)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_archive_to_table_in_batches(self):
+        moved = archive_transfer_logs(self.cutoff, batch_size=1)
+        self.assertEqual(moved, 2)
+        self.assertEqual(list(OUTransferLog.objects.values_list('employee_username', flat=True)), ['recent'])
+        archived = OUTransferLogArchive.objects.order_by('timestamp')
+        self.assertEqual([a.employee_username for a in archived], ['old2', 'old1'])
+        self.assertEqual(archived[0].performed_by, 'admin')
+
+    def test_archive_to_files_and_restore(self):
+        moved = archive_transfer_logs(self.cutoff, to='files', archive_dir=self.tmpdir, batch_size=1)
+        self.assertEqual(moved, 2)
+        self.assertEqual(OUTransferLogArchive.objects.count(), 0)
+        self.assertTrue(all(name.endswith('.ndjson.gz') for name in os.listdir(self.tmpdir)))
+
+        self.assertEqual(restore_archive_files(self.tmpdir), 2)
+        # Restoring again does not duplicate rows
+        restore_archive_files(self.tmpdir)
+        self.assertEqual(OUTransferLogArchive.objects.count(), 2)
+
+
+@pytest.mark.django_db
+class LargeTableChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(self.admin)
+        self.job = Job.objects.create(title='Engineer')
+        self.departments = [Department.objects.create(name=f'Dept {i}') for i in range(3)]
+
+    def _add_employees(self, count):
+        start = Employee.objects.count()
+        users = User.objects.bulk_create(
+            [User(username=f'emp{start + i}') for i in range(count)]
+        )
+        Employee.objects.bulk_create([
+            Employee(user=user, full_name_en=user.username, job_title=self.job,
+                     department=self.departments[i % 3])
+            for i, user in enumerate(users)
+        ])
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_employee_changelist_query_count_is_constant(self):
+        url = reverse('admin:employee_employee_changelist')
+        self._add_employees(5)
+        small, _ = self._queries(url)
+
+        self._add_employees(150)
+        large, response = self._queries(url)
+        self.assertEqual(small, large)
+
+        cl = response.context['cl']
+        self.assertTrue(cl.keyset.has_next)
+        self.assertEqual(len(cl.result_list), cl.list_per_page)
+
+        second, response = self._queries(url + cl.keyset_next_url)
+        self.assertEqual(second, large)
+        self.assertEqual(len(response.context['cl'].result_list), 55)
+
+    def test_autocomplete_filter_loads_only_selected_choice(self):
+        self._add_employees(6)
+        department = self.departments[1]
+        response = self.client.get(
+            reverse('admin:employee_employee_changelist'),
+            {'department__id__exact': department.pk},
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+        spec = next(s for s in response.context['cl'].filter_specs if s.field.name == 'department')
+        self.assertEqual(spec.lookup_choices, [(department.pk, department.name)])
+
+    def test_transfer_log_changelist_query_count_is_constant(self):
+        url = reverse('admin:employee_outransferlog_changelist')
+
+        def add_logs(count):
+            OUTransferLog.objects.bulk_create([
+                OUTransferLog(performed_by=self.admin, employee_username=f'u{i}',
+                              old_ou='HR', new_ou='IT', old_dn='CN=x', status='success')
+                for i in range(count)
+            ])
+
+        add_logs(3)
+        small, _ = self._queries(url)
+        add_logs(120)
+        large, _ = self._queries(url)
+        self.assertEqual(small, large)
+
+
+class ScaleBenchmarkTests(TestCase):
+    """benchmarks.scale at a tiny size, so the suite keeps running as the views change."""
+
+    def tearDown(self):
+        audit_writer.flush()
+
+    def test_synthetic_directory_behaves_like_ad(self):
+        directory = SyntheticDirectory(30, ous=3)
+        ad = directory.connection()
+        self.assertFalse(ad.connect_ad(ADMIN_USERNAME, 'wrong'))
+        self.assertTrue(ad.connect_ad(ADMIN_USERNAME, PASSWORD))
+
+        self.assertEqual(len(ad.get_all_users_full_info(attributes=['sAMAccountName'])), 31)
+        self.assertEqual(ad.search_users_dn(['user000004']), {'user000004': directory.dn(4)})
+        success, _, new_dn = ad.move_dn(directory.dn(4), 'Dept02')
+        self.assertTrue(success)
+        # Another connection sees the move
+        other = directory.connection()
+        other.connect_ad('user000004', PASSWORD)
+        self.assertEqual(other.search_users_dn(['user000004']), {'user000004': new_dn})
+
+    def test_run_size_measures_every_phase(self):
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            result = run_size(20, samples=4, transfers=2, snapshot_dir=snapshot_dir)
+
+        self.assertEqual(result['sync']['employees'], 21)
+        self.assertEqual(result['profile']['count'], 4)
+        self.assertEqual(result['transfer']['apply']['count'], 2)
+        self.assertEqual(set(result['changelist']), {'first_page', 'search'})
+        self.assertGreater(result['memory']['sync_peak_mb'], 0)
+
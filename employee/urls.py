@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from employee.views import EmployeeProfileView
+from employee.views import AsyncEmployeeProfileView, EmployeeProfileView, EmployeeExportView
+
+profile_view = AsyncEmployeeProfileView.as_view() if settings.ASYNC_API_VIEWS else EmployeeProfileView.as_view()
 
 urlpatterns = [
-    path('profile/', EmployeeProfileView.as_view(), name='employee_profile'),
-]
\ No newline at end of file
+    path('profile/', profile_view, name='employee_profile'),
+    path('export/', EmployeeExportView.as_view(), name='employee_export'),
+]
@@ -1,5 +1,5 @@
-from django.core.cache import cache
-from django.conf import settings
+from core.utils import new_directory
+from core.vault import get_vault
 import re
 
 def get_clean_ldap_val(entry, attr_name):
@@ -20,14 +20,14 @@ def extract_ou_from_dn(dn):
 
 def get_ad_connection(request):
     """
-    Retrieve cached AD credentials and return an authenticated AD connection.
+    Retrieve the stored AD credentials and return an authenticated AD connection.
     Returns (ad_connection, error_message).  On success error_message is None.
     """
-    creds = cache.get(f'ad_creds_{request.user.id}')
+    creds = get_vault().get(request.user.id)
     if not creds or not creds.get('username') or not creds.get('password'):
-        return None, "Credentials not found in cache. Please re-login."
+        return None, "Credentials not found or expired. Please re-login."
 
-    ad = settings.ACTIVE_DIR
+    ad = new_directory()
     if not ad.connect_ad(creds['username'], creds['password']):
         return None, "Failed to connect to AD with your credentials."
 
@@ -1,13 +1,21 @@
 import re
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, PermissionDenied
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.core.cache import cache
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from django.conf import settings
-from drf_spectacular.utils import extend_schema, OpenApiExample
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from core.authentication import ClaimsJWTAuthentication
+from core.utils import async_directory, new_directory
+from core.vault import get_vault
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
+from .exports import EMPLOYEE_EXPORT_FIELDS, EXPORT_FORMATS, employee_export_rows, streaming_export_response
 from .models import Employee
 from .serializers import EmployeeProfileSerializer
+from .snapshot import lookup_user
+from .utils import extract_ou_from_dn, get_clean_ldap_val
 import logging
 
 logger = logging.getLogger(__name__)
@@ -74,9 +82,12 @@ class EmployeeProfileView(APIView):
         
         try:
             try:
+                # The employee id comes from the token claims when present
+                employee_id = getattr(request.user, 'employee_id', None)
+                lookup = {'pk': employee_id} if employee_id else {'user_id': request.user.id}
                 employee = Employee.objects.select_related(
                     'user', 'job_title', 'department'
-                ).get(user=request.user)
+                ).get(**lookup)
             except Employee.DoesNotExist:
                 return Response(
                     {
@@ -87,17 +98,26 @@ class EmployeeProfileView(APIView):
                 )
             
             
-            ad_creds = cache.get(f'ad_creds_{request.user.id}')
-            ad_username = ad_creds['username']
-            ad_password = ad_creds['password']
-            
             serializer = EmployeeProfileSerializer(employee)
             employee_data = serializer.data
             
+            # Served from the shared directory snapshot when it has the user
+            record = lookup_user(request.user.username)
+            if record:
+                employee_data['email'] = record['mail']
+                employee_data['phone'] = record['telephone']
+                employee_data['display_name'] = record['display_name']
+                employee_data['distinguished_name'] = record['dn']
+                employee_data['ou'] = record['ou']
+                return Response(employee_data, status=status.HTTP_200_OK)
+            
+            ad_creds = get_vault().get(request.user.id) or {}
+            ad_username = ad_creds.get('username')
+            ad_password = ad_creds.get('password')
             
             if ad_username and ad_password:
                 try:
-                    ad = settings.ACTIVE_DIR
+                    ad = new_directory()
                     
                     
                     if ad.connect_ad(ad_username, ad_password):
@@ -156,4 +176,143 @@ class EmployeeProfileView(APIView):
                     'detail': 'An unexpected error occurred while retrieving your profile.'
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class AsyncEmployeeProfileView(View):
+    """
+    EmployeeProfileView for the ASGI deployment (ASYNC_API_VIEWS): the AD
+    read runs on an AsyncADConnection. Same token, lookups and responses.
+    """
+
+    http_method_names = ['get']
+
+    async def get(self, request):
+        try:
+            authenticated = await ClaimsJWTAuthentication().aauthenticate(request)
+        except APIException as e:
+            return JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+        if authenticated is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        user = authenticated[0]
+
+        try:
+            employee_id = getattr(user, 'employee_id', None)
+            lookup = {'pk': employee_id} if employee_id else {'user_id': user.id}
+            employee = await Employee.objects.select_related('user', 'job_title', 'department').filter(**lookup).afirst()
+            if employee is None:
+                return JsonResponse(
+                    {
+                        'error': 'Profile not found',
+                        'detail': 'No employee profile found for this user. Please contact your administrator.'
+                    },
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            employee_data = EmployeeProfileSerializer(employee).data
+
+            record = await sync_to_async(lookup_user)(user.username)
+            if record:
+                employee_data['email'] = record['mail']
+                employee_data['phone'] = record['telephone']
+                employee_data['display_name'] = record['display_name']
+                employee_data['distinguished_name'] = record['dn']
+                employee_data['ou'] = record['ou']
+                return JsonResponse(employee_data, status=status.HTTP_200_OK)
+
+            ad_creds = await sync_to_async(get_vault().get)(user.id) or {}
+            if ad_creds.get('username') and ad_creds.get('password'):
+                try:
+                    await self._read_ad(ad_creds['username'], ad_creds['password'], employee_data)
+                except Exception as ad_error:
+                    logger.error(f"Error fetching AD data: {str(ad_error)}")
+            else:
+                logger.warning("AD credentials not found in session")
+
+            return JsonResponse(employee_data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error retrieving employee profile: {str(e)}", exc_info=True)
+            return JsonResponse(
+                {
+                    'error': 'Server error',
+                    'detail': 'An unexpected error occurred while retrieving your profile.'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    async def _read_ad(self, ad_username, ad_password, employee_data):
+        async with async_directory() as ad:
+            if not await ad.connect_ad(ad_username, ad_password):
+                logger.warning(f"Failed to connect to AD for user: {ad_username}")
+                return
+
+            clean_username = ad_username.split('@')[0]
+            entries = await ad.search_user_full_info(
+                clean_username,
+                attributes=['mail', 'telephoneNumber', 'displayName', 'distinguishedName'],
+            )
+            if not entries:
+                logger.warning(f"User not found in AD: {clean_username}")
+                return
+
+            entry = entries[0]
+            employee_data['email'] = get_clean_ldap_val(entry, 'mail')
+            employee_data['phone'] = get_clean_ldap_val(entry, 'telephoneNumber')
+            employee_data['display_name'] = get_clean_ldap_val(entry, 'displayName')
+            dn = get_clean_ldap_val(entry, 'distinguishedName') or entry.entry_dn
+            employee_data['distinguished_name'] = dn
+            ou = extract_ou_from_dn(dn)
+            if ou:
+                employee_data['ou'] = ou
+            logger.info(f"Successfully retrieved AD data for user: {clean_username}")
+
+
+class EmployeeExportView(APIView):
+    """
+    Streams the full employee directory as CSV or NDJSON.
+
+    Needs the employee.export_employee permission on top of staff status.
+    """
+    
+    permission_classes = [IsAdminUser]
+    
+    @extend_schema(
+        summary="Export employee directory",
+        description="""
+        Streams every employee (names, NID, department, job title, hire date and
+        AD attributes) without loading the directory into memory.
+        """,
+        parameters=[
+            OpenApiParameter('fmt', str, enum=list(EXPORT_FORMATS), description='Output format (default: ndjson)'),
+            OpenApiParameter('gzip', bool, description='Compress the stream with gzip'),
+        ],
+        responses={(200, 'application/x-ndjson'): str, (200, 'text/csv'): str},
+        tags=['Employee'],
+    )
+    def get(self, request):
+        if not request.user.has_perm('employee.export_employee'):
+            raise PermissionDenied()
+        fmt = request.query_params.get('fmt', 'ndjson').lower()
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {
+                    'error': 'Validation error',
+                    'detail': f"Unsupported format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        
+        logger.info(f"Employee export ({fmt}, gzip={compress}) requested by {request.user.username}")
+        return streaming_export_response(
+            employee_export_rows(Employee.objects.all()),
+            EMPLOYEE_EXPORT_FIELDS,
+            fmt=fmt,
+            compress=compress,
+            filename='employees',
+        )
\ No newline at end of file